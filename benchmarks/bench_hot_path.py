@@ -0,0 +1,393 @@
+"""
+Микробенчмарки пути обработки текстового сообщения
+
+Каждый этап handle_message замеряется отдельно на заполненной SQLite базе
+реалистичного размера, затем весь handle_message целиком с заглушками
+Telegram и AI провайдера:
+
+    user_lookup      - UserService.get_or_create_user для существующего пользователя
+    context_build    - сборка контекста беседы (context_builder.build), в основном промахи кэша
+    context_cached   - сборка контекста активной беседы из кэша, без запросов к базе
+    message_insert   - создание ORM Message и commit (в обработчике - в фоне, пачками)
+    response_render  - HTML ответа: заголовок модели и финальная правка StreamingReply
+    handle_message   - весь обработчик, без сети
+
+База создается один раз и переиспользуется, пока совпадают размеры.
+Результаты можно сохранить как базовые и сравнивать с ними следующие запуски.
+
+Запуск:
+    python -m benchmarks.bench_hot_path --users 100000 --messages 10000000 --db /var/tmp/telegpt_bench.db
+    python -m benchmarks.bench_hot_path --save-baseline
+    python -m benchmarks.bench_hot_path --compare --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Добавляем корневую папку в путь
+sys.path.append(ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "hot_path.json")
+
+USER_TEXT = "Объясни, пожалуйста, как работает {topic} и где это применяется на практике?"
+AI_TEXT = (
+    "Конечно! {topic} - это важная тема. Вот основные моменты:\n\n"
+    "1. Общая идея и история появления.\n"
+    "2. Как это устроено внутри и какие есть ограничения.\n"
+    "3. Где применяется: от небольших проектов до крупных систем.\n\n"
+    "Если хотите, могу рассказать подробнее про любой из пунктов или привести примеры кода. "
+)
+TOPICS = ["хеш-таблица", "TCP", "сборка мусора", "B-дерево", "кэш процессора", "асинхронность",
+          "транзакция", "индекс в базе данных", "протокол TLS", "очередь сообщений"]
+
+
+def pick_user(rng: random.Random, users: int) -> int:
+    """Неравномерная активность: небольшая часть пользователей пишет большую часть сообщений"""
+    return 1 + int(users * rng.random() ** 2)
+
+
+def migrate_database(path: str):
+    """Схема базы из миграций, как у работающего бота"""
+    from sqlalchemy import create_engine
+    from database.db import upgrade_schema
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    engine.dispose()
+
+
+def seed_database(path: str, users: int, messages: int, seed: int = 0):
+    """Заполнение базы; повторно используется, если размеры совпадают"""
+    if os.path.exists(path):
+        connection = sqlite3.connect(path)
+        try:
+            existing = connection.execute(
+                "SELECT (SELECT MAX(id) FROM users), (SELECT MAX(id) FROM messages)"
+            ).fetchone()
+        except sqlite3.DatabaseError:
+            existing = None
+        finally:
+            connection.close()
+        if existing == (users, messages):
+            # Схема заполненной ранее базы доводится до текущей ревизии
+            migrate_database(path)
+            return
+        os.remove(path)
+
+    migrate_database(path)
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+
+    created = datetime(2025, 1, 1)
+    connection.executemany(
+        "INSERT INTO users (id, telegram_id, username, first_name, last_name, current_ai_model, "
+        "is_active, created_at, last_activity) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)",
+        ((user_id, 10_000_000 + user_id, f"user{user_id}", f"Имя {user_id}", None, "chatgpt",
+          created, created) for user_id in range(1, users + 1))
+    )
+
+    batch = 50_000
+    for start in range(1, messages + 1, batch):
+        rows = []
+        for message_id in range(start, min(start + batch, messages + 1)):
+            user_id = pick_user(rng, users)
+            topic = TOPICS[message_id % len(TOPICS)]
+            rows.append((
+                message_id, user_id, USER_TEXT.format(topic=topic), AI_TEXT.format(topic=topic), "chatgpt",
+                10_000_000 + user_id, message_id, 1500, 400, 300,
+                created + timedelta(seconds=message_id),
+            ))
+        connection.executemany(
+            "INSERT INTO messages (id, user_id, user_message, ai_response, ai_model_used, chat_id, "
+            "telegram_message_id, processing_time, first_token_time, prompt_tokens, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        connection.commit()
+    connection.close()
+    print(f"База заполнена за {time.perf_counter() - started:.1f} с: {path}", file=sys.stderr)
+
+
+def configure_environment(args: argparse.Namespace):
+    """Настройки бота для замеров; задаются до первого импорта config.settings"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    # Без фоновых запросов к модели и ожидания между правками
+    os.environ["CONTEXT_SUMMARY_ENABLED"] = "false"
+    os.environ["MAX_REQUESTS_PER_MINUTE"] = "0"
+    os.environ["STREAM_EDIT_INTERVAL"] = "0"
+    os.environ["STREAMING_ENABLED"] = "true" if args.streaming else "false"
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:BENCH")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Сводка замеров в микросекундах"""
+    ordered = sorted(samples)
+
+    def percentile(q: float) -> float:
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return round(ordered[index] * 1e6, 1)
+
+    return {
+        "count": len(ordered),
+        "mean_us": round(sum(ordered) / len(ordered) * 1e6, 1),
+        "p50_us": percentile(50),
+        "p95_us": percentile(95),
+        "p99_us": percentile(99),
+        "ops_per_s": round(len(ordered) / sum(ordered), 1) if sum(ordered) else 0.0,
+    }
+
+
+class NullMessage:
+    """Сообщение Telegram, которое ничего не отправляет"""
+
+    def __init__(self, text: str = "", message_id: int = 0):
+        self.text = text
+        self.message_id = message_id
+        self.chat = SimpleNamespace(type="private")
+
+    async def reply_text(self, text, **kwargs):
+        return NullMessage(text)
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+        return self
+
+
+class StubService:
+    """AI сервис без запросов к провайдеру"""
+
+    def get_model_name(self) -> str:
+        return "GPT-4o (bench)"
+
+
+class StubExecutor:
+    """Замена failover_executor: готовый ответ, поток из нескольких фрагментов"""
+
+    def __init__(self, response: str, chunks: int = 20):
+        self.response = response
+        step = max(1, len(response) // chunks)
+        self.deltas = [response[i:i + step] for i in range(0, len(response), step)]
+
+    async def generate(self, model_name, message, context=None):
+        return model_name, self.response
+
+    async def _stream(self):
+        for delta in self.deltas:
+            yield delta
+
+    async def open_stream(self, model_name, message, context=None):
+        return model_name, StubService(), self._stream()
+
+
+class HotPathBench:
+    """Замеры этапов обработки сообщения на заполненной базе"""
+
+    def __init__(self, args: argparse.Namespace):
+        # Импорт после настройки окружения: настройки читаются один раз
+        from bot.handlers import chat_handler
+        from database.db import AsyncSessionLocal, engine
+        from services.context_builder import context_builder
+        from services.message_writer import message_writer
+
+        self.args = args
+        self.rng = random.Random(args.seed + 1)
+        self.chat_handler = chat_handler
+        self.session_factory = AsyncSessionLocal
+        self.engine = engine
+        self.context_builder = context_builder
+        self.message_writer = message_writer
+        self.response = AI_TEXT.format(topic="индекс в базе данных")
+
+        # Идентификаторы сообщений за пределами заполненных
+        self._next_message_id = args.messages + 1
+
+        chat_handler.failover_executor = StubExecutor(self.response)
+        chat_handler.ai_factory = SimpleNamespace(get_service=lambda model_name: StubService())
+
+    def _user(self) -> int:
+        return pick_user(self.rng, self.args.users)
+
+    def _message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    async def user_lookup(self):
+        from services.user_service import UserService
+
+        user_id = self._user()
+        async with self.session_factory() as session:
+            await UserService(session).get_or_create_user(
+                telegram_id=10_000_000 + user_id, username=f"user{user_id}", first_name=f"Имя {user_id}"
+            )
+
+    async def context_build(self):
+        async with self.session_factory() as session:
+            await self.context_builder.build(session, self._user(), "chatgpt", "Новый вопрос")
+
+    async def context_cached(self):
+        async with self.session_factory() as session:
+            await self.context_builder.build(session, 1, "chatgpt", "Новый вопрос")
+
+    async def message_insert(self):
+        from models.message import Message
+
+        user_id = self._user()
+        async with self.session_factory() as session:
+            session.add(Message(
+                user_id=user_id, user_message="Новый вопрос", ai_response=self.response,
+                ai_model_used="chatgpt", chat_id=10_000_000 + user_id, telegram_message_id=self._message_id(),
+                processing_time=1500, first_token_time=400, prompt_tokens=300
+            ))
+            await session.commit()
+
+    async def response_render(self):
+        from bot.streaming import StreamingReply
+
+        get_model_emoji = self.chat_handler.get_model_emoji
+        # Без потоковой отправки - один ответ с HTML заголовком
+        response_text = f"{get_model_emoji('chatgpt')} <b>{StubService().get_model_name()}</b>\n\n{self.response}"
+        await NullMessage().reply_text(response_text, parse_mode="HTML")
+
+        reply = StreamingReply(NullMessage(), f"{get_model_emoji('chatgpt')} GPT-4o (bench)", edit_interval=0)
+        await reply.finish(self.response)
+
+    async def handle_message(self):
+        user_id = self._user()
+        telegram_id = 10_000_000 + user_id
+        message = NullMessage("Как работает индекс в базе данных?", self._message_id())
+        update = SimpleNamespace(
+            effective_user=SimpleNamespace(id=telegram_id, username=f"user{user_id}",
+                                           first_name=f"Имя {user_id}", last_name=None),
+            effective_chat=SimpleNamespace(id=telegram_id),
+            message=message,
+        )
+
+        async def send_chat_action(**kwargs):
+            return True
+
+        context = SimpleNamespace(bot=SimpleNamespace(send_chat_action=send_chat_action))
+        await self.chat_handler.handle_message(update, context)
+
+    async def measure(self, name: str) -> Dict[str, float]:
+        stage = getattr(self, name)
+        for _ in range(self.args.warmup):
+            await stage()
+
+        samples = []
+        for _ in range(self.args.iterations):
+            started = time.perf_counter()
+            await stage()
+            samples.append(time.perf_counter() - started)
+        return summarize(samples)
+
+    async def run(self, stages: List[str]) -> Dict[str, Dict[str, float]]:
+        try:
+            return {name: await self.measure(name) for name in stages}
+        finally:
+            await self.context_builder.stop()
+            await self.message_writer.stop()
+            # Добавленные при замерах сообщения удаляются: база остается пригодной для следующих запусков
+            async with self.engine.begin() as conn:
+                await conn.exec_driver_sql("DELETE FROM messages WHERE id > ?", (self.args.messages,))
+            await self.engine.dispose()
+
+
+STAGES = ["user_lookup", "context_build", "context_cached", "message_insert", "response_render", "handle_message"]
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Сравнение с базовыми результатами; возвращает этапы, ставшие медленнее порога"""
+    regressions = []
+    print(f"{'этап':>16} {'p50, мкс':>10} {'база':>10} {'изменение':>10}")
+    for name, stats in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if not base:
+            print(f"{name:>16} {stats['p50_us']:>10} {'-':>10} {'-':>10}")
+            continue
+        change = stats["p50_us"] / base["p50_us"] - 1 if base["p50_us"] else 0.0
+        marker = " ❌" if change > threshold else ""
+        print(f"{name:>16} {stats['p50_us']:>10} {base['p50_us']:>10} {change:>+9.0%}{marker}")
+        if change > threshold:
+            regressions.append(name)
+
+    if baseline.get("dataset") != results["dataset"]:
+        print(f"⚠️ Базовые результаты получены на другой базе: {baseline.get('dataset')}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки обработки текстового сообщения")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "telegpt_bench.db"),
+                        help="файл базы; переиспользуется между запусками")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--stages", default=",".join(STAGES), help="этапы через запятую")
+    parser.add_argument("--streaming", action=argparse.BooleanOptionalAction, default=True,
+                        help="handle_message с потоковым ответом")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="файл базовых результатов")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты как базовые")
+    parser.add_argument("--compare", action="store_true", help="сравнить с базовыми результатами")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление p50 при сравнении")
+    parser.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    seed_database(args.db, args.users, args.messages, args.seed)
+
+    stages = [name.strip() for name in args.stages.split(",") if name.strip()]
+    results = {
+        "dataset": {"users": args.users, "messages": args.messages},
+        "iterations": args.iterations,
+        "streaming": args.streaming,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "stages": asyncio.run(HotPathBench(args).run(stages)),
+    }
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    elif not args.compare:
+        print(f"{'этап':>16} {'p50, мкс':>10} {'p95, мкс':>10} {'p99, мкс':>10} {'оп/с':>10}")
+        for name, stats in results["stages"].items():
+            print(f"{name:>16} {stats['p50_us']:>10} {stats['p95_us']:>10} {stats['p99_us']:>10} "
+                  f"{stats['ops_per_s']:>10}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            parser.error(f"нет базовых результатов {args.baseline}, сначала запустите с --save-baseline")
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк холодного старта: время импорта модулей бота и память процесса
+
+Каждый замер - отдельный процесс Python (без кэша уже импортированных
+модулей). Кроме времени и пикового RSS выводится, какие SDK провайдеров
+оказались загружены.
+
+Запуск:
+    python -m benchmarks.bench_import --runs 5
+    python -m benchmarks.bench_import --module main --module bot.handlers.chat_handler --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["bot.handlers.chat_handler", "main"]
+SDK_MODULES = ["openai", "anthropic", "aiohttp", "httpx"]
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "sdks": [name for name in {sdks!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    """Медиана по нескольким запускам отдельного процесса"""
+    env = dict(os.environ)
+    # Ключи всех провайдеров: SDK не должны загружаться только из-за настроенного ключа
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:BENCH")
+    for name in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "DEEPSEEK_API_KEY"):
+        env.setdefault(name, "bench")
+
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, sdks=SDK_MODULES)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        )
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": round(statistics.median(sample["import_ms"] for sample in samples), 1),
+        "max_rss_mb": round(statistics.median(sample["max_rss_mb"] for sample in samples), 1),
+        "modules": samples[-1]["modules"],
+        "sdks": samples[-1]["sdks"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта")
+    parser.add_argument("--module", action="append", help="модуль для импорта (можно несколько раз)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = parser.parse_args()
+
+    results = [measure(module, args.runs) for module in args.module or DEFAULT_MODULES]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'модуль':>28} {'импорт, мс':>11} {'RSS, МБ':>8} {'модулей':>8}  SDK")
+    for result in results:
+        print(f"{result['module']:>28} {result['import_ms']:>11} {result['max_rss_mb']:>8} "
+              f"{result['modules']:>8}  {', '.join(result['sdks']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
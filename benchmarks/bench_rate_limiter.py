@@ -0,0 +1,76 @@
+"""
+Микробенчмарк ограничения частоты запросов: стоимость одной проверки
+
+hot - проверки уже известных пользователей (цель - меньше 1 мкс),
+churn - только новые пользователи: разовая стоимость создания корзины
+с вытеснением старой.
+
+Запуск:
+    python -m benchmarks.bench_rate_limiter --users 10000 --checks 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.rate_limiter import RateLimiter
+
+
+def run_once(scenario: str, users: int, checks: int, max_buckets: int) -> dict:
+    """Замер средней стоимости check() в наносекундах"""
+    limiter = RateLimiter(per_minute=10, max_buckets=max_buckets)
+
+    if scenario == "hot":
+        # Все пользователи уже известны, большинство запросов отклоняется
+        keys = [random.randrange(users) for _ in range(checks)]
+        for key in range(users):
+            limiter.check(key)
+    else:
+        # Поток новых пользователей: вставка и вытеснение корзин
+        keys = list(range(checks))
+
+    check = limiter.check
+    started = time.perf_counter()
+    for key in keys:
+        check(key)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": scenario,
+        "checks": checks,
+        "ns_per_check": round(elapsed / checks * 1e9, 1),
+        **limiter.get_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк ограничения частоты запросов")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--checks", type=int, default=1000000)
+    parser.add_argument("--max-buckets", type=int, default=5000, help="предел корзин для сценария churn")
+    parser.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = parser.parse_args()
+
+    results = [
+        run_once("hot", args.users, args.checks, max(args.users, args.max_buckets)),
+        run_once("churn", args.users, args.checks, args.max_buckets),
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'сценарий':>10} {'нс/проверка':>12} {'корзин':>8} {'вытеснено':>10}")
+    for result in results:
+        print(f"{result['scenario']:>10} {result['ns_per_check']:>12} "
+              f"{result['buckets']:>8} {result['evictions']:>10}")
+
+
+if __name__ == "__main__":
+    main()
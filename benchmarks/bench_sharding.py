@@ -0,0 +1,121 @@
+"""
+Бенчмарк шардирования: пропускная способность в зависимости от числа процессов
+
+Запуск:
+    python -m benchmarks.bench_sharding --workers 1,2,4 --updates 2000 --work-ms 2
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+from telegram import Update
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.sharding import ShardedDispatcher
+
+
+WORK_MS = float(os.environ.get("BENCH_WORK_MS", "2"))
+
+
+class CpuBoundWorker:
+    """Воркер с CPU-нагрузкой вместо обработчиков бота (имитация ORM, HTML, логов)"""
+
+    async def start(self):
+        pass
+
+    def decode(self, data):
+        return Update.de_json(data, None)
+
+    async def process_update(self, update):
+        deadline = time.process_time() + WORK_MS / 1000
+        digest = str(update.update_id).encode()
+        while time.process_time() < deadline:
+            digest = hashlib.sha256(digest).digest()
+
+    async def stop(self):
+        pass
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    """Синтетическое текстовое обновление"""
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": "benchmark"
+        }
+    }, None)
+
+
+async def run_once(workers: int, updates: int, chats: int) -> dict:
+    """Один прогон: время обработки updates обновлений на workers процессах"""
+    dispatcher = ShardedDispatcher(
+        workers,
+        worker_path="benchmarks.bench_sharding:CpuBoundWorker",
+        queue_size=updates + chats,
+        workers_per_shard=4
+    )
+    await dispatcher.start()
+
+    # Прогрев: дожидаемся запуска всех процессов
+    for chat_id in range(chats):
+        await dispatcher.submit(make_update(-chat_id - 1, chat_id))
+    await dispatcher.join(timeout=120)
+
+    started = time.perf_counter()
+    for update_id in range(updates):
+        await dispatcher.submit(make_update(update_id, update_id % chats))
+    await dispatcher.join(timeout=600)
+    elapsed = time.perf_counter() - started
+
+    await dispatcher.stop()
+
+    return {
+        "workers": workers,
+        "updates": updates,
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(updates / elapsed, 1),
+        "latency": dispatcher.latency.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк шардирования обработки")
+    parser.add_argument("--workers", default="1,2,4", help="число процессов через запятую")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--work-ms", type=float, default=WORK_MS, help="CPU-время на обновление")
+    parser.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = parser.parse_args()
+
+    # Значение передается в процессы-воркеры через окружение
+    os.environ["BENCH_WORK_MS"] = str(args.work_ms)
+
+    results = []
+    for workers in [int(n) for n in args.workers.split(",")]:
+        results.append(asyncio.run(run_once(workers, args.updates, args.chats)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    base = results[0]["updates_per_second"]
+    print(f"{'процессов':>10} {'обн/с':>10} {'ускорение':>10} {'p95, мс':>10}")
+    for result in results:
+        speedup = result["updates_per_second"] / base
+        print(f"{result['workers']:>10} {result['updates_per_second']:>10} "
+              f"{speedup:>9.2f}x {result['latency']['p95_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
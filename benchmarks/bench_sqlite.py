@@ -0,0 +1,155 @@
+"""
+Бенчмарк конкурентного доступа к SQLite: профиль default против tuned
+
+Имитирует одновременную обработку сообщений: каждый обработчик читает
+(проверка дубликата, пользователь, последние сообщения), ждет ответ модели
+и записывает сообщение. Профили:
+
+    default - настройки SQLite по умолчанию, общий пул для чтения и записи
+    tuned   - WAL и PRAGMA из database.db.SQLITE_PROFILES, пул читателей
+              и одно соединение писателя
+
+Каждый профиль работает на своей копии одной и той же заполненной базы.
+
+Запуск:
+    python -m benchmarks.bench_sqlite --concurrency 32 --duration 10
+    python -m benchmarks.bench_sqlite --think-ms 50 --users 10000 --messages 200000 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from benchmarks.bench_hot_path import pick_user, seed_database, summarize
+from database.db import SQLITE_PROFILES, build_engine
+
+READ_QUERIES = [
+    "SELECT id FROM messages WHERE chat_id = :chat_id AND telegram_message_id = :message_id LIMIT 1",
+    "SELECT id, current_ai_model FROM users WHERE telegram_id = :chat_id",
+    "SELECT user_message, ai_response FROM messages WHERE user_id = :user_id ORDER BY id DESC LIMIT 20",
+]
+
+INSERT_MESSAGE = (
+    "INSERT INTO messages (user_id, user_message, ai_response, ai_model_used, chat_id, telegram_message_id, "
+    "processing_time) VALUES (:user_id, 'Новый вопрос', :response, 'chatgpt', :chat_id, :message_id, 1500)"
+)
+
+
+def create_pools(profile: str, path: str, readers: int):
+    """Фабрики сессий записи и чтения для профиля"""
+    url = f"sqlite+aiosqlite:///{path}"
+    if profile == "default":
+        engine = build_engine(url, SQLITE_PROFILES["default"])
+        return [engine], async_sessionmaker(engine, class_=AsyncSession), async_sessionmaker(engine, class_=AsyncSession)
+
+    writer = build_engine(url, SQLITE_PROFILES["tuned"], pool_size=1, max_overflow=0)
+    reader = build_engine(url, SQLITE_PROFILES["tuned"], read_only=True, pool_size=readers, max_overflow=0)
+    return [writer, reader], async_sessionmaker(writer, class_=AsyncSession), async_sessionmaker(reader, class_=AsyncSession)
+
+
+async def run_profile(profile: str, path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    engines, write_sessions, read_sessions = create_pools(profile, path, args.readers)
+    rng = random.Random(args.seed)
+    response = "Ответ модели. " * 40
+    next_message_id = args.messages + 1
+
+    reads: List[float] = []
+    writes: List[float] = []
+    errors: Dict[str, int] = {}
+    completed = 0
+    deadline = time.monotonic() + args.duration
+
+    async def handler():
+        nonlocal next_message_id, completed
+        while time.monotonic() < deadline:
+            user_id = pick_user(rng, args.users)
+            message_id = next_message_id
+            next_message_id += 1
+            params = {"user_id": user_id, "chat_id": 10_000_000 + user_id, "message_id": message_id,
+                      "response": response}
+            try:
+                started = time.perf_counter()
+                async with read_sessions() as session:
+                    for query in READ_QUERIES:
+                        (await session.execute(text(query), params)).all()
+                reads.append(time.perf_counter() - started)
+
+                if args.think_ms:
+                    await asyncio.sleep(args.think_ms / 1000)
+
+                started = time.perf_counter()
+                async with write_sessions() as session:
+                    await session.execute(text(INSERT_MESSAGE), params)
+                    await session.commit()
+                writes.append(time.perf_counter() - started)
+                completed += 1
+            except Exception as e:
+                name = type(getattr(e, "orig", None) or e).__name__
+                errors[name] = errors.get(name, 0) + 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(handler() for _ in range(args.concurrency)))
+    elapsed = time.monotonic() - started
+
+    for engine in engines:
+        await engine.dispose()
+
+    return {
+        "profile": profile,
+        "messages_per_s": round(completed / elapsed, 1),
+        "completed": completed,
+        "errors": errors,
+        "read": summarize(reads) if reads else {},
+        "write": summarize(writes) if writes else {},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Конкурентный доступ к SQLite: default против tuned")
+    parser.add_argument("--profiles", default="default,tuned")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=32, help="одновременных обработчиков")
+    parser.add_argument("--readers", type=int, default=4, help="соединений чтения в профиле tuned")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на профиль")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="имитация ответа модели между чтением и записью")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = os.path.join(tmp, "seed.db")
+        seed_database(seeded, args.users, args.messages, args.seed)
+        for profile in args.profiles.split(","):
+            path = os.path.join(tmp, f"{profile}.db")
+            shutil.copyfile(seeded, path)
+            results.append(asyncio.run(run_profile(profile, path, args)))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'профиль':>8} {'сообщ/с':>9} {'чтение p50/p99, мкс':>22} {'запись p50/p99, мкс':>22}  ошибки")
+    for result in results:
+        read, write = result["read"], result["write"]
+        print(f"{result['profile']:>8} {result['messages_per_s']:>9} "
+              f"{read.get('p50_us', '-'):>10} / {read.get('p99_us', '-'):<9} "
+              f"{write.get('p50_us', '-'):>10} / {write.get('p99_us', '-'):<9}  {result['errors'] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Учет активных чатов на колесе таймеров
+"""
+
+import logging
+from typing import Any, Callable, Dict, Hashable, List
+
+from telegram import Update
+
+from config.settings import settings
+from utils.timer_wheel import TimerWheel
+
+
+class ActivityTracker:
+    """
+    Активные чаты с истечением по таймауту
+
+    Чат активен, пока его обновления обрабатываются, и еще activity_timeout
+    секунд после завершения последнего из них. Истечение выполняется на
+    колесе таймеров при каждом событии, без фоновых пауз и полного обхода.
+    """
+
+    def __init__(self, activity_timeout: float = settings.activity_timeout, tick: float = 1.0):
+        self.activity_timeout = activity_timeout
+        self.wheel = TimerWheel(tick=tick)
+        self._in_progress: Dict[Hashable, int] = {}
+        self._expire_callbacks: List[Callable[[Hashable], Any]] = []
+        self.sessions_started = 0
+        self.sessions_expired = 0
+
+    @staticmethod
+    def _key(update: Update) -> Hashable:
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return None
+
+    def add_expire_callback(self, callback: Callable[[Hashable], Any]):
+        """Подписка на истечение активности чата"""
+        self._expire_callbacks.append(callback)
+
+    def is_active(self, key: Hashable) -> bool:
+        self.expire()
+        return key in self._in_progress or key in self.wheel
+
+    @property
+    def active_count(self) -> int:
+        self.expire()
+        return len(self._in_progress) + len(self.wheel)
+
+    def on_update_started(self, update: Update):
+        """Хук диспетчера: начало обработки обновления"""
+        key = self._key(update)
+        if key is None:
+            return
+
+        self.expire()
+
+        # Пока обновление обрабатывается, чат не может истечь
+        was_scheduled = self.wheel.cancel(key)
+        if key not in self._in_progress and not was_scheduled:
+            self.sessions_started += 1
+
+        self._in_progress[key] = self._in_progress.get(key, 0) + 1
+
+    def on_update_done(self, update: Update):
+        """Хук диспетчера: завершение обработки обновления"""
+        key = self._key(update)
+        if key is None or key not in self._in_progress:
+            return
+
+        self._in_progress[key] -= 1
+        if self._in_progress[key] == 0:
+            del self._in_progress[key]
+            self.wheel.schedule(key, self.activity_timeout)
+
+        self.expire()
+
+    def expire(self) -> List[Hashable]:
+        """Снять активность с чатов, у которых истек таймаут"""
+        expired = self.wheel.advance()
+
+        for key in expired:
+            self.sessions_expired += 1
+            for callback in self._expire_callbacks:
+                try:
+                    callback(key)
+                except Exception as e:
+                    logging.error(f"❌ Ошибка обработчика истечения активности {key}: {e}")
+
+        return expired
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика активности"""
+        return {
+            "active_chats": self.active_count,
+            "processing_chats": len(self._in_progress),
+            "sessions_started": self.sessions_started,
+            "sessions_expired": self.sessions_expired,
+        }
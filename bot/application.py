@@ -0,0 +1,18 @@
+"""
+Создание приложения python-telegram-bot по настройкам
+"""
+
+from telegram.ext import Application
+
+from config.settings import settings
+
+
+def build_application() -> Application:
+    """Приложение бота; TELEGRAM_BASE_URL направляет запросы к Bot API на другой сервер"""
+    builder = Application.builder().token(settings.telegram_token)
+
+    if settings.telegram_base_url:
+        base_url = settings.telegram_base_url.rstrip("/")
+        builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+
+    return builder.build()
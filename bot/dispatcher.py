@@ -0,0 +1,187 @@
+"""
+Диспетчер обновлений: порядок внутри чата, параллельность между чатами
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+from config.settings import settings
+from utils.metrics import LatencyTracker
+
+
+class UpdateDispatcher:
+    """
+    Асинхронный диспетчер обновлений
+
+    Обновления одного чата обрабатываются строго по очереди, разные чаты -
+    параллельно, но не более max_workers одновременно. Очередь ограничена
+    queue_size: при переполнении submit() ждет освобождения места.
+
+    Хуки до и после обработки позволяют подсистемам реагировать на обновления,
+    не оборачивая обработчики приложения.
+    """
+
+    def __init__(self, application: Application,
+                 max_workers: int = settings.dispatcher_workers,
+                 queue_size: int = settings.dispatcher_queue_size):
+        self.application = application
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+
+        # Ожидающие обновления по чатам и очередь чатов, готовых к обработке.
+        # Чат находится в _ready не более одного раза, поэтому его обновления
+        # никогда не обрабатываются двумя воркерами одновременно.
+        self._chats: Dict[Hashable, Deque[Tuple[float, Update]]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._pending = 0
+        self._busy = 0
+        self._not_full = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._not_full.set()
+        self._idle.set()
+
+        self._pre_process_hooks: List[Callable[[Update], Any]] = []
+        self._post_process_hooks: List[Callable[[Update], Any]] = []
+
+        # Метрики
+        self.wait_time = LatencyTracker()  # от постановки в очередь до начала обработки
+        self.process_time = LatencyTracker()
+        self.processed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    @staticmethod
+    def _chat_key(update: Update) -> Hashable:
+        """Ключ упорядочивания: чат, иначе пользователь, иначе само обновление"""
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        return ("update", update.update_id)
+
+    def add_pre_process_hook(self, hook: Callable[[Update], Any]):
+        """Хук, вызываемый перед обработкой обновления"""
+        self._pre_process_hooks.append(hook)
+
+    def add_post_process_hook(self, hook: Callable[[Update], Any]):
+        """Хук, вызываемый после обработки обновления (в том числе при ошибке)"""
+        self._post_process_hooks.append(hook)
+
+    @staticmethod
+    def _run_hooks(hooks: List[Callable[[Update], Any]], update: Update):
+        for hook in hooks:
+            try:
+                hook(update)
+            except Exception as e:
+                logging.error(f"❌ Ошибка хука диспетчера для обновления {update.update_id}: {e}")
+
+    def _enqueue(self, update: Update):
+        self._pending += 1
+        self._idle.clear()
+        self.max_queue_depth = max(self.max_queue_depth, self._pending)
+
+        key = self._chat_key(update)
+        item = (time.monotonic(), update)
+
+        chat_queue = self._chats.get(key)
+        if chat_queue is None:
+            self._chats[key] = deque([item])
+            self._ready.put_nowait(key)
+        else:
+            chat_queue.append(item)
+
+    async def submit(self, update: Update):
+        """Поставить обновление в очередь, ожидая свободного места"""
+        while self._pending >= self.queue_size:
+            self._not_full.clear()
+            await self._not_full.wait()
+
+        self._enqueue(update)
+
+    def try_submit(self, update: Update) -> bool:
+        """Поставить обновление в очередь без ожидания; False если очередь заполнена"""
+        if self._pending >= self.queue_size:
+            self.rejected += 1
+            return False
+
+        self._enqueue(update)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            chat_queue = self._chats[key]
+            enqueued_at, update = chat_queue.popleft()
+
+            started = time.monotonic()
+            self.wait_time.record(started - enqueued_at)
+            self._busy += 1
+            self._run_hooks(self._pre_process_hooks, update)
+
+            try:
+                await self.application.process_update(update)
+            except Exception as e:
+                logging.error(f"❌ Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                self._run_hooks(self._post_process_hooks, update)
+                self._busy -= 1
+                self.process_time.record(time.monotonic() - started)
+                self.processed += 1
+                self._pending -= 1
+                self._not_full.set()
+
+                # Чат возвращается в конец очереди, чтобы один активный чат
+                # не занимал воркер в ущерб остальным
+                if chat_queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+
+                if self._pending == 0:
+                    self._idle.set()
+
+    async def start(self):
+        """Запуск воркеров"""
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"UpdateDispatcher:worker:{i}")
+            for i in range(self.max_workers)
+        ]
+        logging.info(f"🔄 Диспетчер обновлений запущен ({self.max_workers} воркеров)")
+
+    async def join(self, timeout: Optional[float] = None):
+        """Ожидание обработки всех поставленных в очередь обновлений"""
+        await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+
+    async def stop(self, timeout: Optional[float] = 30):
+        """Остановка: дообработка очереди и завершение воркеров"""
+        if self._workers:
+            try:
+                await self.join(timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"⚠️ Диспетчер остановлен с {self._pending} необработанными обновлениями")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика диспетчера для подбора числа воркеров"""
+        return {
+            "workers": self.max_workers,
+            "busy_workers": self._busy,
+            "queue_depth": self._pending,
+            "max_queue_depth": self.max_queue_depth,
+            "active_chats": len(self._chats),
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "wait_time": self.wait_time.snapshot(),
+            "process_time": self.process_time.snapshot(),
+        }
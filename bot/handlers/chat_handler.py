@@ -5,11 +5,22 @@
 from telegram import Update
 from telegram.ext import Application, MessageHandler, filters, ContextTypes
 from telegram.constants import ChatAction
-from database.db import AsyncSessionLocal
+from database.db import AsyncReadSessionLocal, AsyncSessionLocal
 from services.user_service import UserService
 from services.ai_factory import ai_factory
+from services.context_builder import context_builder
+from services.dedup_service import message_deduplicator
+from services.errors import AIServiceError, AllProvidersFailedError
+from services.failover import failover_executor
+from services.message_writer import message_writer
+from services.providers import provider_registry
+from services.rate_limiter import user_rate_limiter
+from services.usage import usage_tracker
 from models.message import Message
+from bot.streaming import StreamingReply
+from config.settings import settings
 import logging
+import math
 import time
 import asyncio
 
@@ -24,20 +35,55 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🤔 Пожалуйста, отправьте текстовое сообщение.")
         return
     
-    logging.info(f"Получено сообщение от пользователя {user.id}: {message_text[:50]}...")
+    # Ограничение частоты запросов - до любой работы с базой и провайдером
+    if user_rate_limiter is not None:
+        retry_after = user_rate_limiter.check(user.id)
+        if retry_after:
+            await update.message.reply_text(
+                f"⏳ Слишком много запросов. Попробуйте еще раз через {math.ceil(retry_after)} сек."
+            )
+            return
     
-    # Показываем, что бот печатает
-    await context.bot.send_chat_action(
-        chat_id=update.effective_chat.id,
-        action=ChatAction.TYPING
-    )
+    chat_id = update.effective_chat.id
+    telegram_message_id = update.message.message_id
+    
+    # Повторная доставка того же сообщения, которое сейчас обрабатывается
+    if not message_deduplicator.begin(chat_id, telegram_message_id):
+        logging.info(f"Пропущено повторно доставленное сообщение {chat_id}:{telegram_message_id}")
+        return
+    
+    try:
+        await process_message(update, context, user, message_text)
+    finally:
+        message_deduplicator.finish(chat_id, telegram_message_id)
+
+
+async def process_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user, message_text: str):
+    """Обработка текстового сообщения: ответ AI и сохранение в базу"""
+    
+    chat_id = update.effective_chat.id
+    
+    logging.info(f"Получено сообщение от пользователя {user.id}: {message_text[:50]}...")
     
     start_time = time.time()
     
-    async with AsyncSessionLocal() as db_session:
+    # Чтение - через пул читателей, запись - короткими транзакциями писателя
+    async with AsyncSessionLocal() as db_session, AsyncReadSessionLocal() as read_session:
         try:
+            # Сообщение уже обработано (в очереди записи или до перезапуска) - не повторяем платный запрос
+            if (message_writer.is_pending(chat_id, update.message.message_id)
+                    or await message_deduplicator.is_duplicate(read_session, chat_id, update.message.message_id)):
+                logging.info(f"Пропущено уже обработанное сообщение {chat_id}:{update.message.message_id}")
+                return
+            
+            # Показываем, что бот печатает
+            await context.bot.send_chat_action(
+                chat_id=chat_id,
+                action=ChatAction.TYPING
+            )
+            
             # Получаем или создаем пользователя
-            user_service = UserService(db_session)
+            user_service = UserService(db_session, read_session=read_session)
             user_obj = await user_service.get_or_create_user(
                 telegram_id=user.id,
                 username=user.username,
@@ -57,41 +103,76 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             # Генерируем ответ от AI
             try:
-                # Получаем контекст предыдущих сообщений (последние 5)
-                context_messages = await get_conversation_context(db_session, user_obj.id, limit=5)
-                context_text = format_context(context_messages) if context_messages else None
-                
-                ai_response = await ai_service.generate_response(
-                    message=message_text,
-                    context=context_text
+                # Контекст в пределах бюджета токенов модели, старое - в кратком содержании
+                context_turns, prompt_tokens = await context_builder.build(
+                    read_session, user_obj.id, current_model, message_text, user_obj.context_epoch
                 )
+                # Не держим соединение и снимок чтения во время ответа модели
+                await read_session.close()
+                
+                # Токены из ответов провайдеров на этот запрос
+                usage = usage_tracker.capture()
+                
+                if settings.streaming_enabled:
+                    # Отправляем ответ по мере генерации
+                    answered_model, ai_response, first_token_time = await stream_ai_response(
+                        update, current_model, message_text, context_turns, start_time
+                    )
+                else:
+                    answered_model, ai_response = await failover_executor.generate(
+                        current_model, message_text, context_turns
+                    )
+                    first_token_time = None
+                
+                # Ответ из кэша не расходует токены - остается оценка
+                answered_usage = usage.get(answered_model)
+                if answered_usage:
+                    prompt_tokens = answered_usage["prompt_tokens"]
+                cached_tokens = answered_usage["cached_tokens"] if answered_usage else None
                 
                 # Вычисляем время обработки
                 processing_time = int((time.time() - start_time) * 1000)
+                if first_token_time is None:
+                    first_token_time = processing_time
+                
+                if not settings.streaming_enabled:
+                    # Отправляем ответ пользователю
+                    answered_service = ai_factory.get_service(answered_model)
+                    response_text = (
+                        f"{get_model_emoji(answered_model)} <b>{answered_service.get_model_name()}</b>\n\n{ai_response}"
+                    )
+                    
+                    await update.message.reply_text(
+                        response_text,
+                        parse_mode='HTML'
+                    )
                 
-                # Сохраняем сообщение в базу данных
+                # Сохраняем сообщение в базу уже после ответа: запись пачками в фоне
                 message_obj = Message(
                     user_id=user_obj.id,
                     user_message=message_text,
                     ai_response=ai_response,
-                    ai_model_used=current_model,
+                    ai_model_used=answered_model,
+                    context_epoch=user_obj.context_epoch,
+                    chat_id=chat_id,
                     telegram_message_id=update.message.message_id,
-                    processing_time=processing_time
+                    processing_time=processing_time,
+                    first_token_time=first_token_time,
+                    prompt_tokens=prompt_tokens,
+                    cached_tokens=cached_tokens
                 )
+                await message_writer.add(message_obj)
+                # Следующий вопрос соберет контекст из памяти, без обращения к базе
+                context_builder.remember(message_obj)
                 
-                db_session.add(message_obj)
-                await db_session.commit()
-                
-                # Отправляем ответ пользователю
-                model_emoji = get_model_emoji(current_model)
-                response_text = f"{model_emoji} <b>{ai_service.get_model_name()}</b>\n\n{ai_response}"
-                
-                await update.message.reply_text(
-                    response_text,
-                    parse_mode='HTML'
+                logging.info(
+                    f"Отправлен ответ пользователю {user.id} "
+                    f"({processing_time}ms, первый фрагмент {first_token_time}ms)"
                 )
                 
-                logging.info(f"Отправлен ответ пользователю {user.id} ({processing_time}ms)")
+            except AllProvidersFailedError as e:
+                logging.error(f"Ни одна модель не ответила: {e}")
+                await send_model_unavailable_message(update, current_model)
                 
             except Exception as e:
                 logging.error(f"Ошибка при генерации ответа AI: {e}")
@@ -107,52 +188,55 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
 
-async def get_conversation_context(db_session, user_id: int, limit: int = 5) -> list:
-    """Получение контекста беседы из базы данных"""
-    
-    from sqlalchemy.future import select
-    from sqlalchemy import desc
+async def stream_ai_response(update: Update, model_name: str, message_text: str,
+                             context_turns: list, start_time: float) -> tuple:
+    """Потоковая генерация ответа с прогрессивной правкой сообщения"""
     
-    try:
-        # Получаем последние сообщения пользователя
-        result = await db_session.execute(
-            select(Message)
-            .where(Message.user_id == user_id)
-            .where(Message.ai_response.isnot(None))
-            .order_by(desc(Message.created_at))
-            .limit(limit)
-        )
-        
-        messages = result.scalars().all()
-        return list(reversed(messages))  # Возвращаем в хронологическом порядке
-        
-    except Exception as e:
-        logging.error(f"Ошибка получения контекста: {e}")
-        return []
-
-
-def format_context(messages: list) -> str:
-    """Форматирование контекста для передачи в AI"""
+    # Первый фрагмент: до него возможны хеджирование и переключение модели
+    answered_model, ai_service, stream = await failover_executor.open_stream(
+        model_name, message_text, context_turns
+    )
+    first_token_time = int((time.time() - start_time) * 1000)
     
-    if not messages:
-        return None
+    header = f"{get_model_emoji(answered_model)} {ai_service.get_model_name()}"
+    reply = StreamingReply(update.message, header)
     
-    context_parts = []
-    for msg in messages:
-        context_parts.append(f"Пользователь: {msg.user_message}")
-        if msg.ai_response:
-            context_parts.append(f"Ассистент: {msg.ai_response}")
+    try:
+        async for delta in stream:
+            await reply.append(delta)
+    except AIServiceError as e:
+        # Часть ответа уже показана - дописываем пометку вместо нового сообщения
+        logging.error(f"Поток ответа прерван: {e}")
+        reply.text += "\n\n⚠️ Ответ прерван из-за ошибки сервиса."
     
-    return "\n\n".join(context_parts)
+    ai_response = reply.text.strip()
+    await reply.finish(ai_response)
+    return answered_model, ai_response, first_token_time
 
 
 async def send_model_unavailable_message(update: Update, model_name: str):
     """Отправка сообщения о недоступности модели"""
     
-    available_models = ai_factory.get_available_models()
-    available_list = [name for name, available in available_models.items() if available]
+    # Учитываем не только ключи, но и открытые автоматы защиты
+    provider_status = ai_factory.get_provider_status()
+    available_list = [name for name, status in provider_status.items() if status["accepting"]]
+    requested = provider_status.get(model_name, {})
     
-    if not available_list:
+    if requested.get("configured") and not requested.get("accepting"):
+        retry_in = int(requested["breaker"]["retry_in"]) + 1
+        alternatives = ", ".join(name for name in available_list if name != model_name)
+        error_text = f"""
+😔 <b>Модель {model_name} временно недоступна из-за ошибок сервиса.</b>
+
+Попробуйте еще раз примерно через {retry_in} сек.
+"""
+        if alternatives:
+            error_text += f"""
+Сейчас доступны: {alternatives}
+
+Используйте команду /model для выбора другой модели.
+"""
+    elif not available_list:
         error_text = """
 😔 <b>К сожалению, ни одна AI модель сейчас недоступна.</b>
 
@@ -178,13 +262,8 @@ async def send_model_unavailable_message(update: Update, model_name: str):
 def get_model_emoji(model_name: str) -> str:
     """Получение эмодзи для модели"""
     
-    emojis = {
-        "chatgpt": "🧠",
-        "claude": "🎭",
-        "deepseek": "🚀"
-    }
-    
-    return emojis.get(model_name, "🤖")
+    spec = provider_registry.get(model_name)
+    return spec.emoji if spec else "🤖"
 
 
 async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
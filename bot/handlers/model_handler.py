@@ -4,32 +4,19 @@
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from database.db import AsyncSessionLocal
+from database.db import AsyncReadSessionLocal, AsyncSessionLocal
 from services.user_service import UserService
+from services.providers import provider_registry
 import logging
 
 
-# Конфигурация доступных моделей
-AVAILABLE_MODELS = {
-    "chatgpt": {
-        "name": "ChatGPT",
-        "emoji": "🧠",
-        "description": "Универсальный помощник от OpenAI",
-        "provider": "OpenAI"
-    },
-    "claude": {
-        "name": "Claude",
-        "emoji": "🎭", 
-        "description": "Продвинутая модель от Anthropic",
-        "provider": "Anthropic"
-    },
-    "deepseek": {
-        "name": "DeepSeek",
-        "emoji": "🚀",
-        "description": "Быстрая и эффективная модель",
-        "provider": "DeepSeek"
-    }
-}
+def format_model(model_key: str) -> str:
+    """Эмодзи и название модели из реестра провайдеров"""
+    
+    spec = provider_registry.get(model_key)
+    if spec is None:
+        return f"🤖 <b>{model_key}</b>"
+    return f"{spec.emoji} <b>{spec.name}</b>"
 
 
 async def model_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -38,40 +25,36 @@ async def model_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     logging.info(f"Пользователь {user.id} открыл меню выбора модели")
     
-    # Получаем текущую модель пользователя
+    # Получаем текущую модель пользователя (создаем пользователя, если его нет)
     async with AsyncSessionLocal() as db_session:
         user_service = UserService(db_session)
-        current_model = await user_service.get_user_model(user.id)
-        
-        if not current_model:
-            # Создаем пользователя если его нет
-            await user_service.get_or_create_user(
-                telegram_id=user.id,
-                username=user.username,
-                first_name=user.first_name,
-                last_name=user.last_name
-            )
-            current_model = "chatgpt"  # по умолчанию
+        user_obj = await user_service.get_or_create_user(
+            telegram_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name
+        )
+        current_model = user_obj.current_ai_model
     
     text = f"""
 🤖 <b>Выбор нейросети</b>
 
-Текущая модель: {AVAILABLE_MODELS[current_model]['emoji']} <b>{AVAILABLE_MODELS[current_model]['name']}</b>
+Текущая модель: {format_model(current_model)}
 
 Выберите модель для общения:
 """
     
     # Создаем клавиатуру с моделями
     keyboard = []
-    for model_key, model_info in AVAILABLE_MODELS.items():
+    for spec in provider_registry.specs():
         # Отмечаем текущую модель
-        prefix = "✅ " if model_key == current_model else ""
-        button_text = f"{prefix}{model_info['emoji']} {model_info['name']}"
+        prefix = "✅ " if spec.key == current_model else ""
+        button_text = f"{prefix}{spec.emoji} {spec.name}"
         
         keyboard.append([
             InlineKeyboardButton(
                 button_text, 
-                callback_data=f"select_{model_key}"
+                callback_data=f"select_{spec.key}"
             )
         ])
     
@@ -120,28 +103,28 @@ async def show_model_selection(query, user):
     """Показать меню выбора модели"""
     
     # Получаем текущую модель пользователя
-    async with AsyncSessionLocal() as db_session:
-        user_service = UserService(db_session)
+    async with AsyncReadSessionLocal() as read_session:
+        user_service = UserService(read_session)
         current_model = await user_service.get_user_model(user.id) or "chatgpt"
     
     text = f"""
 🤖 <b>Выбор нейросети</b>
 
-Текущая модель: {AVAILABLE_MODELS[current_model]['emoji']} <b>{AVAILABLE_MODELS[current_model]['name']}</b>
+Текущая модель: {format_model(current_model)}
 
 Выберите модель для общения:
 """
     
     # Создаем клавиатуру с моделями
     keyboard = []
-    for model_key, model_info in AVAILABLE_MODELS.items():
-        prefix = "✅ " if model_key == current_model else ""
-        button_text = f"{prefix}{model_info['emoji']} {model_info['name']}"
+    for spec in provider_registry.specs():
+        prefix = "✅ " if spec.key == current_model else ""
+        button_text = f"{prefix}{spec.emoji} {spec.name}"
         
         keyboard.append([
             InlineKeyboardButton(
                 button_text, 
-                callback_data=f"select_{model_key}"
+                callback_data=f"select_{spec.key}"
             )
         ])
     
@@ -161,7 +144,7 @@ async def show_model_selection(query, user):
 async def handle_model_selection(query, user, model_key):
     """Обработка выбора конкретной модели"""
     
-    if model_key not in AVAILABLE_MODELS:
+    if model_key not in provider_registry:
         await query.edit_message_text("❌ Неизвестная модель!")
         return
     
@@ -180,14 +163,14 @@ async def handle_model_selection(query, user, model_key):
             )
             await user_service.update_user_model(user.id, model_key)
     
-    model_info = AVAILABLE_MODELS[model_key]
+    spec = provider_registry.get(model_key)
     
     success_text = f"""
 ✅ <b>Модель успешно изменена!</b>
 
-{model_info['emoji']} <b>{model_info['name']}</b>
-📝 {model_info['description']}
-🏢 Провайдер: {model_info['provider']}
+{spec.emoji} <b>{spec.name}</b>
+📝 {spec.description}
+🏢 Провайдер: {spec.provider}
 
 Теперь отправьте любое сообщение, и я отвечу с помощью выбранной модели!
 """
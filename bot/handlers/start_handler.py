@@ -4,6 +4,9 @@
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, ContextTypes
+from database.db import AsyncSessionLocal
+from services.context_builder import context_builder
+from services.user_service import UserService
 import logging
 
 
@@ -92,10 +95,27 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /clear для очистки контекста"""
     
-    user_id = update.effective_user.id
+    user = update.effective_user
+    user_id = user.id
+    
+    try:
+        async with AsyncSessionLocal() as db_session:
+            user_service = UserService(db_session)
+            user_obj = await user_service.get_or_create_user(
+                telegram_id=user.id,
+                username=user.username,
+                first_name=user.first_name,
+                last_name=user.last_name
+            )
+            # Новая беседа - одно обновление строки users; сообщения остаются в базе
+            await user_service.start_new_conversation(user.id)
+    except Exception as e:
+        logging.error(f"❌ Ошибка очистки контекста пользователя {user_id}: {e}")
+        await update.message.reply_text("❌ Не удалось очистить контекст. Попробуйте позже.")
+        return
     
-    # Здесь будет логика очистки контекста из базы данных
-    # Пока просто отправляем подтверждение
+    # Прежняя беседа больше не собирается из памяти
+    context_builder.forget(user_obj.id)
     
     clear_text = """
 🧹 <b>Контекст беседы очищен!</b>
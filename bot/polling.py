@@ -0,0 +1,140 @@
+"""
+Long polling для получения обновлений от Telegram
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import Application
+
+from bot.dispatcher import UpdateDispatcher
+from config.settings import settings
+from services.offset_store import OffsetStore
+from utils.metrics import LatencyTracker
+
+
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
+class LongPolling:
+    """
+    Long polling без клиентских пауз
+
+    Следующий getUpdates отправляется сразу после получения пачки обновлений,
+    ожидание новых сообщений происходит на стороне Telegram (параметр timeout).
+    При ошибках используется экспоненциальная задержка с джиттером.
+    Если очередь диспетчера заполнена, polling ждет освобождения места.
+    С OffsetStore polling продолжает с сохраненного offset после перезапуска.
+    """
+
+    def __init__(self, application: Application, dispatcher: UpdateDispatcher,
+                 offset_store: Optional[OffsetStore] = None,
+                 timeout: int = settings.polling_timeout,
+                 limit: int = 100,
+                 backoff_base: float = settings.polling_backoff_base,
+                 backoff_max: float = settings.polling_backoff_max):
+        self.application = application
+        self.dispatcher = dispatcher
+        self.offset_store = offset_store
+        self.timeout = timeout
+        self.limit = limit
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.offset = 0
+        self.running = False
+
+        # Метрики
+        self.ingest_latency = LatencyTracker()  # от отправки сообщения до постановки в очередь
+        self.request_latency = LatencyTracker()  # длительность непустых запросов getUpdates
+        self.requests = 0
+        self.updates_received = 0
+        self.errors = 0
+        self._consecutive_errors = 0
+
+    def _backoff_delay(self) -> float:
+        """Экспоненциальная задержка с джиттером (equal jitter)"""
+        exponent = min(self._consecutive_errors - 1, 16)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** exponent))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def start(self):
+        """Запуск цикла long polling"""
+        logging.info(f"🚀 Long polling запущен (timeout={self.timeout}с)")
+
+        self.running = True
+
+        if self.offset_store:
+            self.offset = max(self.offset, await self.offset_store.load())
+
+        # getUpdates не работает, пока зарегистрирован webhook
+        try:
+            await self.application.bot.delete_webhook()
+        except Exception as e:
+            logging.warning(f"⚠️ Не удалось удалить webhook: {e}")
+
+        while self.running:
+            started = time.monotonic()
+
+            try:
+                updates = await self.application.bot.get_updates(
+                    offset=self.offset,
+                    limit=self.limit,
+                    timeout=self.timeout,
+                    allowed_updates=ALLOWED_UPDATES
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                self._consecutive_errors += 1
+                delay = self._backoff_delay()
+
+                if isinstance(e, RetryAfter):
+                    retry_after = e.retry_after
+                    if isinstance(retry_after, timedelta):
+                        retry_after = retry_after.total_seconds()
+                    delay = max(delay, float(retry_after))
+
+                logging.error(f"❌ Ошибка long polling: {e}. Повтор через {delay:.1f}с")
+                await asyncio.sleep(delay)
+                continue
+
+            self.requests += 1
+            self._consecutive_errors = 0
+
+            if not updates:
+                continue
+
+            self.request_latency.record(time.monotonic() - started)
+            now = time.time()
+
+            for update in updates:
+                if update.message and update.message.date:
+                    self.ingest_latency.record(max(0.0, now - update.message.date.timestamp()))
+
+                if self.offset_store:
+                    self.offset_store.track(update)
+
+                await self.dispatcher.submit(update)
+                self.offset = update.update_id + 1
+                self.updates_received += 1
+
+    def stop(self):
+        """Остановка polling"""
+        self.running = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика polling для мониторинга"""
+        return {
+            "offset": self.offset,
+            "requests": self.requests,
+            "updates": self.updates_received,
+            "errors": self.errors,
+            "ingest_latency": self.ingest_latency.snapshot(),
+            "request_latency": self.request_latency.snapshot(),
+        }
@@ -0,0 +1,353 @@
+"""
+Шардирование обработки обновлений по процессам-воркерам
+
+Один процесс получает обновления (polling или webhook) и распределяет их
+между N процессами. Каждый процесс запускает полный стек обработчиков и свой
+UpdateDispatcher, поэтому порядок внутри чата сохраняется. Кэши пользователей
+и бесед живут в памяти процесса и ключуются пользователем, поэтому при
+включенных кэшах обновления распределяются по пользователю, иначе - по чату.
+"""
+
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from telegram import Update
+
+from bot.dispatcher import UpdateDispatcher
+from config.settings import settings
+from utils.metrics import LatencyTracker
+
+
+DEFAULT_WORKER = "bot.sharding:BotShardWorker"
+
+
+class BotShardWorker:
+    """Приложение бота внутри процесса-воркера"""
+
+    def __init__(self):
+        from bot.application import build_application
+        from bot.handlers import register_handlers
+
+        self.application = build_application()
+        register_handlers(self.application)
+
+    async def start(self):
+        from utils.logger import setup_logger
+
+        setup_logger()
+        await self.application.initialize()
+        await self.application.start()
+
+    def decode(self, data: Dict[str, Any]) -> Update:
+        return Update.de_json(data, self.application.bot)
+
+    async def process_update(self, update: Update):
+        await self.application.process_update(update)
+
+    async def stop(self):
+        from database.db import close_database
+        from services.ai_factory import ai_factory
+        from services.context_builder import context_builder
+        from services.message_writer import message_writer
+
+        await self.application.stop()
+        await self.application.shutdown()
+        await message_writer.stop()
+        await context_builder.stop()
+        await ai_factory.aclose()
+        await close_database()
+
+
+def _load_worker_class(path: str) -> Callable[[], Any]:
+    """Загрузка класса воркера по пути вида 'module:Class'"""
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+async def _shard_worker_loop(shard_id: int, worker_path: str, updates_queue, acks_queue,
+                             max_workers: int):
+    worker = _load_worker_class(worker_path)()
+    await worker.start()
+
+    dispatcher = UpdateDispatcher(worker, max_workers=max_workers, queue_size=max_workers * 4)
+    dispatcher.add_post_process_hook(lambda update: acks_queue.put(update.update_id))
+    await dispatcher.start()
+
+    loop = asyncio.get_running_loop()
+    logging.info(f"🧩 Шард {shard_id} запущен")
+
+    while True:
+        data = await loop.run_in_executor(None, updates_queue.get)
+        if data is None:
+            break
+
+        try:
+            update = worker.decode(data)
+        except Exception as e:
+            logging.error(f"❌ Шард {shard_id}: не удалось разобрать обновление: {e}")
+            if data.get("update_id") is not None:
+                acks_queue.put(data["update_id"])
+            continue
+
+        await dispatcher.submit(update)
+
+    await dispatcher.stop(timeout=None)
+    await worker.stop()
+    logging.info(f"🧩 Шард {shard_id} остановлен")
+
+
+def run_shard_worker(shard_id: int, worker_path: str, updates_queue, acks_queue, max_workers: int):
+    """Точка входа процесса-воркера"""
+    asyncio.run(_shard_worker_loop(shard_id, worker_path, updates_queue, acks_queue, max_workers))
+
+
+class _Shard:
+    """Процесс-воркер и его неподтвержденные обновления"""
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.process: Optional[multiprocessing.Process] = None
+        self.updates_queue = None
+        self.acks_queue = None
+        self.reader: Optional[threading.Thread] = None
+        # update_id -> (порядковый номер, данные, обновление, время постановки)
+        self.in_flight: Dict[int, Tuple[int, Dict[str, Any], Update, float]] = {}
+        self.acked = 0
+        self.restarts = 0
+
+
+class ShardedDispatcher:
+    """
+    Распределение обновлений по процессам через multiprocessing очереди
+
+    Обновление считается обработанным только после подтверждения воркером.
+    Если процесс упал или был перезапущен, все неподтвержденные обновления
+    шарда отправляются новому процессу в исходном порядке.
+    Интерфейс совпадает с UpdateDispatcher, поэтому источники обновлений
+    работают с ним без изменений.
+    """
+
+    def __init__(self, num_workers: int = settings.shard_workers,
+                 worker_path: str = DEFAULT_WORKER,
+                 queue_size: int = settings.dispatcher_queue_size,
+                 workers_per_shard: int = settings.dispatcher_workers,
+                 check_interval: float = 1.0,
+                 route_by_user: Optional[bool] = None):
+        self.num_workers = num_workers
+        if route_by_user is None:
+            route_by_user = settings.user_cache_size > 0 or settings.context_cache_users > 0
+        self.route_by_user = route_by_user
+        self.worker_path = worker_path
+        self.queue_size = queue_size
+        self.workers_per_shard = workers_per_shard
+        self.check_interval = check_interval
+
+        self._context = multiprocessing.get_context("spawn")
+        self._shards = [_Shard(i) for i in range(num_workers)]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self._sequence = 0
+        self._pending = 0
+        self._not_full = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._not_full.set()
+        self._idle.set()
+
+        self._pre_process_hooks: List[Callable[[Update], Any]] = []
+        self._post_process_hooks: List[Callable[[Update], Any]] = []
+
+        # Метрики
+        self.latency = LatencyTracker()  # от постановки в очередь до подтверждения
+        self.processed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    def add_pre_process_hook(self, hook: Callable[[Update], Any]):
+        """Хук, вызываемый при передаче обновления в шард"""
+        self._pre_process_hooks.append(hook)
+
+    def add_post_process_hook(self, hook: Callable[[Update], Any]):
+        """Хук, вызываемый после подтверждения обработки воркером"""
+        self._post_process_hooks.append(hook)
+
+    def shard_for(self, update: Update) -> int:
+        """Номер шарда для обновления (по пользователю или по ключу чата)"""
+        if self.route_by_user and update.effective_user:
+            key: Hashable = ("user", update.effective_user.id)
+        else:
+            key = UpdateDispatcher._chat_key(update)
+        return hash(key) % self.num_workers
+
+    # --- Управление процессами ---
+
+    def _spawn(self, shard: _Shard):
+        shard.updates_queue = self._context.Queue()
+        shard.acks_queue = self._context.Queue()
+        shard.process = self._context.Process(
+            target=run_shard_worker,
+            args=(shard.shard_id, self.worker_path, shard.updates_queue,
+                  shard.acks_queue, self.workers_per_shard),
+            name=f"TeleGPT-shard-{shard.shard_id}",
+            daemon=True
+        )
+        shard.process.start()
+
+        acks_queue = shard.acks_queue
+        shard.reader = threading.Thread(
+            target=self._read_acks, args=(shard, acks_queue),
+            name=f"shard-{shard.shard_id}-acks", daemon=True
+        )
+        shard.reader.start()
+
+        # Повторная отправка неподтвержденных обновлений в исходном порядке
+        for _, data, _, _ in sorted(shard.in_flight.values(), key=lambda item: item[0]):
+            shard.updates_queue.put(data)
+
+    def _read_acks(self, shard: _Shard, acks_queue):
+        while True:
+            update_id = acks_queue.get()
+            if update_id is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_ack, shard, update_id)
+
+    def _retire(self, shard: _Shard):
+        """Освобождение очередей старого процесса"""
+        if shard.updates_queue is not None:
+            # Упавший процесс больше не читает очередь - не ждем ее сброса при выходе
+            shard.updates_queue.cancel_join_thread()
+            shard.updates_queue.close()
+        if shard.acks_queue is not None:
+            shard.acks_queue.put(None)  # останавливает поток чтения подтверждений
+
+    def restart_worker(self, shard_id: int):
+        """Плавный перезапуск воркера: текущая очередь дообрабатывается, остаток переотправляется"""
+        shard = self._shards[shard_id]
+        if shard.updates_queue is not None:
+            shard.updates_queue.put(None)
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+
+            for shard in self._shards:
+                if shard.process and not shard.process.is_alive():
+                    logging.warning(
+                        f"⚠️ Шард {shard.shard_id} завершился (код {shard.process.exitcode}), "
+                        f"перезапуск с {len(shard.in_flight)} неподтвержденными обновлениями"
+                    )
+                    self._retire(shard)
+                    shard.restarts += 1
+                    self._spawn(shard)
+
+    async def start(self):
+        """Запуск процессов-воркеров"""
+        self._loop = asyncio.get_running_loop()
+
+        for shard in self._shards:
+            self._spawn(shard)
+
+        self._supervisor = asyncio.create_task(self._supervise(), name="ShardedDispatcher:supervisor")
+        logging.info(f"🧩 Шардирование запущено ({self.num_workers} процессов)")
+
+    # --- Прием и подтверждение обновлений ---
+
+    def _enqueue(self, update: Update):
+        shard = self._shards[self.shard_for(update)]
+
+        self._sequence += 1
+        data = update.to_dict()
+        shard.in_flight[update.update_id] = (self._sequence, data, update, time.monotonic())
+
+        self._pending += 1
+        self._idle.clear()
+        self.max_queue_depth = max(self.max_queue_depth, self._pending)
+
+        UpdateDispatcher._run_hooks(self._pre_process_hooks, update)
+        shard.updates_queue.put(data)
+
+    def _on_ack(self, shard: _Shard, update_id: int):
+        entry = shard.in_flight.pop(update_id, None)
+        if entry is None:
+            return  # повторное подтверждение после переотправки
+
+        _, _, update, enqueued_at = entry
+        self.latency.record(time.monotonic() - enqueued_at)
+        shard.acked += 1
+        self.processed += 1
+        self._pending -= 1
+        self._not_full.set()
+        if self._pending == 0:
+            self._idle.set()
+
+        UpdateDispatcher._run_hooks(self._post_process_hooks, update)
+
+    async def submit(self, update: Update):
+        """Передать обновление в шард, ожидая свободного места"""
+        while self._pending >= self.queue_size:
+            self._not_full.clear()
+            await self._not_full.wait()
+
+        self._enqueue(update)
+
+    def try_submit(self, update: Update) -> bool:
+        """Передать обновление в шард без ожидания; False если очередь заполнена"""
+        if self._pending >= self.queue_size:
+            self.rejected += 1
+            return False
+
+        self._enqueue(update)
+        return True
+
+    async def join(self, timeout: Optional[float] = None):
+        """Ожидание подтверждения всех переданных обновлений"""
+        await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+
+    async def stop(self, timeout: Optional[float] = 30):
+        """Дообработка очереди и остановка процессов"""
+        try:
+            await self.join(timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"⚠️ Шарды остановлены с {self._pending} неподтвержденными обновлениями")
+
+        if self._supervisor:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+            self._supervisor = None
+
+        for shard in self._shards:
+            if shard.updates_queue is not None:
+                shard.updates_queue.put(None)
+
+        for shard in self._shards:
+            if shard.process:
+                await asyncio.to_thread(shard.process.join, 10)
+                if shard.process.is_alive():
+                    shard.process.terminate()
+            self._retire(shard)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика шардов"""
+        return {
+            "workers": self.num_workers,
+            "queue_depth": self._pending,
+            "max_queue_depth": self.max_queue_depth,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "latency": self.latency.snapshot(),
+            "shards": [
+                {
+                    "shard": shard.shard_id,
+                    "pid": shard.process.pid if shard.process else None,
+                    "alive": bool(shard.process and shard.process.is_alive()),
+                    "in_flight": len(shard.in_flight),
+                    "acked": shard.acked,
+                    "restarts": shard.restarts,
+                }
+                for shard in self._shards
+            ],
+        }
@@ -0,0 +1,182 @@
+"""
+Потоковая отправка ответа AI с прогрессивным редактированием сообщения
+"""
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from telegram import Message
+from telegram.constants import ChatType, MessageLimit
+from telegram.error import BadRequest, RetryAfter
+
+from config.settings import settings
+
+
+class StreamingReply:
+    """
+    Ответ, который дописывается по мере генерации
+
+    Первое сообщение отправляется на первом фрагменте ответа, дальше
+    накопленные фрагменты сливаются в редкие edit_message_text: не чаще
+    edit_interval секунд на чат (в группах Telegram ограничивает частоту
+    строже). Промежуточные правки идут простым текстом, финальная - в HTML
+    с заголовком модели; если HTML не разбирается, остается простой текст.
+    Ответ длиннее лимита Telegram продолжается в следующих сообщениях.
+    """
+
+    # Фоновые повторы финальных правок (ссылки, чтобы задачи не собрал GC)
+    _background: Set[asyncio.Task] = set()
+
+    def __init__(self, reply_to: Message, header: str, edit_interval: Optional[float] = None,
+                 max_length: int = MessageLimit.MAX_TEXT_LENGTH):
+        self.reply_to = reply_to
+        self.header = header
+        self.edit_interval = edit_interval if edit_interval is not None else self.interval_for(reply_to)
+        self.max_length = max_length
+
+        self.text = ""
+        self._messages: List[Message] = []
+        self._shown: List[str] = []
+        self._next_edit_at = 0.0
+        self.edits = 0
+        self.skipped_edits = 0
+
+    @staticmethod
+    def interval_for(message: Message) -> float:
+        """Интервал между правками с учетом типа чата"""
+        if message.chat and message.chat.type != ChatType.PRIVATE:
+            return settings.stream_group_edit_interval
+        return settings.stream_edit_interval
+
+    @staticmethod
+    def _retry_seconds(error: RetryAfter) -> float:
+        retry_after = error.retry_after
+        if isinstance(retry_after, timedelta):
+            retry_after = retry_after.total_seconds()
+        return float(retry_after)
+
+    @property
+    def started(self) -> bool:
+        return bool(self._messages)
+
+    def _split(self, body: str) -> List[str]:
+        """Разбиение ответа на части, каждая из которых влезает в сообщение"""
+        parts = []
+        limit = self.max_length - len(self.header) - 2
+        while len(body) > limit:
+            cut = body.rfind("\n", 0, limit)
+            if cut <= 0:
+                cut = limit
+            parts.append(body[:cut])
+            body = body[cut:].lstrip("\n")
+            limit = self.max_length
+        parts.append(body)
+        return parts
+
+    def _render(self, index: int, part: str, html: bool) -> str:
+        if index > 0:
+            return part
+        header = f"<b>{self.header}</b>" if html else self.header
+        return f"{header}\n\n{part}"
+
+    async def _show(self, html: bool = False):
+        """Приведение отправленных сообщений к текущему тексту"""
+        for index, part in enumerate(self._split(self.text)):
+            if not part.strip():
+                continue
+
+            if index >= len(self._messages):
+                message = await self.reply_to.reply_text(self._render(index, part, False))
+                self._messages.append(message)
+                self._shown.append(part)
+                if not html:
+                    continue
+
+            if self._shown[index] == part and not html:
+                continue
+
+            await self._edit(index, part, html)
+
+    async def _edit(self, index: int, part: str, html: bool):
+        message = self._messages[index]
+        try:
+            if html:
+                try:
+                    await message.edit_text(self._render(index, part, True), parse_mode="HTML")
+                except BadRequest as e:
+                    if "not modified" in str(e).lower():
+                        raise
+                    # Ответ модели не является корректным HTML
+                    await message.edit_text(self._render(index, part, False))
+            else:
+                await message.edit_text(self._render(index, part, False))
+            self.edits += 1
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self._shown[index] = part
+
+    async def append(self, delta: str):
+        """Добавление фрагмента ответа"""
+        self.text += delta
+
+        now = time.monotonic()
+        if self.started and now < self._next_edit_at:
+            self.skipped_edits += 1
+            return
+
+        try:
+            await self._show()
+        except RetryAfter as e:
+            # Не ждем в потоке: правка будет слита со следующими фрагментами
+            retry_after = self._retry_seconds(e)
+            self._next_edit_at = time.monotonic() + retry_after
+            logging.warning(f"⚠️ Ограничение частоты правок, пауза {retry_after:.0f} сек")
+            return
+
+        self._next_edit_at = time.monotonic() + self.edit_interval
+
+    async def finish(self, text: Optional[str] = None):
+        """
+        Финальная правка с полным ответом
+
+        Интервал между правками здесь не выдерживается: финальная правка
+        заменяет отложенную промежуточную, а ожидание держало бы воркер
+        диспетчера. Повтор после RetryAfter уходит в фоновую задачу.
+        """
+        if text is not None:
+            self.text = text
+
+        try:
+            await self._show(html=True)
+        except RetryAfter as e:
+            task = asyncio.create_task(self._finish_later(self._retry_seconds(e)),
+                                       name="StreamingReply:finish")
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _finish_later(self, delay: float):
+        """Повтор финальной правки после паузы Telegram"""
+        for _ in range(2):
+            await asyncio.sleep(delay)
+            try:
+                await self._show(html=True)
+                return
+            except RetryAfter as e:
+                delay = self._retry_seconds(e)
+            except Exception as e:
+                logging.error(f"❌ Ошибка финальной правки потокового ответа: {e}")
+                return
+
+        logging.error("❌ Не удалось отправить финальную версию потокового ответа")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика отправки"""
+        return {
+            "messages": len(self._messages),
+            "edits": self.edits,
+            "skipped_edits": self.skipped_edits,
+        }
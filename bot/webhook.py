@@ -0,0 +1,132 @@
+"""
+Получение обновлений через webhook (встроенный aiohttp сервер)
+"""
+
+import asyncio
+import hmac
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from bot.dispatcher import UpdateDispatcher
+from bot.polling import ALLOWED_UPDATES
+from config.settings import settings
+from utils.metrics import LatencyTracker
+
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Встроенный HTTP сервер для приема обновлений от Telegram
+
+    Обновление проверяется по секретному токену, ставится в очередь
+    диспетчера и сразу подтверждается. Если очередь заполнена, возвращается
+    503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, application: Application, dispatcher: UpdateDispatcher,
+                 listen: str = settings.webhook_listen,
+                 port: int = settings.webhook_port,
+                 path: str = settings.webhook_path,
+                 secret_token: Optional[str] = settings.webhook_secret_token,
+                 webhook_url: Optional[str] = settings.webhook_url):
+        self.application = application
+        self.dispatcher = dispatcher
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.webhook_url = webhook_url
+        self.running = False
+
+        self._runner: Optional[web.AppRunner] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        # Метрики
+        self.ack_latency = LatencyTracker()  # время от получения запроса до ответа Telegram
+        self.updates_received = 0
+        self.rejected = 0
+
+    def create_app(self) -> web.Application:
+        """Создание aiohttp приложения с маршрутом webhook"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Прием одного обновления от Telegram"""
+        started = time.monotonic()
+
+        if self.secret_token:
+            received = request.headers.get(SECRET_TOKEN_HEADER, "")
+            if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+                self.rejected += 1
+                logging.warning(f"⚠️ Webhook: неверный секретный токен от {request.remote}")
+                return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            self.rejected += 1
+            logging.warning(f"⚠️ Webhook: некорректное обновление: {e}")
+            return web.Response(status=400)
+
+        if update is None:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        if not self.dispatcher.try_submit(update):
+            logging.warning("⚠️ Webhook: очередь диспетчера заполнена")
+            return web.Response(status=503)
+
+        self.updates_received += 1
+        self.ack_latency.record(time.monotonic() - started)
+
+        return web.Response(status=200)
+
+    async def start(self):
+        """Запуск сервера и регистрация webhook в Telegram"""
+        self._stop_event = asyncio.Event()
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        self.running = True
+
+        logging.info(f"🌐 Webhook сервер запущен на {self.listen}:{self.port}{self.path}")
+
+        try:
+            if self.webhook_url:
+                await self.application.bot.set_webhook(
+                    url=self.webhook_url,
+                    allowed_updates=ALLOWED_UPDATES,
+                    secret_token=self.secret_token
+                )
+                logging.info(f"🔗 Webhook зарегистрирован: {self.webhook_url}")
+
+            await self._stop_event.wait()
+        finally:
+            self.running = False
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stop(self):
+        """Остановка сервера"""
+        if self._stop_event:
+            self._stop_event.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика webhook для мониторинга"""
+        return {
+            "updates": self.updates_received,
+            "rejected": self.rejected,
+            "ack_latency": self.ack_latency.snapshot(),
+        }
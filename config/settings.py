@@ -4,7 +4,7 @@
 
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -12,20 +12,126 @@ class Settings(BaseSettings):
     
     # Telegram Bot Token
     telegram_token: str = Field("dummy_token_for_testing", env="TELEGRAM_BOT_TOKEN")
+    telegram_base_url: Optional[str] = Field(None, env="TELEGRAM_BASE_URL")  # другой сервер Bot API, например loadtest
     
     # AI API Keys
     openai_api_key: Optional[str] = Field(None, env="OPENAI_API_KEY")
     anthropic_api_key: Optional[str] = Field(None, env="ANTHROPIC_API_KEY")
     deepseek_api_key: Optional[str] = Field(None, env="DEEPSEEK_API_KEY")
     
+    # Адреса API провайдеров (например, локальный loadtest.fake_provider); None - адрес SDK по умолчанию
+    openai_base_url: Optional[str] = Field(None, env="OPENAI_BASE_URL")
+    anthropic_base_url: Optional[str] = Field(None, env="ANTHROPIC_BASE_URL")
+    deepseek_base_url: str = Field("https://api.deepseek.com/v1", env="DEEPSEEK_BASE_URL")
+    
     # Database
     database_url: str = Field("sqlite:///telegpt.db", env="DATABASE_URL")
+    sqlite_profile: str = Field("tuned", env="SQLITE_PROFILE")  # tuned (WAL и PRAGMA) или default
+    sqlite_pragmas: Dict[str, str] = Field({}, env="SQLITE_PRAGMAS")  # переопределение PRAGMA, {"mmap_size": "0"}
+    database_reader_pool_size: int = Field(4, env="DATABASE_READER_POOL_SIZE")  # 0 - общий пул для чтения и записи
+    database_auto_migrate: bool = Field(False, env="DATABASE_AUTO_MIGRATE")  # применять миграции при запуске
     
     # Logging
     log_level: str = Field("INFO", env="LOG_LEVEL")
     
     # Rate Limiting
-    max_requests_per_minute: int = Field(10, env="MAX_REQUESTS_PER_MINUTE")
+    max_requests_per_minute: int = Field(10, env="MAX_REQUESTS_PER_MINUTE")  # на пользователя, 0 - без ограничения
+    rate_limit_max_buckets: int = Field(100000, env="RATE_LIMIT_MAX_BUCKETS")
+    rate_limit_idle_ttl: float = Field(600.0, env="RATE_LIMIT_IDLE_TTL")  # секунды до удаления корзины
+    provider_requests_per_minute: Dict[str, int] = Field({}, env="PROVIDER_REQUESTS_PER_MINUTE")  # {"chatgpt": 500}
+    
+    # Long polling
+    polling_timeout: int = Field(30, env="POLLING_TIMEOUT")  # серверный таймаут getUpdates (секунды)
+    polling_backoff_base: float = Field(0.5, env="POLLING_BACKOFF_BASE")
+    polling_backoff_max: float = Field(30.0, env="POLLING_BACKOFF_MAX")
+    
+    # Диспетчер обновлений
+    dispatcher_workers: int = Field(128, env="DISPATCHER_WORKERS")  # чатов, обрабатываемых параллельно
+    dispatcher_queue_size: int = Field(1000, env="DISPATCHER_QUEUE_SIZE")
+    activity_timeout: int = Field(20, env="ACTIVITY_TIMEOUT")  # секунды до снятия активности чата
+    
+    # Сохранение offset getUpdates и дедупликация повторной доставки
+    offset_checkpoint_batch: int = Field(100, env="OFFSET_CHECKPOINT_BATCH")  # обновлений между записями
+    offset_checkpoint_interval: float = Field(5.0, env="OFFSET_CHECKPOINT_INTERVAL")  # секунды
+    dedup_capacity: int = Field(100000, env="DEDUP_CAPACITY")  # сообщений в поколении фильтра
+    dedup_error_rate: float = Field(0.001, env="DEDUP_ERROR_RATE")
+    
+    # Отложенная запись сообщений пачками: ответ уходит до записи в базу
+    message_write_batch: int = Field(100, env="MESSAGE_WRITE_BATCH")  # сообщений в одной транзакции
+    message_write_interval: float = Field(0.5, env="MESSAGE_WRITE_INTERVAL")  # секунды; 0 - запись сразу
+    message_write_max_pending: int = Field(10000, env="MESSAGE_WRITE_MAX_PENDING")  # дальше пишет обработчик
+    
+    # Шардирование обработки по процессам (0 - все в одном процессе)
+    shard_workers: int = Field(0, env="SHARD_WORKERS")
+    
+    # Режим получения обновлений: polling или webhook
+    update_mode: str = Field("polling", env="UPDATE_MODE")
+    
+    # Webhook
+    webhook_url: Optional[str] = Field(None, env="WEBHOOK_URL")  # публичный URL для setWebhook
+    webhook_listen: str = Field("127.0.0.1", env="WEBHOOK_LISTEN")
+    webhook_port: int = Field(8080, env="WEBHOOK_PORT")
+    webhook_path: str = Field("/telegram/webhook", env="WEBHOOK_PATH")
+    webhook_secret_token: Optional[str] = Field(None, env="WEBHOOK_SECRET_TOKEN")
+    
+    # Потоковая отправка ответов AI
+    streaming_enabled: bool = Field(True, env="STREAMING_ENABLED")
+    stream_edit_interval: float = Field(1.0, env="STREAM_EDIT_INTERVAL")  # секунды между правками в личном чате
+    stream_group_edit_interval: float = Field(3.0, env="STREAM_GROUP_EDIT_INTERVAL")  # в группах
+    
+    # Пулы HTTP соединений к API AI провайдеров
+    http_max_connections: int = Field(100, env="HTTP_MAX_CONNECTIONS")  # на провайдера
+    http_max_keepalive: int = Field(20, env="HTTP_MAX_KEEPALIVE")
+    http_keepalive_expiry: float = Field(30.0, env="HTTP_KEEPALIVE_EXPIRY")  # секунды
+    http_connect_timeout: float = Field(10.0, env="HTTP_CONNECT_TIMEOUT")
+    http_read_timeout: float = Field(120.0, env="HTTP_READ_TIMEOUT")
+    http_dns_ttl: int = Field(300, env="HTTP_DNS_TTL")  # секунды кэширования DNS
+    http2_enabled: bool = Field(False, env="HTTP2_ENABLED")  # требует пакет h2
+    
+    # Кэш ответов AI по точному совпадению запроса
+    response_cache_enabled: bool = Field(True, env="RESPONSE_CACHE_ENABLED")
+    response_cache_size: int = Field(1000, env="RESPONSE_CACHE_SIZE")  # записей в памяти
+    response_cache_ttl: float = Field(3600.0, env="RESPONSE_CACHE_TTL")  # секунды
+    response_cache_model_ttls: Dict[str, float] = Field({}, env="RESPONSE_CACHE_MODEL_TTLS")  # {"deepseek": 600}
+    response_cache_db: Optional[str] = Field(None, env="RESPONSE_CACHE_DB")  # файл SQLite второго уровня
+    
+    # Объединение одинаковых одновременных запросов к провайдеру
+    single_flight_enabled: bool = Field(True, env="SINGLE_FLIGHT_ENABLED")
+    
+    # Хеджирование запросов и переключение между провайдерами
+    failover_enabled: bool = Field(True, env="FAILOVER_ENABLED")
+    hedging_enabled: bool = Field(True, env="HEDGING_ENABLED")
+    hedge_quantile: float = Field(95.0, env="HEDGE_QUANTILE")  # перцентиль задержки основной модели
+    hedge_min_delay: float = Field(1.0, env="HEDGE_MIN_DELAY")  # секунды
+    hedge_default_delay: float = Field(8.0, env="HEDGE_DEFAULT_DELAY")  # пока замеров меньше hedge_min_samples
+    hedge_min_samples: int = Field(20, env="HEDGE_MIN_SAMPLES")
+    hedge_secondary: Dict[str, str] = Field({}, env="HEDGE_SECONDARY")  # {"chatgpt": "claude"}
+    
+    # Адаптивный лимит одновременных запросов и автомат защиты (на провайдера)
+    concurrency_initial_limit: int = Field(64, env="CONCURRENCY_INITIAL_LIMIT")
+    concurrency_min_limit: int = Field(1, env="CONCURRENCY_MIN_LIMIT")
+    concurrency_max_limit: int = Field(100, env="CONCURRENCY_MAX_LIMIT")
+    concurrency_latency_target: float = Field(20.0, env="CONCURRENCY_LATENCY_TARGET")  # секунды
+    concurrency_acquire_timeout: float = Field(10.0, env="CONCURRENCY_ACQUIRE_TIMEOUT")  # ожидание места
+    circuit_failure_threshold: int = Field(5, env="CIRCUIT_FAILURE_THRESHOLD")  # ошибок подряд
+    circuit_reset_timeout: float = Field(30.0, env="CIRCUIT_RESET_TIMEOUT")  # секунды до пробного запроса
+    
+    # Контекст беседы: бюджет токенов и краткое содержание старых сообщений
+    context_token_budget: int = Field(3000, env="CONTEXT_TOKEN_BUDGET")  # токенов на контекст и вопрос
+    context_model_budgets: Dict[str, int] = Field({}, env="CONTEXT_MODEL_BUDGETS")  # {"deepseek": 6000}
+    context_fetch_limit: int = Field(50, env="CONTEXT_FETCH_LIMIT")  # последних сообщений на запрос
+    context_summary_enabled: bool = Field(True, env="CONTEXT_SUMMARY_ENABLED")
+    context_summary_tokens: int = Field(400, env="CONTEXT_SUMMARY_TOKENS")  # длина краткого содержания
+    context_summary_batch: int = Field(20, env="CONTEXT_SUMMARY_BATCH")  # сообщений за одно обновление
+    context_summary_concurrency: int = Field(2, env="CONTEXT_SUMMARY_CONCURRENCY")  # одновременных обновлений
+    context_summary_keep: float = Field(0.5, env="CONTEXT_SUMMARY_KEEP")  # доля бюджета за историей после сворачивания
+    context_cache_users: int = Field(10000, env="CONTEXT_CACHE_USERS")  # бесед в памяти, 0 - без кэша
+    context_cache_chars: int = Field(50_000_000, env="CONTEXT_CACHE_CHARS")  # символов текста во всех беседах
+    prompt_caching_enabled: bool = Field(True, env="PROMPT_CACHING_ENABLED")  # метки cache_control для Claude
+    
+    # Кэш пользователей в памяти: запись в базу только при изменении данных
+    user_cache_size: int = Field(100000, env="USER_CACHE_SIZE")  # пользователей, 0 - без кэша
+    user_cache_ttl: float = Field(300.0, env="USER_CACHE_TTL")  # секунды до перечитывания из базы
     
     class Config:
         env_file = ".env"
@@ -2,10 +2,19 @@
 Модуль работы с базой данных
 """
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from config.settings import settings
+from typing import Dict, Optional, Tuple
 import logging
+import os
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Ревизия схемы, которую создавал create_all до перехода на миграции
+BASELINE_REVISION = "0001_initial"
 
 
 class Base(DeclarativeBase):
@@ -13,12 +22,72 @@ class Base(DeclarativeBase):
     pass
 
 
-# Создание асинхронного движка
-engine = create_async_engine(
-    settings.database_url.replace("sqlite://", "sqlite+aiosqlite://"),
-    echo=settings.log_level == "DEBUG"
+# Профили настроек соединений SQLite (PRAGMA на каждое новое соединение)
+SQLITE_PROFILES: Dict[str, Dict[str, str]] = {
+    # Настройки SQLite по умолчанию: журнал отката, читатели и писатель блокируют друг друга
+    "default": {},
+    "tuned": {
+        "busy_timeout": "5000",  # мс ожидания блокировки вместо ошибки "database is locked"
+        "journal_mode": "WAL",  # читатели не блокируют писателя и наоборот
+        "synchronous": "NORMAL",  # в WAL - без fsync на каждый commit, целостность сохраняется
+        "cache_size": "-65536",  # 64 МБ кэша страниц на соединение
+        "mmap_size": "268435456",  # 256 МБ файла читаются через mmap
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def sqlite_pragmas(profile: str = settings.sqlite_profile,
+                   overrides: Dict[str, str] = settings.sqlite_pragmas) -> Dict[str, str]:
+    """PRAGMA профиля с учетом переопределений из настроек"""
+    if profile not in SQLITE_PROFILES:
+        logging.warning(f"⚠️ Неизвестный профиль SQLite {profile}, используется default")
+        profile = "default"
+    return {**SQLITE_PROFILES[profile], **overrides}
+
+
+def is_sqlite_file(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url
+
+
+def build_engine(url: str, pragmas: Dict[str, str], read_only: bool = False, **kwargs) -> AsyncEngine:
+    """Асинхронный движок; для SQLite PRAGMA применяются при открытии соединения"""
+    engine = create_async_engine(url, echo=settings.log_level == "DEBUG", **kwargs)
+    if not url.startswith("sqlite"):
+        return engine
+
+    statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+    if read_only:
+        statements.append("PRAGMA query_only=ON")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    return engine
+
+
+DATABASE_URL = settings.database_url.replace("sqlite://", "sqlite+aiosqlite://")
+
+# Файл SQLite: запись через одно соединение (очередь в пуле вместо блокировок файла),
+# чтение - через отдельный пул соединений только для чтения
+_split_pools = is_sqlite_file(DATABASE_URL) and settings.database_reader_pool_size > 0
+
+# Создание асинхронного движка (все записи)
+engine = build_engine(
+    DATABASE_URL, sqlite_pragmas(),
+    **({"pool_size": 1, "max_overflow": 0} if _split_pools else {})
 )
 
+# Движок для чтения: контекст беседы, данные пользователя, проверки дубликатов
+reader_engine = build_engine(
+    DATABASE_URL, sqlite_pragmas(), read_only=True,
+    pool_size=settings.database_reader_pool_size, max_overflow=0
+) if _split_pools else engine
+
 # Создание фабрики сессий
 AsyncSessionLocal = async_sessionmaker(
     engine, 
@@ -26,6 +95,13 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+# Сессии только для чтения; не держите их открытыми во время запросов к AI
+AsyncReadSessionLocal = async_sessionmaker(
+    reader_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
 
 async def get_db() -> AsyncSession:
     """Получение сессии базы данных"""
@@ -36,17 +112,61 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+def _alembic_config(connection=None):
+    """Настройки Alembic; соединение передается в migrations/env.py"""
+    from alembic.config import Config
+
+    config = Config(os.path.join(ROOT_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT_DIR, "migrations"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def migration_status(connection) -> Tuple[Optional[str], str]:
+    """(ревизия схемы базы, последняя ревизия миграций)"""
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    current = MigrationContext.configure(connection).get_current_revision()
+    head = ScriptDirectory.from_config(_alembic_config()).get_current_head()
+    return current, head
+
+
+def upgrade_schema(connection, revision: str = "head"):
+    """
+    Применение миграций (то же, что alembic upgrade head) в переданном соединении
+
+    Базу, созданную до перехода на миграции, отмечает ревизией
+    BASELINE_REVISION migrations/env.py - так же, как при запуске из
+    командной строки.
+    """
+    from alembic import command
+
+    command.upgrade(_alembic_config(connection), revision)
+
+
 async def init_database():
-    """Инициализация базы данных"""
-    logging.info("Инициализация базы данных...")
+    """Проверка версии схемы базы данных (и миграция, если включена DATABASE_AUTO_MIGRATE)"""
+    logging.info("Проверка схемы базы данных...")
     
     async with engine.begin() as conn:
-        # Импортируем все модели для создания таблиц
-        from models.user import User
-        from models.message import Message
-        from models.ai_model import AIModel
+        current, head = await conn.run_sync(migration_status)
         
-        # Создаем все таблицы
-        await conn.run_sync(Base.metadata.create_all)
+        if current != head:
+            if not settings.database_auto_migrate:
+                raise RuntimeError(
+                    f"Схема базы данных ({current or 'без ревизии'}) не соответствует коду ({head}): "
+                    f"выполните alembic upgrade head"
+                )
+            
+            logging.info(f"🗄️ Миграция схемы базы данных: {current or 'без ревизии'} → {head}")
+            await conn.run_sync(upgrade_schema)
     
-    logging.info("База данных инициализирована успешно!")
\ No newline at end of file
+    logging.info(f"База данных готова, ревизия схемы {head}")
+
+
+async def close_database():
+    """Закрытие пулов соединений (при закрытии последнего соединения WAL переносится в базу)"""
+    if reader_engine is not engine:
+        await reader_engine.dispose()
+    await engine.dispose()
@@ -0,0 +1,3 @@
+"""
+Инструменты нагрузочного тестирования TeleGPT без обращения к реальным API
+"""
@@ -0,0 +1,424 @@
+"""
+Локальная замена API AI провайдеров для нагрузочного тестирования
+
+Реализует эндпоинты, которые используют сервисы бота:
+    POST /v1/chat/completions           - OpenAI (OPENAI_BASE_URL=http://127.0.0.1:8900/v1)
+    POST /v1/messages                   - Anthropic (ANTHROPIC_BASE_URL=http://127.0.0.1:8900)
+    POST /deepseek/v1/chat/completions  - DeepSeek (DEEPSEEK_BASE_URL=http://127.0.0.1:8900/deepseek/v1)
+    GET  /stats                         - статистика сервера
+
+Ответы обычные и потоковые (SSE), с задержкой первого токена из заданного
+распределения, скоростью генерации, долей ошибок 5xx и 429. При одном и том
+же seed n-й запрос к провайдеру всегда получает одинаковые задержки и текст.
+
+Запуск:
+    python -m loadtest.fake_provider --port 8900 --ttft 0.8 --token-rate 40 --error-rate 0.01 --seed 1
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import LatencyTracker
+
+
+WORDS = (
+    "привет это ответ модели для нагрузочного теста бота который содержит "
+    "обычные слова разной длины чтобы размер сообщений был похож на настоящий "
+    "текст а также несколько знаков препинания и чисел 42 2024 100"
+).split()
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+class FakeProviderConfig:
+    """
+    Параметры поведения сервера
+
+    Задержка первого токена: fixed - ровно ttft; uniform - равномерно в
+    ttft * (1 ± jitter); lognormal - медиана ttft, sigma = jitter (длинный
+    хвост, как у настоящих API).
+    """
+
+    def __init__(self, latency: str = "lognormal", ttft: float = 0.5, jitter: float = 0.5,
+                 token_rate: float = 50.0, min_tokens: int = 20, max_tokens: int = 200,
+                 chunk_tokens: int = 1, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, seed: int = 0):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Неизвестное распределение задержки: {latency}")
+
+        self.latency = latency
+        self.ttft = ttft
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+    def first_token_delay(self, rng: random.Random) -> float:
+        if self.latency == "fixed":
+            return self.ttft
+        if self.latency == "uniform":
+            return max(0.0, rng.uniform(self.ttft * (1 - self.jitter), self.ttft * (1 + self.jitter)))
+        return self.ttft * math.exp(rng.gauss(0.0, self.jitter))
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка токенов по длине текста (около 4 байт UTF-8 на токен)"""
+    return len(text.encode("utf-8")) // 4 + 1 if text else 0
+
+
+class PlannedResponse:
+    """Заранее разыгранный исход запроса: ошибка или текст с задержками"""
+
+    def __init__(self, config: FakeProviderConfig, rng: random.Random, requested_max: Optional[int]):
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            self.status = 429
+        elif roll < config.rate_limit_rate + config.error_rate:
+            self.status = rng.choice((500, 503))
+        else:
+            self.status = 200
+
+        self.first_token_delay = config.first_token_delay(rng)
+        count = rng.randint(config.min_tokens, config.max_tokens)
+        if requested_max:
+            count = min(count, requested_max)
+        self.tokens = [rng.choice(WORDS) + " " for _ in range(max(1, count))]
+        self.token_interval = 1.0 / config.token_rate if config.token_rate > 0 else 0.0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.tokens).strip()
+
+
+class FakeProviderServer:
+    """HTTP сервер, отвечающий в форматах OpenAI, Anthropic и DeepSeek"""
+
+    PREFIX_CACHE_SIZE = 10000
+
+    def __init__(self, config: Optional[FakeProviderConfig] = None,
+                 host: str = "127.0.0.1", port: int = 8900):
+        self.config = config or FakeProviderConfig()
+        self.host = host
+        self.port = port
+
+        self._runner: Optional[web.AppRunner] = None
+        self._counters: Dict[str, int] = {}
+
+        # Хэши уже виденных префиксов сообщений - имитация кэша промптов
+        self._prefixes: "OrderedDict[str, int]" = OrderedDict()
+
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.first_token = LatencyTracker()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_openai)
+        app.router.add_post("/deepseek/v1/chat/completions", self.handle_deepseek)
+        app.router.add_post("/v1/messages", self.handle_anthropic)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+        # Порт 0 - выбирает система
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        logging.info(f"🧪 Имитация AI провайдеров запущена на {self.url}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _plan(self, provider: str, body: Dict[str, Any]) -> PlannedResponse:
+        index = self._counters.get(provider, 0)
+        self._counters[provider] = index + 1
+        rng = random.Random(f"{self.config.seed}:{provider}:{index}")
+        return PlannedResponse(self.config, rng, body.get("max_tokens"))
+
+    def _count(self, provider: str, field: str, value: int = 1):
+        counters = self.stats.setdefault(provider, {
+            "requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0,
+            "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+        })
+        counters[field] += value
+
+    def _prompt_usage(self, provider: str, messages: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Токены запроса и их часть, совпадающая с уже виденным префиксом"""
+        digest = hashlib.sha256(provider.encode())
+        prompt_tokens = 0
+        cached_tokens = 0
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, str):
+                content = "".join(block.get("text", "") for block in content or [])
+            prompt_tokens += estimate_tokens(content) + 4
+            digest.update(json.dumps([message.get("role"), content], ensure_ascii=False).encode())
+            key = digest.hexdigest()
+
+            if key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                cached_tokens = prompt_tokens
+            else:
+                self._prefixes[key] = prompt_tokens
+                if len(self._prefixes) > self.PREFIX_CACHE_SIZE:
+                    self._prefixes.popitem(last=False)
+
+        self._count(provider, "prompt_tokens", prompt_tokens)
+        self._count(provider, "cached_tokens", cached_tokens)
+        return {"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens}
+
+    def _error_response(self, provider: str, plan: PlannedResponse) -> web.Response:
+        if plan.status == 429:
+            self._count(provider, "rate_limited")
+            message, kind = "Rate limit exceeded", "rate_limit_error"
+        else:
+            self._count(provider, "errors")
+            message, kind = "Injected server error", "api_error"
+
+        if provider == "anthropic":
+            body = {"type": "error", "error": {"type": kind, "message": message}}
+        else:
+            body = {"error": {"message": message, "type": kind, "code": plan.status}}
+
+        headers = {"Retry-After": str(self.config.retry_after)} if plan.status == 429 else None
+        return web.json_response(body, status=plan.status, headers=headers)
+
+    async def _handle(self, request: web.Request, provider: str):
+        body = await request.json()
+        self._count(provider, "requests")
+        plan = self._plan(provider, body)
+
+        await asyncio.sleep(plan.first_token_delay)
+        if plan.status != 200:
+            return None, body, plan, self._error_response(provider, plan)
+
+        messages = list(body.get("messages") or [])
+        if body.get("system"):
+            system = body["system"]
+            messages.insert(0, {"role": "system", "content": system})
+        usage = self._prompt_usage(provider, messages)
+        self._count(provider, "completion_tokens", len(plan.tokens))
+        self.first_token.record(plan.first_token_delay)
+
+        if body.get("stream"):
+            self._count(provider, "streamed")
+        return usage, body, plan, None
+
+    async def _write_events(self, request: web.Request, events) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        for delay, event in events:
+            if delay:
+                await asyncio.sleep(delay)
+            await response.write(event.encode())
+
+        await response.write_eof()
+        return response
+
+    def _chunks(self, plan: PlannedResponse):
+        """Фрагменты текста и пауза перед каждым, кроме первого"""
+        size = self.config.chunk_tokens
+        for start in range(0, len(plan.tokens), size):
+            delay = plan.token_interval * size if start else 0.0
+            yield delay, "".join(plan.tokens[start:start + size])
+
+    async def _openai_compatible(self, request: web.Request, provider: str) -> web.StreamResponse:
+        usage, body, plan, error = await self._handle(request, provider)
+        if error is not None:
+            return error
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "fake-model")
+        usage_body = {
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": len(plan.tokens),
+            "total_tokens": usage["prompt_tokens"] + len(plan.tokens),
+            "prompt_tokens_details": {"cached_tokens": usage["cached_tokens"]},
+            "prompt_cache_hit_tokens": usage["cached_tokens"],
+            "prompt_cache_miss_tokens": usage["prompt_tokens"] - usage["cached_tokens"],
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(plan.token_interval * len(plan.tokens))
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": plan.text},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage_body,
+            })
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        events = [(0.0, chunk({"role": "assistant", "content": ""}))]
+        events += [(delay, chunk({"content": text})) for delay, text in self._chunks(plan)]
+        events.append((0.0, chunk({}, "stop")))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            payload = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": [], "usage": usage_body,
+            }
+            events.append((0.0, f"data: {json.dumps(payload)}\n\n"))
+        events.append((0.0, "data: [DONE]\n\n"))
+        return await self._write_events(request, events)
+
+    async def handle_openai(self, request: web.Request) -> web.StreamResponse:
+        return await self._openai_compatible(request, "openai")
+
+    async def handle_deepseek(self, request: web.Request) -> web.StreamResponse:
+        return await self._openai_compatible(request, "deepseek")
+
+    async def handle_anthropic(self, request: web.Request) -> web.StreamResponse:
+        usage, body, plan, error = await self._handle(request, "anthropic")
+        if error is not None:
+            return error
+
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "fake-model")
+        usage_body = {
+            "input_tokens": usage["prompt_tokens"] - usage["cached_tokens"],
+            "output_tokens": len(plan.tokens),
+            "cache_read_input_tokens": usage["cached_tokens"],
+            "cache_creation_input_tokens": 0,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(plan.token_interval * len(plan.tokens))
+            return web.json_response({
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": plan.text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": usage_body,
+            })
+
+        def event(name: str, payload: Dict[str, Any]) -> str:
+            return f"event: {name}\ndata: {json.dumps({'type': name, **payload}, ensure_ascii=False)}\n\n"
+
+        events = [
+            (0.0, event("message_start", {"message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "stop_sequence": None, "usage": {**usage_body, "output_tokens": 1},
+            }})),
+            (0.0, event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})),
+        ]
+        events += [
+            (delay, event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": text}}))
+            for delay, text in self._chunks(plan)
+        ]
+        events += [
+            (0.0, event("content_block_stop", {"index": 0})),
+            (0.0, event("message_delta", {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(plan.tokens)},
+            })),
+            (0.0, event("message_stop", {})),
+        ]
+        return await self._write_events(request, events)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "providers": self.stats,
+            "first_token": self.first_token.snapshot(),
+            "seed": self.config.seed,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена API AI провайдеров")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                        help="распределение задержки первого токена")
+    parser.add_argument("--ttft", type=float, default=0.5, help="медиана задержки первого токена, секунды")
+    parser.add_argument("--jitter", type=float, default=0.5, help="разброс задержки (sigma для lognormal)")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="токенов в секунду, 0 - без задержки")
+    parser.add_argument("--tokens", default="20-200", help="длина ответа в токенах: N или MIN-MAX")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="токенов в одном фрагменте потока")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500/503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After для 429, секунды")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    low, _, high = args.tokens.partition("-")
+    config = FakeProviderConfig(
+        latency=args.latency, ttft=args.ttft, jitter=args.jitter, token_rate=args.token_rate,
+        min_tokens=int(low), max_tokens=int(high or low), chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def serve():
+        server = FakeProviderServer(config, args.host, args.port)
+        await server.start()
+        print(f"OPENAI_BASE_URL={server.url}/v1")
+        print(f"ANTHROPIC_BASE_URL={server.url}")
+        print(f"DEEPSEEK_BASE_URL={server.url}/deepseek/v1")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
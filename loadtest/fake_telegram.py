@@ -0,0 +1,262 @@
+"""
+Локальная замена Telegram Bot API для нагрузочного тестирования
+
+Поддерживает методы, которые использует бот: getMe, deleteWebhook,
+getUpdates (long polling), sendMessage, editMessageText, sendChatAction,
+answerCallbackQuery. Остальные методы отвечают успехом.
+
+Сообщения пользователей добавляются через push_message(), а ответы бота
+сопоставляются с ними. Так для каждого сообщения известно, когда бот его
+получил, показал "печатает", отправил первый фрагмент ответа и закончил
+правку ответа.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+
+# Строковые параметры python-telegram-bot передает без JSON-кодирования
+STRING_PARAMS = {"text", "parse_mode", "action", "callback_query_id"}
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "TeleGPT", "username": "telegpt_loadtest_bot"}
+
+
+class MessageTrace:
+    """Моменты обработки одного сообщения пользователя (time.monotonic)"""
+
+    __slots__ = ("chat_id", "message_id", "sent_at", "delivered_at", "typing_at",
+                 "first_reply_at", "completed_at", "edits", "outcome")
+
+    def __init__(self, chat_id: int, message_id: int, sent_at: float):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.sent_at = sent_at
+        self.delivered_at: Optional[float] = None
+        self.typing_at: Optional[float] = None
+        self.first_reply_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
+        self.edits = 0
+        self.outcome: Optional[str] = None
+
+
+def classify_reply(text: str) -> str:
+    """Исход по тексту ответа бота"""
+    if text.startswith("⏳"):
+        return "rate_limited"
+    if text.startswith("😔"):
+        return "error"
+    return "answered"
+
+
+class FakeTelegramServer:
+    """HTTP сервер в формате Bot API с учетом времени ответов на каждое сообщение"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+        self._updates: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._next_update_id = 1
+        self._new_updates = asyncio.Event()
+        self._polling = asyncio.Event()
+        self._next_message_id: Dict[int, int] = {}
+
+        # Сообщения, ждущие "печатает" и ответа, по чатам в порядке отправки
+        self.traces: List[MessageTrace] = []
+        self._awaiting_typing: Dict[int, Deque[MessageTrace]] = {}
+        self._awaiting_reply: Dict[int, Deque[MessageTrace]] = {}
+        self._last_reply: Dict[int, MessageTrace] = {}
+        self._bot_messages: Dict[Tuple[int, int], MessageTrace] = {}
+        self._by_message: Dict[Tuple[int, int], MessageTrace] = {}
+
+        self.method_calls: Dict[str, int] = {}
+        self.last_activity = time.monotonic()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+        # Порт 0 - выбирает система
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        logging.info(f"🧪 Имитация Telegram Bot API запущена на {self.url}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def wait_polling(self, timeout: float = 30.0):
+        """Ожидание первого getUpdates от бота"""
+        await asyncio.wait_for(self._polling.wait(), timeout)
+
+    def _message_id(self, chat_id: int) -> int:
+        message_id = self._next_message_id.get(chat_id, 1)
+        self._next_message_id[chat_id] = message_id + 1
+        return message_id
+
+    @staticmethod
+    def _chat(chat_id: int) -> Dict[str, Any]:
+        return {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"}
+
+    def push_message(self, user_id: int, text: str) -> MessageTrace:
+        """Новое сообщение пользователя в личном чате с ботом"""
+        message_id = self._message_id(user_id)
+        trace = MessageTrace(user_id, message_id, time.monotonic())
+        self.traces.append(trace)
+        self._by_message[(user_id, message_id)] = trace
+        self._awaiting_typing.setdefault(user_id, deque()).append(trace)
+        self._awaiting_reply.setdefault(user_id, deque()).append(trace)
+
+        update = {
+            "update_id": self._next_update_id,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": self._chat(user_id),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}",
+                         "username": f"loadtest_user_{user_id}"},
+                "text": text,
+            },
+        }
+        self._updates.append((self._next_update_id, update))
+        self._next_update_id += 1
+        self._new_updates.set()
+        return trace
+
+    @property
+    def unanswered(self) -> int:
+        return sum(len(traces) for traces in self._awaiting_reply.values())
+
+    @staticmethod
+    def _decode(params: Dict[str, str]) -> Dict[str, Any]:
+        decoded = {}
+        for key, value in params.items():
+            if key in STRING_PARAMS:
+                decoded[key] = value
+                continue
+            try:
+                decoded[key] = json.loads(value)
+            except (TypeError, ValueError):
+                decoded[key] = value
+        return decoded
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.method_calls[method] = self.method_calls.get(method, 0) + 1
+
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = self._decode(dict(await request.post()))
+
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _api_getMe(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return BOT_USER
+
+    async def _api_getUpdates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self._polling.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Обновления до offset подтверждены ботом
+        while self._updates and self._updates[0][0] < offset:
+            self._updates.popleft()
+
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        batch = [update for update_id, update in islice(self._updates, limit) if update_id >= offset]
+        now = time.monotonic()
+        for update in batch:
+            message = update["message"]
+            trace = self._by_message.get((message["chat"]["id"], message["message_id"]))
+            if trace is not None and trace.delivered_at is None:
+                trace.delivered_at = now
+        return batch
+
+    async def _api_sendChatAction(self, params: Dict[str, Any]) -> bool:
+        waiting = self._awaiting_typing.get(int(params["chat_id"]))
+        if waiting:
+            waiting.popleft().typing_at = time.monotonic()
+        return True
+
+    def _bot_message(self, chat_id: int, text: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "message_id": message_id or self._message_id(chat_id),
+            "date": int(time.time()),
+            "chat": self._chat(chat_id),
+            "from": BOT_USER,
+            "text": text,
+        }
+
+    async def _api_sendMessage(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params["chat_id"])
+        text = params.get("text", "")
+        now = time.monotonic()
+        self.last_activity = now
+
+        waiting = self._awaiting_reply.get(chat_id)
+        if waiting:
+            trace = waiting.popleft()
+            trace.first_reply_at = now
+            trace.outcome = classify_reply(text)
+            self._last_reply[chat_id] = trace
+            # Бот не всегда показывает "печатает" (например, при отказе по лимиту)
+            typing = self._awaiting_typing.get(chat_id)
+            if typing and typing[0] is trace:
+                typing.popleft()
+        else:
+            # Продолжение длинного ответа отдельным сообщением
+            trace = self._last_reply.get(chat_id)
+
+        message = self._bot_message(chat_id, text)
+        if trace is not None:
+            trace.completed_at = now
+            self._bot_messages[(chat_id, message["message_id"])] = trace
+        return message
+
+    async def _api_editMessageText(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params["chat_id"])
+        message_id = int(params["message_id"])
+        now = time.monotonic()
+        self.last_activity = now
+
+        trace = self._bot_messages.get((chat_id, message_id))
+        if trace is not None:
+            trace.completed_at = now
+            trace.edits += 1
+
+        message = self._bot_message(chat_id, params.get("text", ""), message_id)
+        message["edit_date"] = int(time.time())
+        return message
+
+    async def _api_answerCallbackQuery(self, params: Dict[str, Any]) -> bool:
+        return True
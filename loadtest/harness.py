@@ -0,0 +1,247 @@
+"""
+Сквозной нагрузочный тест: TeleGPTBot против локальных Bot API и AI провайдеров
+
+Запускает loadtest.fake_telegram и loadtest.fake_provider в этом же процессе,
+направляет на них бота через переменные окружения (до импорта настроек) и
+подает сообщения от заданного числа пользователей с заданной частотой.
+Результат - JSON отчет: пропускная способность, p50/p95/p99 сквозной
+задержки и задержки по этапам.
+
+Этапы (от отправки сообщения пользователем):
+    ingest      - до получения ботом через getUpdates
+    queue       - от получения до "печатает" (очередь диспетчера, база данных)
+    generation  - от "печатает" до первого фрагмента ответа (контекст, AI провайдер)
+    streaming   - от первого фрагмента до последней правки ответа
+
+Запуск:
+    python -m loadtest.harness --users 2000 --rate 50 --duration 60 --report loadtest_report.json
+    python -m loadtest.harness --rate 200 --ttft 0.3 --env DISPATCHER_WORKERS=64 --env STREAMING_ENABLED=false
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_provider import LATENCY_DISTRIBUTIONS, FakeProviderConfig, FakeProviderServer
+from loadtest.fake_telegram import FakeTelegramServer, MessageTrace
+from utils.metrics import LatencyTracker
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Сводка задержек в миллисекундах по всем замерам"""
+    tracker = LatencyTracker(window=max(1, len(values)))
+    for value in values:
+        tracker.record(value)
+    return tracker.snapshot()
+
+
+def _durations(traces: List[MessageTrace], start: str, end: str) -> List[float]:
+    values = []
+    for trace in traces:
+        started, finished = getattr(trace, start), getattr(trace, end)
+        if started is not None and finished is not None:
+            values.append(max(0.0, finished - started))
+    return values
+
+
+def build_report(telegram: FakeTelegramServer, load_seconds: float) -> Dict[str, Any]:
+    """Сводка по сообщениям, отправленным в fake Bot API"""
+    traces = telegram.traces
+    outcomes: Dict[str, int] = {}
+    for trace in traces:
+        outcome = trace.outcome or "unanswered"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    answered = [trace for trace in traces if trace.outcome == "answered"]
+    completed = [trace for trace in traces if trace.completed_at is not None]
+    window = 0.0
+    if completed:
+        window = max(trace.completed_at for trace in completed) - min(trace.sent_at for trace in traces)
+
+    return {
+        "messages": {"sent": len(traces), **outcomes},
+        "throughput": {
+            "offered_rps": round(len(traces) / load_seconds, 2) if load_seconds else 0.0,
+            "completed_rps": round(len(completed) / window, 2) if window else 0.0,
+            "answered_rps": round(len(answered) / window, 2) if window else 0.0,
+        },
+        "latency": {
+            "end_to_end": summarize(_durations(answered, "sent_at", "completed_at")),
+            "first_reply": summarize(_durations(answered, "sent_at", "first_reply_at")),
+        },
+        "stages": {
+            "ingest": summarize(_durations(answered, "sent_at", "delivered_at")),
+            "queue": summarize(_durations(answered, "delivered_at", "typing_at")),
+            "generation": summarize(_durations(answered, "typing_at", "first_reply_at")),
+            "streaming": summarize(_durations(answered, "first_reply_at", "completed_at")),
+        },
+        "edits_per_answer": round(sum(trace.edits for trace in answered) / len(answered), 2) if answered else 0.0,
+        "bot_api_calls": dict(telegram.method_calls),
+    }
+
+
+def configure_environment(args: argparse.Namespace, workdir: str,
+                          telegram: FakeTelegramServer, provider: FakeProviderServer):
+    """Настройки бота для прогона; должны быть заданы до первого импорта config.settings"""
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "123456:LOADTEST",
+        "TELEGRAM_BASE_URL": telegram.url,
+        "OPENAI_API_KEY": "loadtest",
+        "ANTHROPIC_API_KEY": "loadtest",
+        "DEEPSEEK_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": f"{provider.url}/v1",
+        "ANTHROPIC_BASE_URL": provider.url,
+        "DEEPSEEK_BASE_URL": f"{provider.url}/deepseek/v1",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        "DATABASE_AUTO_MIGRATE": "true",
+        "UPDATE_MODE": "polling",
+        "POLLING_TIMEOUT": "1",
+        "LOG_LEVEL": args.log_level,
+    })
+    os.environ.pop("RESPONSE_CACHE_DB", None)
+
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+
+
+async def generate_load(telegram: FakeTelegramServer, args: argparse.Namespace) -> float:
+    """Подача сообщений; возвращает фактическую длительность подачи"""
+    rng = random.Random(args.seed)
+    started = time.monotonic()
+    next_at = started
+    sent = 0
+
+    while True:
+        interval = rng.expovariate(args.rate) if args.arrival == "poisson" else 1.0 / args.rate
+        next_at += interval
+        if next_at - started >= args.duration:
+            break
+
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        user_id = rng.randint(1, args.users)
+        sent += 1
+        telegram.push_message(user_id, f"Вопрос {sent}: расскажи что-нибудь интересное про число {rng.randint(1, 10**6)}")
+
+    return time.monotonic() - started
+
+
+async def drain(telegram: FakeTelegramServer, settle: float, timeout: float):
+    """Ожидание ответов на все сообщения и завершения правок"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if telegram.unanswered == 0 and time.monotonic() - telegram.last_activity >= settle:
+            return
+        await asyncio.sleep(0.1)
+    logging.warning(f"⚠️ Не дождались ответов: {telegram.unanswered}")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    telegram = FakeTelegramServer(port=0)
+    provider = FakeProviderServer(FakeProviderConfig(
+        latency=args.latency, ttft=args.ttft, jitter=args.jitter, token_rate=args.token_rate,
+        min_tokens=args.min_tokens, max_tokens=args.max_tokens, chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed,
+    ), port=0)
+    await telegram.start()
+    await provider.start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, workdir, telegram, provider)
+
+        # Импорт после настройки окружения: настройки читаются один раз
+        from main import TeleGPTBot
+
+        bot = TeleGPTBot()
+        bot_task = asyncio.create_task(bot.start(), name="loadtest:bot")
+        try:
+            await telegram.wait_polling()
+
+            load_seconds = await generate_load(telegram, args)
+            await drain(telegram, args.settle, args.drain_timeout)
+            bot_stats = bot.get_stats()
+        finally:
+            if bot.ingest:
+                bot.ingest.stop()
+            try:
+                await asyncio.wait_for(bot_task, timeout=10)
+            except asyncio.TimeoutError:
+                bot_task.cancel()
+            await bot.stop()
+            await provider.stop()
+            await telegram.stop()
+
+    report = build_report(telegram, load_seconds)
+    report["config"] = {
+        key: value for key, value in vars(args).items() if key not in ("report", "log_level")
+    }
+    report["duration_s"] = round(load_seconds, 2)
+    report["provider"] = provider.get_stats()
+    report["bot"] = bot_stats
+    return report
+
+
+def print_summary(report: Dict[str, Any]):
+    messages = report["messages"]
+    print(f"Сообщений: {messages['sent']}, ответов: {messages.get('answered', 0)}, "
+          f"отказов по лимиту: {messages.get('rate_limited', 0)}, ошибок: {messages.get('error', 0)}, "
+          f"без ответа: {messages.get('unanswered', 0)}")
+    print(f"Пропускная способность: {report['throughput']['answered_rps']} ответов/с "
+          f"(подано {report['throughput']['offered_rps']} сообщений/с)")
+
+    rows = [("end_to_end", report["latency"]["end_to_end"]), ("first_reply", report["latency"]["first_reply"])]
+    rows += list(report["stages"].items())
+    print(f"{'этап':>12} {'p50, мс':>10} {'p95, мс':>10} {'p99, мс':>10} {'max, мс':>10}")
+    for name, stats in rows:
+        print(f"{name:>12} {stats['p50_ms']:>10} {stats['p95_ms']:>10} {stats['p99_ms']:>10} {stats['max_ms']:>10}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный тест TeleGPT")
+    parser.add_argument("--users", type=int, default=1000, help="число пользователей")
+    parser.add_argument("--rate", type=float, default=20.0, help="сообщений в секунду от всех пользователей")
+    parser.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность подачи сообщений, секунды")
+    parser.add_argument("--settle", type=float, default=2.0, help="тишина после последнего ответа, секунды")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="максимум ожидания ответов")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--ttft", type=float, default=0.5, help="медиана задержки первого токена провайдера")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--token-rate", type=float, default=50.0)
+    parser.add_argument("--min-tokens", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--chunk-tokens", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="дополнительная настройка бота, например DISPATCHER_WORKERS=64")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--report", help="файл JSON отчета (по умолчанию - stdout)")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2, default=str)
+        print_summary(report)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,112 +1,30 @@
 """
 TeleGPT - Telegram бот для общения с различными AI моделями
-С адаптивным polling для быстрых ответов
+С long polling для быстрых ответов
 """
 
 import asyncio
 import logging
 import platform
-import time
-from typing import Dict, Set
-from telegram.ext import Application
 
+from bot.activity import ActivityTracker
+from bot.application import build_application
+from bot.dispatcher import UpdateDispatcher
 from bot.handlers import register_handlers
+from bot.polling import LongPolling
+from bot.sharding import ShardedDispatcher
 from config.settings import settings
+from services.ai_factory import ai_factory
+from services.context_builder import context_builder
+from services.dedup_service import message_deduplicator
+from services.failover import failover_executor
+from services.message_writer import message_writer
+from services.rate_limiter import user_rate_limiter
+from services.usage import usage_tracker
+from services.user_service import user_cache
+from services.offset_store import OffsetStore
 from utils.logger import setup_logger
-from database.db import init_database
-
-
-class AdaptivePolling:
-    """Адаптивный polling для TeleGPT"""
-    
-    def __init__(self, application: Application):
-        self.application = application
-        self.active_users: Set[int] = set()
-        self.last_activity: Dict[int, float] = {}
-        self.normal_interval = 10  # Обычный интервал (секунды)
-        self.fast_interval = 2     # Быстрый интервал (секунды)
-        self.activity_timeout = 20  # Таймаут активности (секунды)
-        self.running = False
-    
-    def add_active_user(self, user_id: int):
-        """Добавить пользователя в активные"""
-        self.active_users.add(user_id)
-        self.last_activity[user_id] = time.time()
-        logging.info(f"⚡ Пользователь {user_id} активен - быстрый polling ({self.fast_interval}с)")
-    
-    def remove_active_user(self, user_id: int):
-        """Убрать пользователя из активных"""
-        self.active_users.discard(user_id)
-        if user_id in self.last_activity:
-            del self.last_activity[user_id]
-        if not self.active_users:
-            logging.info(f"🐌 Переключение на обычный polling ({self.normal_interval}с)")
-    
-    def cleanup_inactive_users(self):
-        """Очистка неактивных пользователей"""
-        current_time = time.time()
-        inactive_users = [
-            user_id for user_id, last_time in self.last_activity.items()
-            if current_time - last_time > self.activity_timeout
-        ]
-        
-        for user_id in inactive_users:
-            self.remove_active_user(user_id)
-    
-    def get_current_interval(self) -> int:
-        """Получить текущий интервал polling"""
-        self.cleanup_inactive_users()
-        return self.fast_interval if self.active_users else self.normal_interval
-    
-    async def start_adaptive_polling(self):
-        """Запуск адаптивного polling"""
-        logging.info("🚀 Адаптивный polling запущен")
-        logging.info(f"⏱️ Обычный: {self.normal_interval}с, быстрый: {self.fast_interval}с")
-        
-        self.running = True
-        current_interval = self.normal_interval
-        last_update_id = 0
-        
-        while self.running:
-            try:
-                # Получаем новый интервал
-                new_interval = self.get_current_interval()
-                
-                if new_interval != current_interval:
-                    current_interval = new_interval
-                    mode = "быстрый ⚡" if current_interval == self.fast_interval else "обычный 🐌"
-                    logging.info(f"🔄 Режим: {mode} ({current_interval}с)")
-                
-                # Получаем обновления
-                updates = await self.application.bot.get_updates(
-                    offset=last_update_id,
-                    limit=100,
-                    timeout=5,
-                    allowed_updates=["message", "callback_query"]
-                )
-                
-                if updates:
-                    for update in updates:
-                        # Активируем быстрый polling для текстовых сообщений
-                        if (update.message and update.message.text and 
-                            not update.message.text.startswith('/') and
-                            update.effective_user):
-                            
-                            self.add_active_user(update.effective_user.id)
-                        
-                        # Обрабатываем обновление
-                        self.application.update_queue.put_nowait(update)
-                        last_update_id = update.update_id + 1
-                
-                await asyncio.sleep(current_interval)
-                
-            except Exception as e:
-                logging.error(f"❌ Ошибка в адаптивном polling: {e}")
-                await asyncio.sleep(5)
-    
-    def stop(self):
-        """Остановка polling"""
-        self.running = False
+from database.db import close_database, init_database
 
 
 class TeleGPTBot:
@@ -114,61 +32,62 @@ class TeleGPTBot:
     
     def __init__(self):
         self.application = None
-        self.adaptive_polling = None
+        self.dispatcher = None
+        self.activity = None
+        self.offset_store = None
+        self.ingest = None
         self.running = False
     
     async def initialize(self):
         """Инициализация бота"""
         setup_logger()
-        logging.info("🤖 Инициализация TeleGPT с адаптивным polling...")
+        logging.info(f"🤖 Инициализация TeleGPT (режим: {settings.update_mode})...")
         
         # Инициализация базы данных
         await init_database()
+        await message_deduplicator.warm_up()
         
         # Создание приложения бота
-        self.application = Application.builder().token(settings.telegram_token).build()
+        self.application = build_application()
         
         # Регистрация обработчиков
         register_handlers(self.application)
         
-        # Создание адаптивного polling
-        self.adaptive_polling = AdaptivePolling(self.application)
+        # Диспетчер обновлений и источник: long polling или webhook
+        self.dispatcher = self.create_dispatcher()
         
-        # Добавляем middleware для деактивации после обработки
-        self.add_completion_middleware()
+        # Учет активных чатов через хуки диспетчера
+        self.activity = ActivityTracker()
+        self.dispatcher.add_pre_process_hook(self.activity.on_update_started)
+        self.dispatcher.add_post_process_hook(self.activity.on_update_done)
+        self.ingest = self.create_ingest()
         
         logging.info("✅ TeleGPT готов к работе!")
     
-    def add_completion_middleware(self):
-        """Middleware для деактивации быстрого polling после обработки"""
+    def create_dispatcher(self):
+        """Создание диспетчера: в этом процессе или по процессам-шардам"""
         
-        # Находим обработчик текстовых сообщений
-        for group in self.application.handlers.values():
-            for handler in group:
-                if (hasattr(handler, 'filters') and 
-                    str(handler.filters).find('TEXT') != -1 and
-                    hasattr(handler, 'callback')):
-                    
-                    original_callback = handler.callback
-                    
-                    async def completion_wrapper(update, context, original_func=original_callback):
-                        user_id = update.effective_user.id if update.effective_user else None
-                        
-                        try:
-                            # Вызываем оригинальный обработчик
-                            result = await original_func(update, context)
-                            return result
-                            
-                        finally:
-                            # После обработки убираем пользователя из активных
-                            if (user_id and self.adaptive_polling and 
-                                user_id in self.adaptive_polling.active_users):
-                                
-                                await asyncio.sleep(3)  # Небольшая задержка
-                                self.adaptive_polling.remove_active_user(user_id)
-                    
-                    handler.callback = completion_wrapper
-                    break
+        if settings.shard_workers > 0:
+            return ShardedDispatcher(settings.shard_workers)
+        
+        return UpdateDispatcher(self.application)
+    
+    def create_ingest(self):
+        """Создание источника обновлений по настройкам"""
+        
+        if settings.update_mode == "webhook":
+            # aiohttp.web нужен только в режиме webhook
+            from bot.webhook import WebhookServer
+            return WebhookServer(self.application, self.dispatcher)
+        
+        if settings.update_mode != "polling":
+            logging.warning(f"⚠️ Неизвестный режим {settings.update_mode}, используется polling")
+        
+        # Offset сохраняется после обработки, чтобы перезапуск не повторял работу
+        self.offset_store = OffsetStore()
+        self.dispatcher.add_post_process_hook(self.offset_store.on_update_done)
+        
+        return LongPolling(self.application, self.dispatcher, self.offset_store)
     
     async def start(self):
         """Запуск бота"""
@@ -183,50 +102,74 @@ class TeleGPTBot:
             await self.application.initialize()
             await self.application.start()
             
-            # Запуск процессора обновлений
-            processor_task = asyncio.create_task(self.process_updates())
+            # Запуск диспетчера обновлений
+            await self.dispatcher.start()
+            
+            if self.offset_store:
+                self.offset_store.start()
             
-            # Запуск адаптивного polling
-            await self.adaptive_polling.start_adaptive_polling()
+            # Запуск получения обновлений
+            await self.ingest.start()
             
         except Exception as e:
             logging.error(f"❌ Ошибка запуска: {e}")
             raise
-        finally:
-            if 'processor_task' in locals():
-                processor_task.cancel()
     
-    async def process_updates(self):
-        """Обработка обновлений из очереди"""
-        logging.info("🔄 Процессор обновлений запущен")
-        
-        while self.running:
-            try:
-                try:
-                    update = await asyncio.wait_for(
-                        asyncio.to_thread(self.application.update_queue.get),
-                        timeout=1.0
-                    )
-                    await self.application.process_update(update)
-                except asyncio.TimeoutError:
-                    continue
-                    
-            except Exception as e:
-                logging.error(f"❌ Ошибка обработки: {e}")
-                await asyncio.sleep(1)
+    def get_stats(self) -> dict:
+        """Сводная статистика для мониторинга"""
+        
+        stats = {}
+        if self.ingest:
+            stats["ingest"] = self.ingest.get_stats()
+        if self.dispatcher:
+            stats["dispatcher"] = self.dispatcher.get_stats()
+        if self.activity:
+            stats["activity"] = self.activity.get_stats()
+        if self.offset_store:
+            stats["offset"] = self.offset_store.get_stats()
+        stats["dedup"] = message_deduplicator.get_stats()
+        stats["transport"] = ai_factory.get_transport_stats()
+        stats["response_cache"] = ai_factory.get_cache_stats()
+        stats["single_flight"] = ai_factory.get_single_flight_stats()
+        stats["failover"] = failover_executor.get_stats()
+        stats["providers"] = ai_factory.get_provider_status()
+        stats["context"] = context_builder.get_stats()
+        stats["usage"] = usage_tracker.get_stats()
+        stats["users"] = user_cache.get_stats()
+        stats["message_writer"] = message_writer.get_stats()
+        if user_rate_limiter is not None:
+            stats["rate_limit"] = user_rate_limiter.get_stats()
+        
+        return stats
     
     async def stop(self):
         """Остановка бота"""
         logging.info("🛑 Остановка TeleGPT...")
         self.running = False
         
-        if self.adaptive_polling:
-            self.adaptive_polling.stop()
+        if self.ingest:
+            self.ingest.stop()
+        
+        if self.dispatcher:
+            await self.dispatcher.stop()
+        
+        if self.offset_store:
+            await self.offset_store.stop()
+        
+        # Все обработчики завершены - записываем оставшиеся сообщения
+        await message_writer.stop()
+        
+        logging.info(f"📊 Статистика: {self.get_stats()}")
+        
+        await context_builder.stop()
+        await ai_factory.aclose()
         
         if self.application:
             await self.application.stop()
             await self.application.shutdown()
         
+        await close_database()
+        
         logging.info("✅ TeleGPT остановлен")
 
 
@@ -249,9 +192,8 @@ async def main():
 
 
 if __name__ == "__main__":
-    print("🚀 TeleGPT - Telegram бот с адаптивным polling")
-    print("⚡ Быстрые ответы во время обработки AI запросов")
-    print("🐌 Экономия ресурсов в режиме ожидания")
+    print("🚀 TeleGPT - Telegram бот (long polling / webhook)")
+    print("⚡ Обновления поступают сразу, без пауз между запросами")
     print("📋 Для остановки нажмите Ctrl+C")
     print("-" * 50)
     
@@ -0,0 +1,70 @@
+"""
+Окружение миграций Alembic
+
+Из командной строки (alembic upgrade head) миграции применяются к базе из
+DATABASE_URL. При запуске бота database.db.upgrade_schema передает готовое
+соединение через config.attributes["connection"].
+
+База, созданная create_all до перехода на миграции (таблицы есть, таблицы
+ревизий нет), в обоих случаях сначала отмечается ревизией 0001_initial.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import inspect
+from sqlalchemy.pool import NullPool
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import Base, BASELINE_REVISION, DATABASE_URL, build_engine, sqlite_pragmas
+
+# Пакет моделей регистрирует все таблицы - метаданные описывают полную схему (нужно для --autogenerate)
+import models
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def run_migrations(connection):
+    context.configure(connection=connection, target_metadata=target_metadata)
+
+    migration_context = context.get_context()
+    if migration_context.get_current_revision() is None and inspect(connection).has_table("users"):
+        # База создана до перехода на миграции - дальнейшие ревизии учитывают это
+        migration_context.stamp(context.script, BASELINE_REVISION)
+        logging.info(f"🗄️ Существующая схема отмечена ревизией {BASELINE_REVISION}")
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline():
+    """Вывод SQL миграций без подключения к базе (alembic upgrade head --sql)"""
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = build_engine(DATABASE_URL, sqlite_pragmas(), poolclass=NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(run_migrations)
+        await connection.commit()
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif config.attributes.get("connection") is not None:
+    # Запуск из бота: логирование уже настроено, соединение передано
+    run_migrations(config.attributes["connection"])
+else:
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name)
+    asyncio.run(run_migrations_online())
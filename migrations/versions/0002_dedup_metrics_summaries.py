@@ -0,0 +1,65 @@
+"""
+Дедупликация, метрики ответа, состояние бота и краткие содержания бесед
+
+До перехода на миграции эти изменения добавлялись при запуске через
+create_all и ALTER TABLE, поэтому в существующей базе часть из них уже
+может быть - такие шаги пропускаются.
+
+Revision ID: 0002_dedup_metrics_summaries
+Revises: 0001_initial
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002_dedup_metrics_summaries"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+MESSAGE_COLUMNS = ["chat_id", "first_token_time", "prompt_tokens", "cached_tokens"]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    existing = {column["name"] for column in inspector.get_columns("messages")}
+    for name in MESSAGE_COLUMNS:
+        if name not in existing:
+            op.add_column("messages", sa.Column(name, sa.Integer(), nullable=True))
+
+    indexes = {index["name"] for index in inspector.get_indexes("messages")}
+    if "uq_messages_chat_message" not in indexes:
+        op.create_index("uq_messages_chat_message", "messages", ["chat_id", "telegram_message_id"], unique=True)
+
+    if not inspector.has_table("bot_state"):
+        op.create_table(
+            "bot_state",
+            sa.Column("key", sa.String(), nullable=False),
+            sa.Column("value", sa.String(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint("key"),
+        )
+
+    if not inspector.has_table("conversation_summaries"):
+        op.create_table(
+            "conversation_summaries",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("summary", sa.Text(), nullable=False),
+            sa.Column("last_message_id", sa.Integer(), nullable=False),
+            sa.Column("token_count", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("user_id"),
+        )
+
+
+def downgrade():
+    op.drop_table("conversation_summaries")
+    op.drop_table("bot_state")
+    op.drop_index("uq_messages_chat_message", table_name="messages")
+    with op.batch_alter_table("messages") as batch:
+        for name in reversed(MESSAGE_COLUMNS):
+            batch.drop_column(name)
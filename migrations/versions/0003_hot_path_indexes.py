@@ -0,0 +1,31 @@
+"""
+Индексы горячего пути сообщений
+
+Контекст беседы и обновление краткого содержания выбирают сообщения
+пользователя по user_id в порядке id, поэтому без индекса каждый запрос
+читал всю таблицу messages. Индекс (user_id, id) отдает последние
+сообщения пользователя без сортировки. Отдельный индекс ix_messages_id
+дублировал первичный ключ и только замедлял вставку.
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_dedup_metrics_summaries
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+
+revision = "0003_hot_path_indexes"
+down_revision = "0002_dedup_metrics_summaries"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_messages_user_id_id", "messages", ["user_id", "id"])
+    op.drop_index("ix_messages_id", table_name="messages", if_exists=True)
+
+
+def downgrade():
+    op.create_index("ix_messages_id", "messages", ["id"])
+    op.drop_index("ix_messages_user_id_id", table_name="messages")
@@ -0,0 +1,39 @@
+"""
+Номер беседы пользователя для /clear
+
+/clear увеличивает users.context_epoch вместо удаления сообщений: контекст
+и краткое содержание берутся только из текущей беседы, старые сообщения
+остаются в базе для статистики. Индекс (user_id, context_epoch, id)
+заменяет (user_id, id) и отдает последние сообщения текущей беседы без
+просмотра прежних.
+
+Revision ID: 0004_conversation_epochs
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_conversation_epochs"
+down_revision = "0003_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+TABLES = ["users", "messages", "conversation_summaries"]
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column("context_epoch", sa.Integer(), server_default="0", nullable=False))
+    op.create_index("ix_messages_user_epoch_id", "messages", ["user_id", "context_epoch", "id"])
+    op.drop_index("ix_messages_user_id_id", table_name="messages")
+
+
+def downgrade():
+    op.create_index("ix_messages_user_id_id", "messages", ["user_id", "id"])
+    op.drop_index("ix_messages_user_epoch_id", table_name="messages")
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("context_epoch")
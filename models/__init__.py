@@ -1,3 +1,13 @@
 """
 Модуль моделей данных
-"""
\ No newline at end of file
+
+Импорт пакета регистрирует все модели в Base.metadata, поэтому схема
+(create_all, сравнение с миграциями) и связи между моделями полны, какую бы
+из моделей ни импортировал модуль.
+"""
+
+from .user import User
+from .message import Message
+from .ai_model import AIModel
+from .bot_state import BotState
+from .conversation_summary import ConversationSummary
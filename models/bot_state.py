@@ -0,0 +1,22 @@
+"""
+Модель служебного состояния бота
+"""
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from database.db import Base
+
+
+class BotState(Base):
+    """Служебные значения бота (ключ - значение), например offset getUpdates"""
+    
+    __tablename__ = "bot_state"
+    
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    
+    # Временные метки
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<BotState(key={self.key}, value={self.value})>"
@@ -0,0 +1,28 @@
+"""
+Модель краткого содержания беседы
+"""
+
+from sqlalchemy import Column, Integer, DateTime, Text, ForeignKey
+from sqlalchemy.sql import func
+from database.db import Base
+
+
+class ConversationSummary(Base):
+    """Краткое содержание старых сообщений пользователя, обновляемое по мере роста беседы"""
+
+    __tablename__ = "conversation_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    summary = Column(Text, nullable=False)
+    # Беседа, к которой относится содержание; после /clear оно не используется
+    context_epoch = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Последнее сообщение, вошедшее в краткое содержание
+    last_message_id = Column(Integer, nullable=False, default=0)
+    token_count = Column(Integer, nullable=False, default=0)
+
+    # Временные метки
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ConversationSummary(user_id={self.user_id}, last_message_id={self.last_message_id})>"
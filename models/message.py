@@ -2,7 +2,7 @@
 Модель сообщения
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database.db import Base
@@ -13,17 +13,23 @@ class Message(Base):
     
     __tablename__ = "messages"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     # Содержимое сообщения
     user_message = Column(Text, nullable=False)
     ai_response = Column(Text, nullable=True)
     ai_model_used = Column(String, nullable=False)
+    # Беседа пользователя (User.context_epoch), к которой относится сообщение
+    context_epoch = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Метаданные
+    chat_id = Column(Integer, nullable=True)
     telegram_message_id = Column(Integer, nullable=True)
     processing_time = Column(Integer, nullable=True)  # в миллисекундах
+    first_token_time = Column(Integer, nullable=True)  # до первого фрагмента ответа, в миллисекундах
+    prompt_tokens = Column(Integer, nullable=True)  # токенов запроса по данным провайдера (или оценка)
+    cached_tokens = Column(Integer, nullable=True)  # из них прочитано из кэша промптов провайдера
     
     # Временные метки
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -31,5 +37,12 @@ class Message(Base):
     # Связи
     user = relationship("User", back_populates="messages")
     
+    __table_args__ = (
+        # Повторно доставленное сообщение не должно сохраняться дважды
+        Index("uq_messages_chat_message", "chat_id", "telegram_message_id", unique=True),
+        # Последние сообщения текущей беседы пользователя для контекста
+        Index("ix_messages_user_epoch_id", "user_id", "context_epoch", "id"),
+    )
+    
     def __repr__(self):
         return f"<Message(id={self.id}, user_id={self.user_id}, ai_model={self.ai_model_used})>"
\ No newline at end of file
@@ -22,6 +22,8 @@ class User(Base):
     # Настройки пользователя
     current_ai_model = Column(String, default="chatgpt", nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
+    # Номер беседы: /clear начинает новую, старые сообщения остаются в базе
+    context_epoch = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Временные метки
     created_at = Column(DateTime(timezone=True), server_default=func.now())
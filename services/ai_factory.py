@@ -4,9 +4,12 @@
 
 from typing import Optional, Dict
 from .ai_service import AIService
-from .chatgpt_service import ChatGPTService
-from .claude_service import ClaudeService
-from .deepseek_service import DeepSeekService
+from .providers import provider_registry
+from .transport import TransportManager
+from .response_cache import CachedAIService, ResponseCache
+from .single_flight import SingleFlightAIService
+from .concurrency import CircuitBreaker, GuardedAIService
+from .rate_limiter import provider_rate_limiter
 from config.settings import settings
 import logging
 
@@ -15,6 +18,22 @@ class AIServiceFactory:
     """Фабрика для создания AI сервисов"""
     
     _instances: Dict[str, AIService] = {}
+    _transport: Optional[TransportManager] = None
+    _response_cache: Optional[ResponseCache] = None
+    
+    @classmethod
+    def get_transport(cls) -> TransportManager:
+        """Общие пулы HTTP соединений для всех AI сервисов"""
+        if cls._transport is None:
+            cls._transport = TransportManager()
+        return cls._transport
+    
+    @classmethod
+    def get_response_cache(cls) -> ResponseCache:
+        """Общий кэш ответов всех AI сервисов"""
+        if cls._response_cache is None:
+            cls._response_cache = ResponseCache()
+        return cls._response_cache
     
     @classmethod
     def get_service(cls, model_name: str) -> Optional[AIService]:
@@ -22,7 +41,7 @@ class AIServiceFactory:
         Получение экземпляра AI сервиса по названию модели
         
         Args:
-            model_name: Название модели (chatgpt, claude, deepseek)
+            model_name: Ключ модели в реестре провайдеров (chatgpt, claude, deepseek, ...)
             
         Returns:
             Экземпляр AI сервиса или None если модель недоступна
@@ -35,6 +54,12 @@ class AIServiceFactory:
         # Создаем новый экземпляр
         service = cls._create_service(model_name)
         if service and service.is_available():
+            # Порядок слоев снаружи внутрь: кэш, объединение запросов, лимит и автомат защиты
+            service = GuardedAIService(service, model_name, rate_limiter=provider_rate_limiter(model_name))
+            if settings.single_flight_enabled:
+                service = SingleFlightAIService(service)
+            if settings.response_cache_enabled:
+                service = CachedAIService(service, cls.get_response_cache(), model_name)
             cls._instances[model_name] = service
             return service
         
@@ -42,31 +67,19 @@ class AIServiceFactory:
     
     @classmethod
     def _create_service(cls, model_name: str) -> Optional[AIService]:
-        """Создание экземпляра AI сервиса"""
+        """Создание экземпляра AI сервиса; SDK провайдера импортируется здесь"""
+        
+        spec = provider_registry.get(model_name)
+        if spec is None:
+            logging.error(f"Неизвестная модель: {model_name}")
+            return None
+        
+        if not spec.is_configured():
+            logging.warning(f"{spec.provider} API key не настроен")
+            return None
         
         try:
-            if model_name == "chatgpt":
-                if not settings.openai_api_key:
-                    logging.warning("OpenAI API key не настроен")
-                    return None
-                return ChatGPTService(settings.openai_api_key)
-            
-            elif model_name == "claude":
-                if not settings.anthropic_api_key:
-                    logging.warning("Anthropic API key не настроен")
-                    return None
-                return ClaudeService(settings.anthropic_api_key)
-            
-            elif model_name == "deepseek":
-                if not settings.deepseek_api_key:
-                    logging.warning("DeepSeek API key не настроен")
-                    return None
-                return DeepSeekService(settings.deepseek_api_key)
-            
-            else:
-                logging.error(f"Неизвестная модель: {model_name}")
-                return None
-                
+            return spec.create(cls.get_transport())
         except Exception as e:
             logging.error(f"Ошибка создания сервиса {model_name}: {e}")
             return None
@@ -80,13 +93,7 @@ class AIServiceFactory:
             Словарь {model_name: is_available}
         """
         
-        models = {
-            "chatgpt": bool(settings.openai_api_key),
-            "claude": bool(settings.anthropic_api_key),
-            "deepseek": bool(settings.deepseek_api_key)
-        }
-        
-        return models
+        return {spec.key: spec.is_configured() for spec in provider_registry.specs()}
     
     @classmethod
     def get_default_model(cls) -> str:
@@ -97,16 +104,73 @@ class AIServiceFactory:
             Название модели по умолчанию
         """
         
-        available = cls.get_available_models()
-        
-        # Приоритет: ChatGPT -> Claude -> DeepSeek
-        for model in ["chatgpt", "claude", "deepseek"]:
-            if available.get(model, False):
+        # Приоритет - порядок регистрации: ChatGPT -> Claude -> DeepSeek -> сторонние
+        for model, available in cls.get_available_models().items():
+            if available:
                 return model
         
         # Если ни одна не доступна, возвращаем ChatGPT
         return "chatgpt"
     
+    @classmethod
+    def get_transport_stats(cls) -> Dict[str, dict]:
+        """Метрики пулов соединений"""
+        return cls._transport.get_stats() if cls._transport else {}
+    
+    @classmethod
+    def get_cache_stats(cls) -> dict:
+        """Счетчики кэша ответов"""
+        return cls._response_cache.get_stats() if cls._response_cache else {}
+    
+    @classmethod
+    def _find_layer(cls, model_name: str, layer_type: type) -> Optional[AIService]:
+        """Поиск слоя нужного типа в цепочке оберток сервиса"""
+        service = cls._instances.get(model_name)
+        while service is not None and not isinstance(service, layer_type):
+            service = getattr(service, "inner", None)
+        return service
+    
+    @classmethod
+    def get_single_flight_stats(cls) -> Dict[str, dict]:
+        """Счетчики объединения запросов по моделям"""
+        stats = {}
+        for model_name in cls._instances:
+            layer = cls._find_layer(model_name, SingleFlightAIService)
+            if layer is not None:
+                stats[model_name] = layer.get_stats()
+        return stats
+    
+    @classmethod
+    def get_provider_status(cls) -> Dict[str, dict]:
+        """
+        Состояние провайдеров для мониторинга
+        
+        Returns:
+            Словарь {model_name: {configured, accepting, breaker, concurrency}};
+            accepting - ключ настроен и автомат защиты не открыт
+        """
+        
+        status = {}
+        for model_name, configured in cls.get_available_models().items():
+            entry = {"configured": configured, "accepting": configured}
+            guard = cls._find_layer(model_name, GuardedAIService)
+            if guard is not None:
+                entry.update(guard.get_stats())
+                entry["accepting"] = configured and guard.breaker.state != CircuitBreaker.OPEN
+            status[model_name] = entry
+        return status
+    
+    @classmethod
+    async def aclose(cls):
+        """Закрытие пулов соединений при остановке бота"""
+        if cls._transport:
+            await cls._transport.aclose()
+            cls._transport = None
+        if cls._response_cache:
+            await cls._response_cache.close()
+            cls._response_cache = None
+        cls._instances.clear()
+    
     @classmethod
     def clear_cache(cls):
         """Очистка кэша экземпляров сервисов"""
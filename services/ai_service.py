@@ -3,7 +3,12 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional
+
+
+# Предыдущие сообщения беседы в хронологическом порядке:
+# [{"role": "system" | "user" | "assistant", "content": "..."}]
+ConversationTurns = List[Dict[str, str]]
 
 
 class AIService(ABC):
@@ -13,19 +18,40 @@ class AIService(ABC):
         self.api_key = api_key
     
     @abstractmethod
-    async def generate_response(self, message: str, context: Optional[str] = None) -> str:
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
         """
         Генерация ответа от AI модели
         
         Args:
             message: Сообщение пользователя
-            context: Контекст беседы (опционально)
+            context: Предыдущие сообщения беседы с ролями (опционально)
             
         Returns:
             Ответ от AI модели
+            
+        Raises:
+            AIServiceError: Провайдер не дал ответа (см. services/errors.py)
         """
         pass
     
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        """
+        Потоковая генерация ответа от AI модели
+        
+        Args:
+            message: Сообщение пользователя
+            context: Предыдущие сообщения беседы с ролями (опционально)
+            
+        Yields:
+            Фрагменты ответа по мере генерации. По умолчанию - весь ответ
+            одним фрагментом, сервисы с поддержкой потоковой передачи
+            переопределяют метод.
+            
+        Raises:
+            AIServiceError: Ошибка до или во время передачи ответа
+        """
+        yield await self.generate_response(message, context)
+    
     @abstractmethod
     def get_model_name(self) -> str:
         """Получение названия модели"""
@@ -34,4 +60,30 @@ class AIService(ABC):
     @abstractmethod
     def is_available(self) -> bool:
         """Проверка доступности сервиса"""
-        pass
\ No newline at end of file
+        pass
+
+
+class AIServiceWrapper(AIService):
+    """
+    Базовый класс обертки над AI сервисом
+    
+    Делегирует все вызовы внутреннему сервису; наследники переопределяют
+    только то, что им нужно (кэширование, объединение запросов и т.п.).
+    """
+    
+    def __init__(self, inner: AIService):
+        super().__init__(inner.api_key)
+        self.inner = inner
+    
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
+        return await self.inner.generate_response(message, context)
+    
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        async for delta in self.inner.stream_response(message, context):
+            yield delta
+    
+    def get_model_name(self) -> str:
+        return self.inner.get_model_name()
+    
+    def is_available(self) -> bool:
+        return self.inner.is_available()
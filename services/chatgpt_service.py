@@ -3,41 +3,112 @@
 """
 
 import openai
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 import logging
-from .ai_service import AIService
+from .ai_service import AIService, ConversationTurns
+from .errors import (AIServiceError, EmptyResponseError, ProviderTimeoutError, ProviderUnavailableError,
+                     error_from_status, parse_retry_after)
+from .transport import TransportManager
+from .usage import usage_tracker
 
 
 class ChatGPTService(AIService):
     """Сервис для работы с ChatGPT"""
     
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo",
+                 transport: Optional[TransportManager] = None, base_url: Optional[str] = None):
         super().__init__(api_key)
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        http_client = transport.httpx_client("openai") if transport else None
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
         self.model = model
     
-    async def generate_response(self, message: str, context: Optional[str] = None) -> str:
+    def _build_messages(self, message: str, context: Optional[ConversationTurns] = None) -> List[dict]:
+        """
+        Формирование списка сообщений для API
+        
+        История идет неизменным префиксом перед новым вопросом - OpenAI
+        кэширует такой префикс автоматически (от 1024 токенов).
+        """
+        messages = list(context or [])
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    @staticmethod
+    def _record_usage(usage):
+        """Учет токенов ответа, включая прочитанные из кэша промптов"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        usage_tracker.record(
+            "chatgpt",
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=getattr(details, "cached_tokens", 0) if details else 0
+        )
+    
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
         """Генерация ответа от ChatGPT"""
         try:
-            messages = []
-            
-            if context:
-                messages.append({"role": "system", "content": context})
-            
-            messages.append({"role": "user", "content": message})
-            
             response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
+                messages=self._build_messages(message, context),
                 max_tokens=4000,
                 temperature=0.7
             )
             
-            return response.choices[0].message.content.strip()
+            self._record_usage(response.usage)
+            content = (response.choices[0].message.content or "").strip()
+            if not content:
+                raise EmptyResponseError("chatgpt", "пустой ответ")
+            return content
             
         except Exception as e:
-            logging.error(f"Ошибка при обращении к ChatGPT: {e}")
-            return "Извините, произошла ошибка при обработке вашего запроса."
+            error = self._translate_error(e)
+            if error is None:
+                # Ошибка кода, а не провайдера: без повторов и переключения на другие модели
+                raise
+            logging.error(f"Ошибка при обращении к ChatGPT: {error}")
+            raise error from e
+    
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        """Потоковая генерация ответа от ChatGPT"""
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._build_messages(message, context),
+                max_tokens=4000,
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            
+            async for chunk in stream:
+                # Последний фрагмент потока - без choices, с usage
+                if chunk.usage:
+                    self._record_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is None:
+                # Ошибка кода, а не провайдера: без повторов и переключения на другие модели
+                raise
+            logging.error(f"Ошибка при потоковом обращении к ChatGPT: {error}")
+            raise error from e
+    
+    def _translate_error(self, error: Exception) -> Optional[AIServiceError]:
+        """Преобразование ошибки SDK в типизированную ошибку сервиса; None - ошибка не SDK"""
+        if isinstance(error, AIServiceError):
+            return error
+        if isinstance(error, openai.APITimeoutError):
+            return ProviderTimeoutError("chatgpt", str(error))
+        if isinstance(error, openai.APIConnectionError):
+            return ProviderUnavailableError("chatgpt", str(error))
+        if isinstance(error, openai.APIStatusError):
+            retry_after = parse_retry_after(error.response.headers.get("retry-after"))
+            return error_from_status("chatgpt", error.status_code, error.message, retry_after)
+        return None
     
     def get_model_name(self) -> str:
         """Получение названия модели"""
@@ -3,40 +3,134 @@
 """
 
 import anthropic
-from typing import Optional
+from typing import AsyncIterator, Optional
 import logging
-from .ai_service import AIService
+from config.settings import settings
+from .ai_service import AIService, ConversationTurns
+from .errors import (AIServiceError, EmptyResponseError, ProviderTimeoutError, ProviderUnavailableError,
+                     error_from_status, parse_retry_after)
+from .transport import TransportManager
+from .usage import usage_tracker
+
+
+# Метка кэша промптов Anthropic: префикс до помеченного блока кэшируется на 5 минут
+CACHE_CONTROL = {"type": "ephemeral"}
 
 
 class ClaudeService(AIService):
     """Сервис для работы с Claude"""
     
-    def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229"):
+    def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229",
+                 transport: Optional[TransportManager] = None,
+                 prompt_caching: bool = settings.prompt_caching_enabled,
+                 base_url: Optional[str] = None):
         super().__init__(api_key)
-        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        http_client = transport.httpx_client("anthropic") if transport else None
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=http_client)
         self.model = model
+        self.prompt_caching = prompt_caching
+    
+    def _build_request(self, message: str, context: Optional[ConversationTurns] = None) -> dict:
+        """
+        Параметры запроса: системные сообщения - в system, история - репликами user/assistant
+        
+        Неизменный префикс (краткое содержание и история) помечается
+        cache_control, поэтому следующий запрос той же беседы читает его из
+        кэша, а не обрабатывает заново. Префикс короче минимального для
+        модели размера API просто не кэширует.
+        """
+        turns = context or []
+        system = [
+            {"type": "text", "text": turn["content"]} for turn in turns if turn["role"] == "system"
+        ]
+        messages = [
+            {"role": turn["role"], "content": turn["content"]} for turn in turns if turn["role"] != "system"
+        ]
+        
+        if self.prompt_caching:
+            if system:
+                system[-1]["cache_control"] = CACHE_CONTROL
+            if messages:
+                last = messages[-1]
+                last["content"] = [{"type": "text", "text": last["content"], "cache_control": CACHE_CONTROL}]
+        
+        messages.append({"role": "user", "content": message})
+        
+        request = {
+            "model": self.model,
+            "max_tokens": 4000,
+            "temperature": 0.7,
+            "messages": messages
+        }
+        if system:
+            request["system"] = system
+        return request
     
-    async def generate_response(self, message: str, context: Optional[str] = None) -> str:
+    @staticmethod
+    def _record_usage(usage):
+        """Учет токенов ответа: input_tokens не включает прочитанные и записанные в кэш"""
+        if usage is None:
+            return
+        cached = getattr(usage, "cache_read_input_tokens", None) or 0
+        written = getattr(usage, "cache_creation_input_tokens", None) or 0
+        usage_tracker.record(
+            "claude",
+            prompt_tokens=usage.input_tokens + cached + written,
+            completion_tokens=usage.output_tokens,
+            cached_tokens=cached,
+            cache_write_tokens=written
+        )
+    
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
         """Генерация ответа от Claude"""
         try:
-            prompt = message
-            if context:
-                prompt = f"Контекст: {context}\n\nВопрос: {message}"
-            
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                temperature=0.7,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            response = await self.client.messages.create(**self._build_request(message, context))
+            self._record_usage(response.usage)
             
-            return response.content[0].text.strip()
+            content = "".join(block.text for block in response.content if block.type == "text").strip()
+            if not content:
+                raise EmptyResponseError("claude", "пустой ответ")
+            return content
             
         except Exception as e:
-            logging.error(f"Ошибка при обращении к Claude: {e}")
-            return "Извините, произошла ошибка при обработке вашего запроса."
+            error = self._translate_error(e)
+            if error is None:
+                # Ошибка кода, а не провайдера: без повторов и переключения на другие модели
+                raise
+            logging.error(f"Ошибка при обращении к Claude: {error}")
+            raise error from e
+    
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        """Потоковая генерация ответа от Claude"""
+        try:
+            async with self.client.messages.stream(**self._build_request(message, context)) as stream:
+                async for text in stream.text_stream:
+                    if text:
+                        yield text
+                
+                final_message = await stream.get_final_message()
+                self._record_usage(final_message.usage)
+                        
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is None:
+                # Ошибка кода, а не провайдера: без повторов и переключения на другие модели
+                raise
+            logging.error(f"Ошибка при потоковом обращении к Claude: {error}")
+            raise error from e
+    
+    def _translate_error(self, error: Exception) -> Optional[AIServiceError]:
+        """Преобразование ошибки SDK в типизированную ошибку сервиса; None - ошибка не SDK"""
+        if isinstance(error, AIServiceError):
+            return error
+        if isinstance(error, anthropic.APITimeoutError):
+            return ProviderTimeoutError("claude", str(error))
+        if isinstance(error, anthropic.APIConnectionError):
+            return ProviderUnavailableError("claude", str(error))
+        if isinstance(error, anthropic.APIStatusError):
+            retry_after = parse_retry_after(error.response.headers.get("retry-after"))
+            return error_from_status("claude", error.status_code, error.message, retry_after)
+        return None
     
     def get_model_name(self) -> str:
         """Получение названия модели"""
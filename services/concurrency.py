@@ -0,0 +1,286 @@
+"""
+Адаптивный лимит одновременных запросов и автомат защиты для AI провайдеров
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from config.settings import settings
+from utils.metrics import LatencyTracker
+from .ai_service import AIService, AIServiceWrapper, ConversationTurns
+from .errors import AIServiceError, CircuitOpenError, ProviderBusyError, RateLimitError
+from .rate_limiter import RateLimiter
+
+
+class AdaptiveLimiter:
+    """
+    Лимит одновременных запросов с AIMD регулировкой
+
+    Успешный быстрый ответ увеличивает лимит примерно на единицу за каждые
+    limit ответов (аддитивный рост). Перегрузка - ошибка 429/5xx, таймаут
+    или задержка выше latency_target - умножает лимит на decrease_factor,
+    не чаще раза в cooldown секунд, чтобы пачка одновременных ошибок не
+    обрушила лимит до минимума.
+    """
+
+    def __init__(self, initial_limit: float = settings.concurrency_initial_limit,
+                 min_limit: float = settings.concurrency_min_limit,
+                 max_limit: float = settings.concurrency_max_limit,
+                 latency_target: float = settings.concurrency_latency_target,
+                 decrease_factor: float = 0.5,
+                 cooldown: float = 1.0,
+                 acquire_timeout: float = settings.concurrency_acquire_timeout,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.acquire_timeout = acquire_timeout
+        self.clock = clock
+
+        self.in_flight = 0
+        self.waiting = 0
+        self._changed = asyncio.Condition()
+        self._last_decrease = float("-inf")
+
+        self.increases = 0
+        self.decreases = 0
+        self.rejected = 0
+        self.wait_time = LatencyTracker()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    async def acquire(self) -> bool:
+        """Ожидание свободного места; False если не дождались за acquire_timeout"""
+        started = time.perf_counter()
+        async with self._changed:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._changed.wait_for(self._has_capacity), self.acquire_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+        self.wait_time.record(time.perf_counter() - started)
+        return True
+
+    def on_result(self, latency: Optional[float], overloaded: bool):
+        """Регулировка лимита по результату запроса"""
+        if overloaded or (latency is not None and latency > self.latency_target):
+            now = self.clock()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+                self.decreases += 1
+        elif latency is not None:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.increases += 1
+
+    async def release(self):
+        """Освобождение места"""
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "rejected": self.rejected,
+            "wait_time": self.wait_time.snapshot(),
+        }
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты: closed -> open -> half_open -> closed
+
+    После failure_threshold ошибок подряд автомат открывается, и запросы
+    сразу отклоняются. Через reset_timeout он переходит в half_open и
+    пропускает пробный запрос: успех закрывает автомат, ошибка снова
+    открывает его.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = settings.circuit_failure_threshold,
+                 reset_timeout: float = settings.circuit_reset_timeout,
+                 half_open_max_calls: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def retry_in(self) -> float:
+        """Секунд до пробного запроса"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def on_abandoned(self):
+        """Запрос не дал результата (отменен) - возвращаем пробу half_open"""
+        if self._state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def on_success(self):
+        if self._state != self.CLOSED:
+            logging.info("✅ Автомат защиты провайдера закрыт")
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def on_failure(self):
+        self.consecutive_failures += 1
+        if self._state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opens += 1
+            self._state = self.OPEN
+            self.opened_at = self.clock()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in": round(self.retry_in, 1),
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
+
+
+class GuardedAIService(AIServiceWrapper):
+    """
+    AI сервис за автоматом защиты и адаптивным лимитом одновременных запросов
+
+    Если задан rate_limiter, запрос сначала списывает токен из общей корзины
+    провайдера; при ее исчерпании он отклоняется без обращения к провайдеру.
+    """
+
+    def __init__(self, inner: AIService, provider: str,
+                 limiter: Optional[AdaptiveLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(inner)
+        self.provider = provider
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter
+
+    async def _enter(self):
+        if self.rate_limiter is not None:
+            retry_after = self.rate_limiter.check(self.provider)
+            if retry_after:
+                raise RateLimitError(self.provider, "превышен лимит запросов к провайдеру", retry_after)
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.provider, self.breaker.retry_in)
+        try:
+            acquired = await self.limiter.acquire()
+        except BaseException:
+            self.breaker.on_abandoned()
+            raise
+        if not acquired:
+            # Запрос не дошел до провайдера - это не ошибка провайдера
+            self.breaker.on_abandoned()
+            raise ProviderBusyError(self.provider, f"превышен лимит {int(self.limiter.limit)} запросов")
+
+    def _record(self, latency: Optional[float], error: Optional[AIServiceError]):
+        # Отклоненный запрос (ключ, параметры) - не признак перегрузки провайдера
+        if error is not None and error.retryable:
+            self.breaker.on_failure()
+            self.limiter.on_result(latency, overloaded=True)
+        else:
+            self.breaker.on_success()
+            self.limiter.on_result(latency, overloaded=False)
+
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
+        await self._enter()
+        started = time.perf_counter()
+        error = None
+        try:
+            response = await self.inner.generate_response(message, context)
+        except AIServiceError as e:
+            error = e
+            raise
+        except BaseException:
+            # Отмена или ошибка кода - о провайдере ничего не известно
+            self.breaker.on_abandoned()
+            raise
+        finally:
+            await self.limiter.release()
+            if error is not None:
+                self._record(time.perf_counter() - started, error)
+
+        self._record(time.perf_counter() - started, None)
+        return response
+
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        await self._enter()
+        started = time.perf_counter()
+        first_token = None
+        completed = False
+        try:
+            async for delta in self.inner.stream_response(message, context):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                yield delta
+            completed = True
+        except AIServiceError as e:
+            completed = True
+            self._record(first_token, e)
+            raise
+        finally:
+            await self.limiter.release()
+            if not completed:
+                # Поток закрыт потребителем или отменен
+                self.breaker.on_abandoned()
+
+        # Для потока ориентируемся на задержку первого фрагмента
+        self._record(first_token, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "breaker": self.breaker.get_stats(),
+            "concurrency": self.limiter.get_stats(),
+        }
+        if self.rate_limiter is not None:
+            stats["rate_limit"] = self.rate_limiter.get_stats()
+        return stats
@@ -0,0 +1,561 @@
+"""
+Сборка контекста беседы в пределах бюджета токенов
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+
+from config.settings import settings
+from database.db import AsyncReadSessionLocal, AsyncSessionLocal
+from models.conversation_summary import ConversationSummary
+from models.message import Message
+from .ai_service import ConversationTurns
+from .message_writer import MessageWriter, message_writer
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+SUMMARY_PROMPT = (
+    "Обнови краткое содержание беседы пользователя с ассистентом. "
+    "Сохрани факты о пользователе, имена, договоренности и нерешенные вопросы, "
+    "опусти приветствия и повторы. Ответь только новым кратким содержанием "
+    "не длиннее {tokens} токенов."
+)
+
+
+class TokenCounter:
+    """
+    Подсчет токенов локально, без обращения к провайдеру
+
+    Если установлен tiktoken, используется кодировка cl100k_base. Иначе
+    токены оцениваются по длине текста в байтах UTF-8: в BPE словарях
+    одному токену в среднем соответствует около 4 байт, то есть 4 латинских
+    символа или 2 кириллических.
+    """
+
+    BYTES_PER_TOKEN = 4
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logging.warning(f"⚠️ Кодировка {encoding} недоступна, токены оцениваются по длине: {e}")
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: Optional[str]) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text.encode("utf-8")) // self.BYTES_PER_TOKEN + 1
+
+
+def format_turn(message: Message) -> str:
+    """Одна пара вопрос - ответ в тексте запроса на краткое содержание"""
+    return f"Пользователь: {message.user_message}\n\nАссистент: {message.ai_response}"
+
+
+def format_summary(summary: str) -> str:
+    return f"Краткое содержание предыдущей беседы: {summary}"
+
+
+def message_turns(message: Message) -> ConversationTurns:
+    """Сохраненное сообщение - реплики пользователя и ассистента"""
+    return [
+        {"role": "user", "content": message.user_message},
+        {"role": "assistant", "content": message.ai_response},
+    ]
+
+
+class ContextTurn:
+    """Пара вопрос - ответ в кэше контекста"""
+
+    __slots__ = ("_id", "message", "user_message", "ai_response", "tokens")
+
+    def __init__(self, id: Optional[int], user_message: str, ai_response: str,
+                 message: Optional[Message] = None):
+        self._id = id
+        # Сообщение из очереди записи: id появится после записи в базу
+        self.message = message
+        self.user_message = user_message
+        self.ai_response = ai_response
+        self.tokens: Optional[int] = None
+
+    @classmethod
+    def from_message(cls, message: Message) -> "ContextTurn":
+        return cls(message.id, message.user_message, message.ai_response, message)
+
+    @property
+    def id(self) -> Optional[int]:
+        if self._id is None and self.message is not None:
+            self._id = self.message.id
+        return self._id
+
+    @property
+    def size(self) -> int:
+        return len(self.user_message) + len(self.ai_response)
+
+
+class ConversationEntry:
+    """Краткое содержание и последние реплики беседы epoch, от старых к новым"""
+
+    __slots__ = ("epoch", "summary", "summary_tokens", "covered", "turns", "size")
+
+    def __init__(self, summary: str, summary_tokens: int, covered: int, turns: List[ContextTurn],
+                 epoch: int = 0):
+        self.epoch = epoch
+        self.summary = summary
+        self.summary_tokens = summary_tokens
+        self.covered = covered
+        self.turns: Deque[ContextTurn] = deque(turns)
+        self.size = len(summary) + sum(turn.size for turn in turns)
+
+
+class ConversationCache:
+    """
+    LRU кэш контекста бесед по пользователям
+
+    Для каждого пользователя хранятся краткое содержание и кольцевой буфер
+    из max_turns последних реплик. Буфер пополняется при ответе
+    (ContextBuilder.remember), поэтому для активной беседы контекст
+    собирается без обращения к базе. Дольше всех не писавшие пользователи
+    вытесняются, когда пользователей больше max_users или текста во всех
+    записях больше max_chars символов. Запись прежней беседы (до /clear)
+    считается промахом.
+    """
+
+    def __init__(self, max_users: int = settings.context_cache_users,
+                 max_chars: int = settings.context_cache_chars,
+                 max_turns: int = settings.context_fetch_limit):
+        self.max_users = max_users
+        self.max_chars = max_chars
+        self.max_turns = max_turns
+
+        self._entries: "OrderedDict[int, ConversationEntry]" = OrderedDict()
+        self.chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int, epoch: int = 0) -> Optional[ConversationEntry]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry.epoch != epoch:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def put(self, user_id: int, entry: ConversationEntry):
+        """Запись, загруженная из базы; при max_users 0 не сохраняется"""
+        if self.max_users <= 0:
+            return
+
+        self.invalidate(user_id)
+        while len(entry.turns) > self.max_turns:
+            entry.size -= entry.turns.popleft().size
+        self._entries[user_id] = entry
+        self.chars += entry.size
+        self._evict()
+
+    def append(self, user_id: int, turn: ContextTurn, epoch: int = 0):
+        """Новая реплика в буфер пользователя, если его беседа epoch в кэше"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry.epoch != epoch:
+            return
+        # Сборка контекста могла уже взять это сообщение из очереди записи
+        if turn.message is not None and any(cached.message is turn.message for cached in entry.turns):
+            return
+
+        entry.turns.append(turn)
+        entry.size += turn.size
+        self.chars += turn.size
+        if len(entry.turns) > self.max_turns:
+            dropped = entry.turns.popleft().size
+            entry.size -= dropped
+            self.chars -= dropped
+        self._entries.move_to_end(user_id)
+        self._evict()
+
+    def set_summary(self, user_id: int, summary: str, summary_tokens: int, covered: int, epoch: int = 0):
+        """Новое краткое содержание; свернутые реплики убираются из буфера"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry.epoch != epoch:
+            return
+
+        before = entry.size
+        entry.size += len(summary) - len(entry.summary)
+        entry.summary, entry.summary_tokens, entry.covered = summary, summary_tokens, covered
+        while entry.turns and entry.turns[0].id is not None and entry.turns[0].id <= covered:
+            entry.size -= entry.turns.popleft().size
+        self.chars += entry.size - before
+
+    def invalidate(self, user_id: int):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.chars -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self.chars = 0
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_users or self.chars > self.max_chars):
+            _, entry = self._entries.popitem(last=False)
+            self.chars -= entry.size
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._entries),
+            "chars": self.chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ContextBuilder:
+    """
+    Контекст беседы в пределах бюджета токенов модели
+
+    Бюджет заполняется сообщениями от новых к старым. Сообщения, которые
+    в него не поместились, сворачиваются в краткое содержание, которое
+    хранится в базе и обновляется в фоне, вне пути ответа: каждое
+    обновление дописывает к прежнему содержанию только новые сообщения.
+    В контекст попадают содержание и сообщения новее последнего из
+    свернутых.
+
+    Беседы пользователя нумеруются (User.context_epoch): после /clear
+    контекст и краткое содержание собираются только из сообщений новой
+    беседы, а прежние остаются в базе.
+
+    При сворачивании за историей остается только доля summary_keep
+    бюджета. Пока освободившееся место заполняется, начало контекста не
+    меняется и кэшируется провайдером, а не сдвигается на одно сообщение
+    с каждым запросом.
+    """
+
+    # Служебные токены разметки одной реплики
+    TURN_OVERHEAD = 4
+
+    def __init__(self, session_factory=AsyncSessionLocal,
+                 counter: Optional[TokenCounter] = None,
+                 token_budget: int = settings.context_token_budget,
+                 model_budgets: Optional[Dict[str, int]] = None,
+                 fetch_limit: int = settings.context_fetch_limit,
+                 summary_enabled: bool = settings.context_summary_enabled,
+                 summary_tokens: int = settings.context_summary_tokens,
+                 summary_batch: int = settings.context_summary_batch,
+                 summary_concurrency: int = settings.context_summary_concurrency,
+                 summary_keep: float = settings.context_summary_keep,
+                 summarize: Optional[Callable[[str, str], Awaitable[str]]] = None,
+                 read_session_factory=None,
+                 writer: Optional[MessageWriter] = None,
+                 cache: Optional[ConversationCache] = None):
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory or session_factory
+        # Сообщения, еще не записанные в базу (или записанные после начала сессии чтения)
+        self.writer = writer or message_writer
+        self.cache = cache if cache is not None else ConversationCache(max_turns=fetch_limit)
+        self.counter = counter or TokenCounter()
+        self.token_budget = token_budget
+        self.model_budgets = settings.context_model_budgets if model_budgets is None else model_budgets
+        self.fetch_limit = fetch_limit
+        self.summary_enabled = summary_enabled
+        self.summary_tokens = summary_tokens
+        self.summary_batch = summary_batch
+        self.summary_keep = summary_keep
+        self.summarize = summarize or self._summarize_with_model
+
+        # Одна фоновая задача на пользователя; новые запросы на обновление копятся в _pending
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._pending: Dict[int, Tuple[str, int, int]] = {}
+        self._semaphore = asyncio.Semaphore(summary_concurrency)
+
+        self.builds = 0
+        self.dropped_messages = 0
+        self.summary_updates = 0
+        self.summary_errors = 0
+
+    def budget_for(self, model_name: str) -> int:
+        return self.model_budgets.get(model_name, self.token_budget)
+
+    def count_message(self, message: Message) -> int:
+        return (self.counter.count(message.user_message) + self.counter.count(message.ai_response)
+                + 2 * self.TURN_OVERHEAD)
+
+    def count_turn(self, turn: ContextTurn) -> int:
+        if turn.tokens is None:
+            turn.tokens = self.count_message(turn)
+        return turn.tokens
+
+    async def load(self, db_session, user_id: int, epoch: int = 0) -> ConversationEntry:
+        """Краткое содержание и последние реплики беседы epoch из базы (только нужные колонки)"""
+
+        # До запроса к базе: записанное после этого момента останется в pending_for
+        pending = self.writer.pending_for(user_id)
+
+        result = await db_session.execute(
+            select(ConversationSummary.summary, ConversationSummary.token_count,
+                   ConversationSummary.last_message_id)
+            .where(ConversationSummary.user_id == user_id)
+            .where(ConversationSummary.context_epoch == epoch)
+        )
+        summary = result.first()
+        covered = summary.last_message_id if summary else 0
+
+        result = await db_session.execute(
+            select(Message.id, Message.user_message, Message.ai_response)
+            .where(Message.user_id == user_id)
+            .where(Message.context_epoch == epoch)
+            .where(Message.ai_response.isnot(None))
+            .where(Message.id > covered)
+            .order_by(desc(Message.id))
+            .limit(self.fetch_limit)
+        )
+        recent = [ContextTurn(row.id, row.user_message, row.ai_response) for row in result]
+
+        if pending:
+            recent = self._with_pending(recent, pending, covered, epoch)
+
+        recent.reverse()
+        if summary:
+            return ConversationEntry(summary.summary, summary.token_count, covered, recent, epoch)
+        return ConversationEntry("", 0, covered, recent, epoch)
+
+    async def build(self, db_session, user_id: int, model_name: str,
+                    message_text: str, epoch: int = 0) -> Tuple[ConversationTurns, int]:
+        """
+        Контекст для запроса к модели в беседе epoch (User.context_epoch)
+
+        Returns:
+            (реплики беседы в хронологическом порядке, оценка токенов контекста и вопроса)
+        """
+        question_tokens = self.counter.count(message_text) + self.TURN_OVERHEAD
+
+        entry = self.cache.get(user_id, epoch)
+        if entry is None:
+            try:
+                entry = await self.load(db_session, user_id, epoch)
+            except Exception as e:
+                logging.error(f"❌ Ошибка получения контекста: {e}")
+                return [], question_tokens
+            self.cache.put(user_id, entry)
+
+        # От новых к старым
+        recent = list(reversed(entry.turns))
+
+        context: ConversationTurns = []
+        used = question_tokens
+        if entry.summary:
+            context.append({"role": "system", "content": format_summary(entry.summary)})
+            used += entry.summary_tokens
+
+        budget = self.budget_for(model_name)
+        keep_budget = budget * self.summary_keep
+        history = 0
+        kept = 0
+        included: List[ContextTurn] = []
+        for turn in recent:
+            tokens = self.count_turn(turn)
+            if used + tokens > budget:
+                break
+            included.append(turn)
+            used += tokens
+            history += tokens
+            if history <= keep_budget:
+                kept += 1
+
+        self.builds += 1
+        # Незаписанное сообщение (без id) свернется при одной из следующих сборок
+        if len(included) < len(recent):
+            # Сворачиваем с запасом: после обновления остаются kept новых сообщений
+            self.dropped_messages += len(recent) - len(included)
+            if recent[kept].id is not None:
+                self.schedule_summary(user_id, model_name, recent[kept].id, epoch)
+        elif len(recent) == self.fetch_limit and recent[-1].id is not None:
+            # Все загруженные поместились, но старше них могут быть еще не свернутые
+            self.schedule_summary(user_id, model_name, recent[-1].id - 1, epoch)
+
+        for turn in reversed(included):
+            context.extend(message_turns(turn))
+        return context, used
+
+    def remember(self, message: Message):
+        """Ответ, поставленный в очередь записи, - в буфер беседы пользователя"""
+        if message.ai_response is not None:
+            self.cache.append(message.user_id, ContextTurn.from_message(message), message.context_epoch or 0)
+
+    def forget(self, user_id: int):
+        """Сброс кэша беседы пользователя и отложенных обновлений содержания (после /clear)"""
+        self._pending.pop(user_id, None)
+        self.cache.invalidate(user_id)
+
+    def _with_pending(self, recent: List[ContextTurn], pending: List[Message],
+                      covered: int, epoch: int = 0) -> List[ContextTurn]:
+        """Реплики из базы вместе с очередью записи, от новых к старым"""
+        loaded = {turn.id for turn in recent}
+        newer = [
+            ContextTurn.from_message(message) for message in reversed(pending)
+            if message.ai_response is not None and (message.context_epoch or 0) == epoch
+            and (message.id is None or (message.id > covered and message.id not in loaded))
+        ]
+        # Незаписанные - новее всех; сортировка устойчива и сохраняет их порядок
+        merged = sorted(newer + recent, key=lambda turn: (turn.id is None, turn.id or 0), reverse=True)
+        return merged[:self.fetch_limit]
+
+    def schedule_summary(self, user_id: int, model_name: str, up_to_id: int, epoch: int = 0):
+        """Фоновое обновление краткого содержания беседы epoch до сообщения up_to_id включительно"""
+        if not self.summary_enabled:
+            return
+
+        pending = self._pending.get(user_id)
+        if pending is None or (pending[2], pending[1]) < (epoch, up_to_id):
+            self._pending[user_id] = (model_name, up_to_id, epoch)
+
+        if user_id not in self._tasks:
+            task = asyncio.create_task(self._run(user_id), name=f"ContextBuilder:summary:{user_id}")
+            self._tasks[user_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(user_id, None))
+
+    async def _run(self, user_id: int):
+        async with self._semaphore:
+            while user_id in self._pending:
+                model_name, up_to_id, epoch = self._pending.pop(user_id)
+                try:
+                    await self.refresh_summary(user_id, model_name, up_to_id, epoch)
+                except Exception as e:
+                    self.summary_errors += 1
+                    logging.error(f"❌ Ошибка обновления краткого содержания беседы {user_id}: {e}")
+
+    async def refresh_summary(self, user_id: int, model_name: str, up_to_id: int, epoch: int = 0):
+        """Дописывание в краткое содержание беседы epoch сообщений до up_to_id, пачками по summary_batch"""
+        async with self.read_session_factory() as session:
+            summary = await session.get(ConversationSummary, user_id)
+        if summary and summary.context_epoch > epoch:
+            # Пользователь уже начал новую беседу
+            return
+        if summary and summary.context_epoch < epoch:
+            # Содержание беседы до /clear - начинаем с пустого
+            summary = None
+        # Пустое содержание тоже запоминает, до какого сообщения беседа просмотрена
+        text = summary.summary if summary else ""
+        token_count = summary.token_count if summary else 0
+        covered = summary.last_message_id if summary else 0
+
+        while covered < up_to_id:
+            # Соединения не удерживаются во время запроса к модели
+            async with self.read_session_factory() as session:
+                result = await session.execute(
+                    select(Message)
+                    .where(Message.user_id == user_id)
+                    .where(Message.context_epoch == epoch)
+                    .where(Message.ai_response.isnot(None))
+                    .where(Message.id > covered)
+                    .where(Message.id <= up_to_id)
+                    .order_by(Message.id)
+                    .limit(self.summary_batch)
+                )
+                batch = result.scalars().all()
+
+            if len(batch) < self.summary_batch:
+                covered = up_to_id
+            else:
+                covered = batch[-1].id
+
+            if batch:
+                request = self._summary_request(text, batch)
+                text = (await self.summarize(model_name, request)).strip()
+                token_count = self.counter.count(format_summary(text))
+                self.summary_updates += 1
+
+            if not await self._save_summary(user_id, text, covered, token_count, epoch):
+                logging.info(f"🧹 Краткое содержание беседы {epoch} пользователя {user_id} устарело после /clear")
+                return
+            self.cache.set_summary(user_id, text, token_count, covered, epoch)
+
+    async def _save_summary(self, user_id: int, text: str, covered: int, token_count: int, epoch: int) -> bool:
+        """
+        Запись краткого содержания, если строка не принадлежит более новой беседе
+
+        Обновление, начатое до /clear, может закончиться после записи новой
+        беседы; условие на context_epoch не дает ему ее затереть.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(ConversationSummary)
+                .where(ConversationSummary.user_id == user_id)
+                .where(ConversationSummary.context_epoch <= epoch)
+                .values(summary=text, last_message_id=covered, token_count=token_count, context_epoch=epoch)
+            )
+            if result.rowcount:
+                await session.commit()
+                return True
+
+            # Строки нет либо она уже относится к новой беседе
+            session.add(ConversationSummary(
+                user_id=user_id, summary=text, last_message_id=covered, token_count=token_count,
+                context_epoch=epoch
+            ))
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return False
+        return True
+
+    def _summary_request(self, previous: str, batch: List[Message]) -> str:
+        parts = [SUMMARY_PROMPT.format(tokens=self.summary_tokens)]
+        if previous:
+            parts.append(f"Текущее краткое содержание:\n{previous}")
+        parts.append("Новые сообщения:\n" + "\n\n".join(format_turn(message) for message in batch))
+        return "\n\n".join(parts)
+
+    async def _summarize_with_model(self, model_name: str, request: str) -> str:
+        from .failover import failover_executor
+
+        # Фоновый запрос не влияет на задержку хеджирования живых ответов
+        _, summary = await failover_executor.generate(model_name, request, background=True)
+        return summary
+
+    async def stop(self):
+        """Отмена незавершенных фоновых обновлений"""
+        self._pending.clear()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "exact_tokens": self.counter.exact,
+            "builds": self.builds,
+            "dropped_messages": self.dropped_messages,
+            "summary_updates": self.summary_updates,
+            "summary_errors": self.summary_errors,
+            "summaries_running": len(self._tasks),
+            "cache": self.cache.get_stats(),
+        }
+
+
+# Глобальный экземпляр
+context_builder = ContextBuilder(read_session_factory=AsyncReadSessionLocal)
@@ -0,0 +1,101 @@
+"""
+Сервис дедупликации повторно доставленных сообщений
+"""
+
+import logging
+from typing import Any, Dict, Set, Tuple
+
+from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from database.db import AsyncReadSessionLocal
+from models.message import Message
+from utils.bloom import RotatingBloomFilter
+
+
+class MessageDeduplicator:
+    """
+    Дедупликация по паре (chat_id, telegram_message_id)
+
+    Фильтр Блума отсекает новые сообщения без обращения к базе. Если фильтр
+    отвечает "возможно было", решение принимается по уникальному индексу
+    messages. Сообщения, которые обрабатываются прямо сейчас, хранятся
+    отдельно, чтобы параллельная повторная доставка тоже отсекалась.
+    """
+
+    def __init__(self, capacity: int = settings.dedup_capacity,
+                 error_rate: float = settings.dedup_error_rate):
+        self.capacity = capacity
+        self._seen = RotatingBloomFilter(capacity, error_rate)
+        self._in_progress: Set[Tuple[int, int]] = set()
+        self.duplicates = 0
+        self.db_checks = 0
+
+    @staticmethod
+    def _key(chat_id: int, telegram_message_id: int) -> str:
+        return f"{chat_id}:{telegram_message_id}"
+
+    def begin(self, chat_id: int, telegram_message_id: int) -> bool:
+        """Отметить начало обработки; False если это сообщение уже обрабатывается"""
+        pair = (chat_id, telegram_message_id)
+        if pair in self._in_progress:
+            self.duplicates += 1
+            return False
+
+        self._in_progress.add(pair)
+        return True
+
+    def finish(self, chat_id: int, telegram_message_id: int):
+        """Отметить завершение обработки"""
+        self._in_progress.discard((chat_id, telegram_message_id))
+        self._seen.add(self._key(chat_id, telegram_message_id))
+
+    async def is_duplicate(self, db_session: AsyncSession, chat_id: int,
+                           telegram_message_id: int) -> bool:
+        """Проверка, было ли сообщение уже обработано"""
+        if self._key(chat_id, telegram_message_id) not in self._seen:
+            return False
+
+        self.db_checks += 1
+        result = await db_session.execute(
+            select(Message.id)
+            .where(Message.chat_id == chat_id)
+            .where(Message.telegram_message_id == telegram_message_id)
+            .limit(1)
+        )
+
+        if result.first() is None:
+            return False
+
+        self.duplicates += 1
+        return True
+
+    async def warm_up(self, session_factory=AsyncReadSessionLocal):
+        """Заполнение фильтра последними сохраненными сообщениями после запуска"""
+        async with session_factory() as db_session:
+            result = await db_session.execute(
+                select(Message.chat_id, Message.telegram_message_id)
+                .where(Message.chat_id.isnot(None))
+                .order_by(desc(Message.id))
+                .limit(self.capacity)
+            )
+            rows = result.all()
+
+        for chat_id, telegram_message_id in rows:
+            self._seen.add(self._key(chat_id, telegram_message_id))
+
+        logging.info(f"🧹 Фильтр дедупликации заполнен ({len(rows)} сообщений)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика дедупликации"""
+        return {
+            "duplicates": self.duplicates,
+            "db_checks": self.db_checks,
+            "in_progress": len(self._in_progress),
+            "memory_bytes": self._seen.memory_bytes,
+        }
+
+
+# Глобальный экземпляр
+message_deduplicator = MessageDeduplicator()
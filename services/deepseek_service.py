@@ -2,54 +2,150 @@
 Сервис для работы с DeepSeek API
 """
 
-import aiohttp
+import asyncio
 import json
-from typing import Optional
+import aiohttp
+from typing import AsyncIterator, List, Optional
 import logging
-from .ai_service import AIService
+from .ai_service import AIService, ConversationTurns
+from .errors import (AIServiceError, EmptyResponseError, ProviderTimeoutError, ProviderUnavailableError,
+                     error_from_status, parse_retry_after)
+from .transport import TransportManager
+from .usage import usage_tracker
 
 
 class DeepSeekService(AIService):
     """Сервис для работы с DeepSeek"""
     
-    def __init__(self, api_key: str, model: str = "deepseek-chat"):
+    def __init__(self, api_key: str, model: str = "deepseek-chat",
+                 transport: Optional[TransportManager] = None,
+                 base_url: str = "https://api.deepseek.com/v1"):
         super().__init__(api_key)
         self.model = model
-        self.api_url = "https://api.deepseek.com/v1/chat/completions"
+        self.transport = transport or TransportManager()
+        self.api_url = f"{base_url.rstrip('/')}/chat/completions"
+    
+    def _build_headers(self) -> dict:
+        """Заголовки запроса к API"""
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
     
-    async def generate_response(self, message: str, context: Optional[str] = None) -> str:
+    def _build_payload(self, message: str, context: Optional[ConversationTurns] = None, stream: bool = False) -> dict:
+        """
+        Тело запроса к API
+        
+        История идет неизменным префиксом перед новым вопросом - DeepSeek
+        кэширует совпадающий префикс на диске автоматически.
+        """
+        messages: List[dict] = list(context or [])
+        messages.append({"role": "user", "content": message})
+        
+        data = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": 4000,
+            "temperature": 0.7
+        }
+        if stream:
+            data["stream"] = True
+            data["stream_options"] = {"include_usage": True}
+        return data
+    
+    @staticmethod
+    def _record_usage(usage: Optional[dict]):
+        """Учет токенов ответа, включая попадания в кэш контекста"""
+        if not usage:
+            return
+        usage_tracker.record(
+            "deepseek",
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            cached_tokens=usage.get("prompt_cache_hit_tokens", 0)
+        )
+    
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
         """Генерация ответа от DeepSeek"""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            messages = []
-            if context:
-                messages.append({"role": "system", "content": context})
+            headers = self._build_headers()
+            data = self._build_payload(message, context)
             
-            messages.append({"role": "user", "content": message})
+            session = self.transport.aiohttp_session("deepseek")
+            async with session.post(self.api_url, headers=headers, json=data) as response:
+                await self._check_status(response)
+                result = await response.json()
             
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "max_tokens": 4000,
-                "temperature": 0.7
-            }
+            self._record_usage(result.get("usage"))
+            choices = result.get("choices") or []
+            content = ((choices[0].get("message") or {}).get("content") or "").strip() if choices else ""
+            if not content:
+                raise EmptyResponseError("deepseek", "пустой ответ")
+            return content
+                        
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is None:
+                # Ошибка кода, а не провайдера: без повторов и переключения на другие модели
+                raise
+            logging.error(f"Ошибка при обращении к DeepSeek: {error}")
+            raise error from e
+    
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        """Потоковая генерация ответа от DeepSeek (Server-Sent Events)"""
+        try:
+            headers = self._build_headers()
+            data = self._build_payload(message, context, stream=True)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.api_url, headers=headers, json=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result["choices"][0]["message"]["content"].strip()
-                    else:
-                        logging.error(f"DeepSeek API вернул статус {response.status}")
-                        return "Извините, сервис временно недоступен."
+            session = self.transport.aiohttp_session("deepseek")
+            async with session.post(self.api_url, headers=headers, json=data) as response:
+                await self._check_status(response)
+                
+                # Каждое событие - строка "data: {...}", поток завершается "data: [DONE]"
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    
+                    chunk = json.loads(payload)
+                    self._record_usage(chunk.get("usage"))
+                    choices = chunk.get("choices") or []
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        yield delta
                         
         except Exception as e:
-            logging.error(f"Ошибка при обращении к DeepSeek: {e}")
-            return "Извините, произошла ошибка при обработке вашего запроса."
+            error = self._translate_error(e)
+            if error is None:
+                # Ошибка кода, а не провайдера: без повторов и переключения на другие модели
+                raise
+            logging.error(f"Ошибка при потоковом обращении к DeepSeek: {error}")
+            raise error from e
+    
+    @staticmethod
+    async def _check_status(response: aiohttp.ClientResponse):
+        """Ошибка по статусу ответа API"""
+        if response.status != 200:
+            detail = (await response.text())[:200]
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            raise error_from_status("deepseek", response.status, detail, retry_after)
+    
+    def _translate_error(self, error: Exception) -> Optional[AIServiceError]:
+        """Преобразование ошибки транспорта в типизированную ошибку сервиса; None - ошибка не транспорта"""
+        if isinstance(error, AIServiceError):
+            return error
+        if isinstance(error, asyncio.TimeoutError):
+            return ProviderTimeoutError("deepseek", "таймаут запроса")
+        if isinstance(error, aiohttp.ClientError):
+            return ProviderUnavailableError("deepseek", str(error))
+        if isinstance(error, json.JSONDecodeError):
+            # Поток событий оборван или искажен на стороне провайдера
+            return EmptyResponseError("deepseek", f"некорректный ответ: {error}")
+        return None
     
     def get_model_name(self) -> str:
         """Получение названия модели"""
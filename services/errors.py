@@ -0,0 +1,86 @@
+"""
+Типизированные ошибки AI сервисов
+"""
+
+from typing import List, Optional
+
+
+class AIServiceError(Exception):
+    """
+    Базовая ошибка обращения к AI провайдеру
+
+    retryable - имеет ли смысл повторить запрос к этому же провайдеру позже.
+    Переключение на другой провайдер допустимо при любой ошибке.
+    """
+
+    retryable = True
+
+    def __init__(self, provider: str, message: str = ""):
+        self.provider = provider
+        super().__init__(f"{provider}: {message}" if message else provider)
+
+
+class ProviderTimeoutError(AIServiceError):
+    """Провайдер не ответил вовремя"""
+
+
+class ProviderUnavailableError(AIServiceError):
+    """Ошибка соединения или 5xx на стороне провайдера"""
+
+
+class RateLimitError(AIServiceError):
+    """Провайдер ограничил частоту запросов (429)"""
+
+    def __init__(self, provider: str, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(provider, message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """Провайдер временно отключен автоматом защиты после серии ошибок"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(provider, f"автомат защиты открыт, повтор через {retry_in:.0f} сек")
+        self.retry_in = retry_in
+
+
+class ProviderBusyError(ProviderUnavailableError):
+    """Превышен лимит одновременных запросов к провайдеру"""
+
+
+class ProviderRequestError(AIServiceError):
+    """Запрос отклонен провайдером (ключ, модель, параметры)"""
+
+    retryable = False
+
+
+class EmptyResponseError(AIServiceError):
+    """Провайдер вернул пустой или некорректный ответ"""
+
+
+class AllProvidersFailedError(AIServiceError):
+    """Ни один провайдер не дал ответа"""
+
+    def __init__(self, errors: List[AIServiceError]):
+        self.errors = errors
+        super().__init__("all", "; ".join(str(error) for error in errors) or "нет доступных моделей")
+
+
+def error_from_status(provider: str, status: int, message: str = "",
+                      retry_after: Optional[float] = None) -> AIServiceError:
+    """Ошибка по HTTP статусу ответа провайдера"""
+    if status == 429:
+        return RateLimitError(provider, message or "rate limit", retry_after)
+    if status in (408, 504):
+        return ProviderTimeoutError(provider, message or f"HTTP {status}")
+    if status >= 500:
+        return ProviderUnavailableError(provider, message or f"HTTP {status}")
+    return ProviderRequestError(provider, message or f"HTTP {status}")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,238 @@
+"""
+Хеджирование запросов и переключение между AI провайдерами
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from utils.metrics import LatencyTracker
+from .ai_factory import AIServiceFactory, ai_factory
+from .ai_service import AIService, ConversationTurns
+from .errors import AIServiceError, AllProvidersFailedError, EmptyResponseError
+
+
+class FailoverExecutor:
+    """
+    Выполнение запроса с хеджированием и переключением провайдеров
+
+    Запрос уходит выбранной модели. Если она не ответила за свою живую
+    задержку p95 (для потока - до первого фрагмента), тот же запрос
+    дублируется вторичной модели; берется первый успешный ответ, второй
+    запрос отменяется. При ошибке запрос переключается на следующую
+    доступную модель из get_available_models. Фоновые запросы (краткие
+    содержания бесед) не хеджируются и пишут задержку в отдельные трекеры,
+    чтобы длинные ответы не сдвигали p95 живых ответов.
+    """
+
+    def __init__(self, factory: AIServiceFactory = ai_factory,
+                 failover_enabled: bool = settings.failover_enabled,
+                 hedging_enabled: bool = settings.hedging_enabled,
+                 hedge_quantile: float = settings.hedge_quantile,
+                 hedge_min_delay: float = settings.hedge_min_delay,
+                 hedge_default_delay: float = settings.hedge_default_delay,
+                 hedge_min_samples: int = settings.hedge_min_samples,
+                 secondaries: Optional[Dict[str, str]] = None):
+        self.factory = factory
+        self.failover_enabled = failover_enabled
+        self.hedging_enabled = hedging_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.secondaries = dict(settings.hedge_secondary if secondaries is None else secondaries)
+
+        self.latency: Dict[str, LatencyTracker] = {}
+        self.background_latency: Dict[str, LatencyTracker] = {}
+        self.first_token: Dict[str, LatencyTracker] = {}
+        self.errors: Dict[str, int] = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def candidates(self, primary: str) -> List[str]:
+        """Порядок моделей: выбранная, вторичная, остальные доступные"""
+        order = [primary]
+        if not self.failover_enabled:
+            return order
+
+        secondary = self.secondaries.get(primary)
+        if secondary:
+            order.append(secondary)
+
+        for model, available in self.factory.get_available_models().items():
+            if available and model not in order:
+                order.append(model)
+        return order
+
+    def hedge_delay(self, model: str, trackers: Dict[str, LatencyTracker]) -> float:
+        """Задержка перед хеджированием: живой перцентиль задержки модели"""
+        tracker = trackers.get(model)
+        if tracker is None or tracker.count < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, tracker.percentile(self.hedge_quantile))
+
+    def _record(self, trackers: Dict[str, LatencyTracker], model: str, seconds: float):
+        if model not in trackers:
+            trackers[model] = LatencyTracker()
+        trackers[model].record(seconds)
+
+    def _record_error(self, model: str, error: AIServiceError):
+        self.errors[model] = self.errors.get(model, 0) + 1
+        logging.warning(f"⚠️ Модель {model} не ответила: {error}")
+
+    async def _race(self, primary: str, start, trackers: Dict[str, LatencyTracker],
+                    hedging: bool = True) -> Tuple[str, Any]:
+        """
+        Общий цикл хеджирования и переключения
+
+        start(model) запускает попытку и возвращает задачу или None, если
+        модель недоступна. Возвращает модель и результат первой успешной
+        попытки; остальные попытки отменяются.
+        """
+        order = self.candidates(primary)
+        errors: List[AIServiceError] = []
+        pending: Dict[asyncio.Task, Tuple[str, str]] = {}
+        next_index = 0
+        hedged = False
+
+        def launch(reason: str) -> bool:
+            nonlocal next_index
+            while next_index < len(order):
+                model = order[next_index]
+                next_index += 1
+                task = start(model)
+                if task is not None:
+                    pending[task] = (model, reason)
+                    return True
+            return False
+
+        launch("primary")
+        try:
+            while pending:
+                timeout = None
+                if hedging and self.hedging_enabled and not hedged and len(pending) == 1 and next_index < len(order):
+                    (model, _), = pending.values()
+                    timeout = self.hedge_delay(model, trackers)
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch("hedge"):
+                        self.hedges += 1
+                    continue
+
+                for task in done:
+                    model, reason = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except AIServiceError as e:
+                        self._record_error(model, e)
+                        errors.append(e)
+                        continue
+
+                    if reason == "hedge":
+                        self.hedge_wins += 1
+                    return model, result
+
+                if not pending and launch("failover"):
+                    self.failovers += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        raise AllProvidersFailedError(errors)
+
+    async def generate(self, primary: str, message: str, context: Optional[ConversationTurns] = None,
+                       background: bool = False) -> Tuple[str, str]:
+        """
+        Ответ целиком: (модель, которая ответила, ответ)
+
+        background=True - фоновый запрос: без хеджирования, задержка
+        в background_latency, а не в трекерах живых ответов.
+        """
+        trackers = self.background_latency if background else self.latency
+
+        async def attempt(model: str, service: AIService) -> str:
+            started = time.perf_counter()
+            response = await service.generate_response(message, context)
+            self._record(trackers, model, time.perf_counter() - started)
+            return response
+
+        def start(model: str) -> Optional[asyncio.Task]:
+            service = self.factory.get_service(model)
+            return asyncio.create_task(attempt(model, service)) if service else None
+
+        return await self._race(primary, start, trackers, hedging=not background)
+
+    async def open_stream(self, primary: str, message: str,
+                          context: Optional[ConversationTurns] = None) -> Tuple[str, AIService, AsyncIterator[str]]:
+        """
+        Поток ответа: (модель, сервис, фрагменты)
+
+        Хеджирование и переключение возможны до первого фрагмента; ошибка
+        после него передается потребителю потока.
+        """
+        streams: Dict[str, AsyncIterator[str]] = {}
+
+        async def first_chunk(model: str, stream: AsyncIterator[str]) -> str:
+            started = time.perf_counter()
+            try:
+                delta = await stream.__anext__()
+            except StopAsyncIteration:
+                raise EmptyResponseError(model, "пустой поток")
+            self._record(self.first_token, model, time.perf_counter() - started)
+            return delta
+
+        def start(model: str) -> Optional[asyncio.Task]:
+            service = self.factory.get_service(model)
+            if service is None:
+                return None
+            streams[model] = service.stream_response(message, context)
+            return asyncio.create_task(first_chunk(model, streams[model]))
+
+        winner = None
+        try:
+            winner, first = await self._race(primary, start, self.first_token)
+        finally:
+            # Проигравшие и упавшие потоки закрываются; их задачи к этому моменту завершены
+            for model, stream in streams.items():
+                if model != winner:
+                    await self._close_stream(stream)
+
+        async def chunks() -> AsyncIterator[str]:
+            stream = streams[winner]
+            try:
+                yield first
+                async for delta in stream:
+                    yield delta
+            finally:
+                await self._close_stream(stream)
+
+        return winner, self.factory.get_service(winner), chunks()
+
+    @staticmethod
+    async def _close_stream(stream: AsyncIterator[str]):
+        try:
+            await stream.aclose()
+        except Exception as e:
+            logging.debug(f"Ошибка закрытия потока: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика хеджирования и переключений"""
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "errors": dict(self.errors),
+            "latency": {model: tracker.snapshot() for model, tracker in self.latency.items()},
+            "first_token": {model: tracker.snapshot() for model, tracker in self.first_token.items()},
+            "background_latency": {model: tracker.snapshot() for model, tracker in self.background_latency.items()},
+        }
+
+
+# Глобальный экземпляр
+failover_executor = FailoverExecutor()
@@ -0,0 +1,234 @@
+"""
+Сервис отложенной записи сообщений в базу пачками
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from config.settings import settings
+from database.db import AsyncSessionLocal
+from models.message import Message
+
+
+class MessageWriter:
+    """
+    Отложенная (write-behind) запись сообщений
+
+    Обработчик отправляет ответ и ставит сообщение в очередь, не дожидаясь
+    записи. Очередь записывается многострочными транзакциями: когда в ней
+    набирается batch_size сообщений или раз в interval секунд, а также при
+    остановке бота. interval 0 - запись сразу, в транзакции на сообщение.
+
+    Пока сообщение не записано, оно видно через pending_for (контекст
+    беседы) и is_pending (дедупликация). Записанное сообщение еще retain
+    секунд остается в pending_for: сессия чтения, начатая до записи, его не
+    увидит. Сообщения в очереди теряются при аварийном завершении процесса.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal,
+                 batch_size: int = settings.message_write_batch,
+                 interval: float = settings.message_write_interval,
+                 max_pending: int = settings.message_write_max_pending,
+                 retain: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_pending = max_pending
+        self.retain = retain
+        self.clock = clock
+
+        self._queue: List[Message] = []
+        self._keys: Set[Tuple[int, int]] = set()
+        # Незаписанные и недавно записанные сообщения по пользователям, в порядке добавления
+        self._by_user: Dict[int, List[Message]] = {}
+        self._written: Deque[Tuple[float, Message]] = deque()
+
+        self._lock = asyncio.Lock()
+        self._flush_needed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.rows = 0
+        self.transactions = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.max_batch = 0
+
+    @staticmethod
+    def _key(message: Message) -> Optional[Tuple[int, int]]:
+        if message.chat_id is None or message.telegram_message_id is None:
+            return None
+        return message.chat_id, message.telegram_message_id
+
+    def is_pending(self, chat_id: int, telegram_message_id: int) -> bool:
+        """Сообщение в очереди и еще не записано в базу"""
+        return (chat_id, telegram_message_id) in self._keys
+
+    def pending_for(self, user_id: int) -> List[Message]:
+        """Незаписанные и недавно записанные сообщения пользователя, от старых к новым"""
+        return list(self._by_user.get(user_id, ()))
+
+    async def add(self, message: Message):
+        """Постановка сообщения в очередь записи"""
+        key = self._key(message)
+        if key is not None and key in self._keys:
+            self.duplicates += 1
+            return
+
+        self._queue.append(message)
+        if key is not None:
+            self._keys.add(key)
+        self._by_user.setdefault(message.user_id, []).append(message)
+
+        if self.interval <= 0 or len(self._queue) >= self.max_pending:
+            # Без отложенной записи или база не успевает - пишем в этом обработчике
+            try:
+                await self.flush()
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"❌ Ошибка записи сообщений ({len(self._queue)} в очереди): {e}")
+            return
+
+        self.start()
+        if len(self._queue) >= self.batch_size:
+            self._flush_needed.set()
+
+    async def flush(self) -> int:
+        """Запись очереди на момент вызова; возвращает число записанных сообщений"""
+        written = 0
+        async with self._lock:
+            # Поступившие во время записи ждут следующей пачки, а не пишутся по одному
+            remaining = len(self._queue)
+            while remaining > 0 and self._queue:
+                batch = self._queue[:min(self.batch_size, remaining)]
+                remaining -= len(batch)
+                del self._queue[:len(batch)]
+                try:
+                    written += await self._write(batch)
+                except Exception:
+                    # База недоступна - сообщения остаются в очереди до следующей попытки
+                    self._queue[:0] = batch
+                    raise
+                finally:
+                    self._prune()
+        return written
+
+    async def _write(self, batch: List[Message]) -> int:
+        """Одна транзакция на пачку; при конфликте уникального индекса - по одному"""
+        try:
+            async with self.session_factory() as session:
+                session.add_all(batch)
+                await session.commit()
+                self.transactions += 1
+                self._written_batch(batch)
+            return len(batch)
+        except IntegrityError:
+            logging.info(f"В пачке из {len(batch)} сообщений есть уже сохраненные, запись по одному")
+
+        written = []
+        for message in batch:
+            # После отката сообщение снова новое - ключ назначит база
+            message.id = None
+            try:
+                async with self.session_factory() as session:
+                    session.add(message)
+                    await session.commit()
+                    self.transactions += 1
+                    written.append(message)
+            except IntegrityError:
+                # Сообщение сохранено до перезапуска или другим процессом
+                self.duplicates += 1
+                self._forget(message)
+        self._written_batch(written)
+        return len(written)
+
+    def _written_batch(self, batch: List[Message]):
+        now = self.clock()
+        for message in batch:
+            key = self._key(message)
+            if key is not None:
+                self._keys.discard(key)
+            self._written.append((now, message))
+        self.rows += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+
+    def _forget(self, message: Message):
+        key = self._key(message)
+        if key is not None:
+            self._keys.discard(key)
+        messages = self._by_user.get(message.user_id)
+        if messages and message in messages:
+            messages.remove(message)
+            if not messages:
+                del self._by_user[message.user_id]
+
+    def _prune(self):
+        """Записанные раньше чем retain секунд назад сообщения видны только в базе"""
+        deadline = self.clock() - self.retain
+        while self._written and self._written[0][0] <= deadline:
+            _, message = self._written.popleft()
+            self._forget(message)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_needed.clear()
+            if self._stopping:
+                return
+
+            try:
+                await self.flush()
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"❌ Ошибка записи сообщений ({len(self._queue)} в очереди): {e}")
+
+    def start(self):
+        """Запуск фоновой записи (при первом сообщении в очереди)"""
+        if (self._task is None or self._task.done()) and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="MessageWriter:flush")
+
+    async def stop(self):
+        """Остановка с записью оставшихся сообщений"""
+        if self._task:
+            # Без отмены задачи: начатая запись пачки завершается
+            self._stopping = True
+            self._flush_needed.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._stopping = False
+
+        try:
+            await self.flush()
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"❌ Не записано при остановке {len(self._queue)} сообщений: {e}")
+
+        while self._written:
+            _, message = self._written.popleft()
+            self._forget(message)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика отложенной записи"""
+        return {
+            "pending": len(self._queue),
+            "rows": self.rows,
+            "transactions": self.transactions,
+            "rows_per_transaction": round(self.rows / self.transactions, 1) if self.transactions else 0,
+            "max_batch": self.max_batch,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+        }
+
+
+# Глобальный экземпляр
+message_writer = MessageWriter()
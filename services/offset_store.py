@@ -0,0 +1,141 @@
+"""
+Сервис сохранения подтвержденного offset getUpdates
+"""
+
+import asyncio
+import heapq
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from telegram import Update
+
+from config.settings import settings
+from database.db import AsyncSessionLocal
+from models.bot_state import BotState
+
+
+class OffsetStore:
+    """
+    Подтвержденный offset getUpdates с записью в базу пачками
+
+    Подтвержденным считается offset, до которого все полученные обновления
+    уже обработаны. Он сохраняется каждые batch_size обработанных обновлений
+    или раз в interval секунд, а также при остановке бота.
+    """
+
+    KEY = "update_offset"
+
+    def __init__(self, session_factory=AsyncSessionLocal,
+                 batch_size: int = settings.offset_checkpoint_batch,
+                 interval: float = settings.offset_checkpoint_interval):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+
+        # Полученные, но еще не обработанные обновления (куча с ленивым удалением)
+        self._in_flight: Set[int] = set()
+        self._heap: List[int] = []
+        self._next_offset = 0
+
+        self.saved_offset = 0
+        self._unsaved = 0
+        self._flush_needed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.checkpoints = 0
+
+    async def load(self) -> int:
+        """Загрузка сохраненного offset"""
+        async with self.session_factory() as session:
+            state = await session.get(BotState, self.KEY)
+
+        self.saved_offset = int(state.value) if state else 0
+        self._next_offset = max(self._next_offset, self.saved_offset)
+
+        logging.info(f"📌 Загружен offset обновлений: {self.saved_offset}")
+        return self.saved_offset
+
+    def track(self, update: Update):
+        """Учет полученного обновления (до передачи в обработку)"""
+        update_id = update.update_id
+        if update_id in self._in_flight:
+            return
+
+        self._in_flight.add(update_id)
+        heapq.heappush(self._heap, update_id)
+        self._next_offset = max(self._next_offset, update_id + 1)
+
+    def on_update_done(self, update: Update):
+        """Хук диспетчера: обновление обработано"""
+        if update.update_id not in self._in_flight:
+            return
+
+        self._in_flight.discard(update.update_id)
+        self._unsaved += 1
+        if self._unsaved >= self.batch_size:
+            self._flush_needed.set()
+
+    @property
+    def confirmed_offset(self) -> int:
+        """Offset, до которого все обновления обработаны"""
+        while self._heap and self._heap[0] not in self._in_flight:
+            heapq.heappop(self._heap)
+
+        return self._heap[0] if self._heap else self._next_offset
+
+    async def checkpoint(self):
+        """Запись подтвержденного offset в базу"""
+        offset = self.confirmed_offset
+        if offset <= self.saved_offset:
+            return
+
+        async with self.session_factory() as session:
+            state = await session.get(BotState, self.KEY)
+            if state:
+                state.value = str(offset)
+            else:
+                session.add(BotState(key=self.KEY, value=str(offset)))
+            await session.commit()
+
+        self.saved_offset = offset
+        self._unsaved = 0
+        self.checkpoints += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_needed.clear()
+
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logging.error(f"❌ Ошибка сохранения offset: {e}")
+
+    def start(self):
+        """Запуск фоновой записи"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="OffsetStore:checkpoint")
+
+    async def stop(self):
+        """Остановка с финальной записью"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        try:
+            await self.checkpoint()
+        except Exception as e:
+            logging.error(f"❌ Ошибка сохранения offset при остановке: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика сохранения offset"""
+        return {
+            "confirmed_offset": self.confirmed_offset,
+            "saved_offset": self.saved_offset,
+            "in_flight": len(self._in_flight),
+            "checkpoints": self.checkpoints,
+        }
@@ -0,0 +1,142 @@
+"""
+Реестр AI провайдеров с ленивой загрузкой SDK
+
+Провайдер описывается ProviderSpec: ключ модели, данные для меню выбора
+модели и путь к классу сервиса в виде "модуль:Класс". Модуль сервиса (и
+SDK провайдера вместе с ним) импортируется только при создании сервиса,
+то есть при первом запросе к модели с настроенным ключом.
+
+Сторонние провайдеры подключаются через entry points группы
+"telegpt.providers": точка входа указывает на ProviderSpec или функцию,
+которая его возвращает. Например, в pyproject.toml пакета-плагина:
+
+    [project.entry-points."telegpt.providers"]
+    mistral = "telegpt_mistral:PROVIDER"
+"""
+
+import importlib
+import logging
+import os
+from importlib.metadata import entry_points
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+
+
+class ProviderSpec:
+    """Описание AI провайдера"""
+
+    def __init__(self, key: str, name: str, service: str, api_key_setting: str,
+                 base_url_setting: Optional[str] = None, emoji: str = "🤖",
+                 description: str = "", provider: str = ""):
+        self.key = key
+        self.name = name
+        self.service = service
+        self.api_key_setting = api_key_setting
+        self.base_url_setting = base_url_setting
+        self.emoji = emoji
+        self.description = description
+        self.provider = provider or name
+        self._service_class: Optional[type] = None
+
+    @staticmethod
+    def _setting(name: Optional[str]) -> Optional[str]:
+        """Значение из настроек бота или, для сторонних провайдеров, из окружения"""
+        if not name:
+            return None
+        return getattr(settings, name.lower(), None) or os.environ.get(name)
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return self._setting(self.api_key_setting)
+
+    @property
+    def base_url(self) -> Optional[str]:
+        return self._setting(self.base_url_setting)
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def load(self) -> type:
+        """Импорт класса сервиса (и SDK провайдера) при первом использовании"""
+        if self._service_class is None:
+            module_name, _, class_name = self.service.partition(":")
+            self._service_class = getattr(importlib.import_module(module_name), class_name)
+        return self._service_class
+
+    def create(self, transport) -> Any:
+        """Новый экземпляр сервиса с общими пулами соединений"""
+        kwargs = {"transport": transport}
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        return self.load()(self.api_key, **kwargs)
+
+    def __repr__(self):
+        return f"<ProviderSpec(key={self.key}, service={self.service})>"
+
+
+class ProviderRegistry:
+    """Провайдеры в порядке приоритета: встроенные, затем из entry points"""
+
+    ENTRY_POINT_GROUP = "telegpt.providers"
+
+    def __init__(self):
+        self._providers: Dict[str, ProviderSpec] = {}
+        self._entry_points_loaded = False
+
+    def register(self, spec: ProviderSpec, replace: bool = False):
+        """Регистрация провайдера"""
+        if spec.key in self._providers and not replace:
+            logging.warning(f"⚠️ Провайдер {spec.key} уже зарегистрирован, пропущен")
+            return
+        self._providers[spec.key] = spec
+
+    def _load_entry_points(self):
+        """Подключение сторонних провайдеров; вызывается при первом обращении к реестру"""
+        self._entry_points_loaded = True
+        for entry_point in entry_points(group=self.ENTRY_POINT_GROUP):
+            try:
+                spec = entry_point.load()
+                if not isinstance(spec, ProviderSpec):
+                    spec = spec()
+                self.register(spec)
+                logging.info(f"🔌 Подключен провайдер {spec.key} ({entry_point.value})")
+            except Exception as e:
+                logging.error(f"❌ Ошибка подключения провайдера {entry_point.name}: {e}")
+
+    def _ensure_loaded(self):
+        if not self._entry_points_loaded:
+            self._load_entry_points()
+
+    def get(self, key: str) -> Optional[ProviderSpec]:
+        self._ensure_loaded()
+        return self._providers.get(key)
+
+    def specs(self) -> List[ProviderSpec]:
+        self._ensure_loaded()
+        return list(self._providers.values())
+
+    def keys(self) -> List[str]:
+        return [spec.key for spec in self.specs()]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+# Глобальный реестр со встроенными провайдерами
+provider_registry = ProviderRegistry()
+provider_registry.register(ProviderSpec(
+    "chatgpt", "ChatGPT", "services.chatgpt_service:ChatGPTService",
+    api_key_setting="OPENAI_API_KEY", base_url_setting="OPENAI_BASE_URL",
+    emoji="🧠", description="Универсальный помощник от OpenAI", provider="OpenAI",
+))
+provider_registry.register(ProviderSpec(
+    "claude", "Claude", "services.claude_service:ClaudeService",
+    api_key_setting="ANTHROPIC_API_KEY", base_url_setting="ANTHROPIC_BASE_URL",
+    emoji="🎭", description="Продвинутая модель от Anthropic", provider="Anthropic",
+))
+provider_registry.register(ProviderSpec(
+    "deepseek", "DeepSeek", "services.deepseek_service:DeepSeekService",
+    api_key_setting="DEEPSEEK_API_KEY", base_url_setting="DEEPSEEK_BASE_URL",
+    emoji="🚀", description="Быстрая и эффективная модель", provider="DeepSeek",
+))
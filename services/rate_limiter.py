@@ -0,0 +1,116 @@
+"""
+Ограничение частоты запросов: token bucket на пользователя и на провайдера
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from config.settings import settings
+
+
+class RateLimiter:
+    """
+    Набор token bucket с ленивым пополнением
+
+    У каждого ключа своя корзина емкостью burst токенов, которая
+    пополняется со скоростью per_minute токенов в минуту. Корзина хранится
+    одним числом - моментом, когда она снова станет полной (GCRA,
+    эквивалент token bucket), поэтому проверка - O(1) и без пересчета
+    токенов.
+
+    Полная корзина не отличается от новой, и ее удаление не сбрасывает
+    ограничение. При добавлении нового ключа удаляются корзины, которые
+    простаивают полными (не позже idle_ttl секунд после последнего
+    обращения), а при превышении max_buckets - первая в очереди. Очередь
+    упорядочивается при вытеснении, а не при каждой проверке: используемая
+    корзина из начала очереди переносится в конец (алгоритм часов).
+    """
+
+    def __init__(self, per_minute: float = settings.max_requests_per_minute,
+                 burst: Optional[float] = None,
+                 max_buckets: int = settings.rate_limit_max_buckets,
+                 idle_ttl: float = settings.rate_limit_idle_ttl,
+                 clock: Callable[[], float] = time.monotonic):
+        # Интервал между токенами и время полного пополнения пустой корзины
+        self.interval = 60.0 / per_minute
+        self.window = float(burst if burst is not None else per_minute) * self.interval
+        self.max_buckets = max_buckets
+        # Раньше полного пополнения удалять корзину нельзя - это сбросило бы ограничение
+        self.idle_ttl = max(idle_ttl, self.window)
+        self.clock = clock
+
+        # ключ -> момент, когда корзина снова станет полной
+        self._buckets: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def check(self, key: Hashable) -> float:
+        """
+        Списание токена
+
+        Returns:
+            0 если запрос разрешен, иначе через сколько секунд повторить
+        """
+        now = self.clock()
+        full_at = self._buckets.get(key)
+
+        if full_at is None:
+            self._evict(now)
+            full_at = now
+        elif full_at < now:
+            full_at = now
+
+        full_at += self.interval
+        if full_at - now > self.window:
+            self.rejected += 1
+            return full_at - now - self.window
+
+        self._buckets[key] = full_at
+        self.allowed += 1
+        return 0.0
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        idle_before = now - (self.idle_ttl - self.window)
+        # Несколько простаивающих корзин за раз - амортизированно O(1)
+        for _ in range(2):
+            if not buckets:
+                return
+            key = next(iter(buckets))
+            if buckets[key] > idle_before:
+                break
+            buckets.popitem(last=False)
+            self.evictions += 1
+
+        if len(buckets) >= self.max_buckets:
+            key = next(iter(buckets))
+            if buckets[key] > now:
+                # Используемая корзина переносится в конец, вытесняется следующая
+                buckets.move_to_end(key)
+            buckets.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "buckets": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+        }
+
+
+def provider_rate_limiter(model_name: str) -> Optional[RateLimiter]:
+    """Общая корзина провайдера, если для него задан лимит"""
+    per_minute = settings.provider_requests_per_minute.get(model_name)
+    if not per_minute:
+        return None
+    return RateLimiter(per_minute, max_buckets=1)
+
+
+# Глобальный экземпляр (корзина на пользователя Telegram); 0 в настройках отключает ограничение
+user_rate_limiter = RateLimiter() if settings.max_requests_per_minute > 0 else None
@@ -0,0 +1,198 @@
+"""
+Кэш ответов AI сервисов по точному совпадению запроса
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import aiosqlite
+
+from config.settings import settings
+from utils.metrics import LatencyTracker
+from .ai_service import AIService, AIServiceWrapper, ConversationTurns
+
+
+def normalize_message(message: str) -> str:
+    """Нормализация сообщения: регистр и пробелы не влияют на ключ"""
+    return " ".join(message.casefold().split())
+
+
+def make_cache_key(model: str, message: str, context: Optional[ConversationTurns] = None) -> str:
+    """Ключ кэша: модель, нормализованное сообщение и хэш контекста"""
+    serialized = json.dumps(context or [], ensure_ascii=False, sort_keys=True)
+    context_hash = hashlib.sha256(serialized.encode()).hexdigest()
+    raw = f"{model}\0{normalize_message(message)}\0{context_hash}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU кэш ответов с TTL и необязательным вторым уровнем в SQLite
+
+    Первый уровень хранится в памяти и ограничен max_entries записями.
+    Второй уровень (db_path) переживает перезапуск бота: записи пишутся в
+    него сразу, а при промахе в памяти найденная запись поднимается обратно
+    в первый уровень. TTL задается на модель, для остальных действует ttl.
+    """
+
+    def __init__(self, max_entries: int = settings.response_cache_size,
+                 ttl: float = settings.response_cache_ttl,
+                 model_ttls: Optional[Dict[str, float]] = None,
+                 db_path: Optional[str] = settings.response_cache_db):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model_ttls = dict(settings.response_cache_model_ttls if model_ttls is None else model_ttls)
+        self.db_path = db_path
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lookup_time = LatencyTracker()
+
+    def ttl_for(self, model: str) -> float:
+        return self.model_ttls.get(model, self.ttl)
+
+    async def _connection(self) -> Optional[aiosqlite.Connection]:
+        if not self.db_path:
+            return None
+
+        async with self._db_lock:
+            if self._db is None:
+                self._db = await aiosqlite.connect(self.db_path)
+                await self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL)"
+                )
+                await self._db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+                await self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, expires_at: float, response: str):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        """Ответ из кэша или None"""
+        started = time.perf_counter()
+        now = time.time()
+        try:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+
+                del self._entries[key]
+                self.expirations += 1
+
+            db = await self._connection()
+            if db is not None:
+                async with db.execute(
+                    "SELECT response, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+                if row is not None:
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+        finally:
+            self.lookup_time.record(time.perf_counter() - started)
+
+    async def put(self, key: str, model: str, response: str):
+        """Сохранение ответа"""
+        expires_at = time.time() + self.ttl_for(model)
+        self._remember(key, expires_at, response)
+
+        try:
+            db = await self._connection()
+            if db is not None:
+                await db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, model, response, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, model, response, expires_at)
+                )
+                await db.commit()
+        except Exception as e:
+            logging.error(f"❌ Ошибка записи в кэш ответов: {e}")
+
+    def clear(self):
+        """Очистка первого уровня"""
+        self._entries.clear()
+
+    async def close(self):
+        """Закрытие второго уровня"""
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики кэша"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "lookup_time": self.lookup_time.snapshot(),
+        }
+
+
+class CachedAIService(AIServiceWrapper):
+    """AI сервис с кэшем ответов; кэшируются только успешно полученные ответы"""
+
+    def __init__(self, inner: AIService, cache: ResponseCache, model: str):
+        super().__init__(inner)
+        self.cache = cache
+        self.model = model
+
+    def _key(self, message: str, context: Optional[ConversationTurns]) -> str:
+        return make_cache_key(self.inner.get_model_name(), message, context)
+
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
+        key = self._key(message, context)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = await self.inner.generate_response(message, context)
+        await self.cache.put(key, self.model, response)
+        return response
+
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        key = self._key(message, context)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        async for delta in self.inner.stream_response(message, context):
+            parts.append(delta)
+            yield delta
+
+        # Сюда доходит только полностью полученный поток
+        response = "".join(parts)
+        if response:
+            await self.cache.put(key, self.model, response)
@@ -0,0 +1,168 @@
+"""
+Объединение одинаковых одновременных запросов к AI провайдерам
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from .ai_service import AIService, AIServiceWrapper, ConversationTurns
+from .response_cache import make_cache_key
+
+
+class SingleFlight:
+    """
+    Группа вызовов с объединением по ключу
+
+    Пока вызов с ключом выполняется, новые вызовы с тем же ключом не
+    запускают его заново, а ждут общий результат. Исключение получают все
+    ожидающие. Отмена одного ожидающего не затрагивает остальных; вызов
+    отменяется, только когда его перестали ждать все.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: self._forget(key, task))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1:
+                task.cancel()
+            raise
+        finally:
+            if key in self._waiters and self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+        # Исключение уже получили ожидающие, не даем asyncio ругаться на него
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight,
+        }
+
+
+class StreamBroadcast:
+    """Один поток ответа, раздаваемый нескольким подписчикам с начала"""
+
+    def __init__(self, source: AsyncIterator[str]):
+        self.chunks: List[str] = []
+        self.done = False
+        self.closing = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Condition()
+        self._task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for delta in source:
+                async with self._changed:
+                    self.chunks.append(delta)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    def add_done_callback(self, callback: Callable[[], Any]):
+        self._task.add_done_callback(lambda _: callback())
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: position < len(self.chunks) or self.done)
+                    chunks = self.chunks[position:]
+                    done = self.done
+
+                for delta in chunks:
+                    yield delta
+                position += len(chunks)
+
+                if done and position >= len(self.chunks):
+                    if self.error is not None and not isinstance(self.error, asyncio.CancelledError):
+                        raise self.error
+                    return
+        finally:
+            self.subscribers -= 1
+            # Поток больше никому не нужен
+            if self.subscribers == 0 and not self.done:
+                self.closing = True
+                self._task.cancel()
+
+
+class SingleFlightAIService(AIServiceWrapper):
+    """AI сервис, объединяющий одинаковые одновременные запросы"""
+
+    def __init__(self, inner: AIService):
+        super().__init__(inner)
+        self.flight = SingleFlight()
+        self._streams: Dict[str, StreamBroadcast] = {}
+        self.coalesced_streams = 0
+
+    def _key(self, message: str, context: Optional[ConversationTurns]) -> str:
+        return make_cache_key(self.inner.get_model_name(), message, context)
+
+    async def generate_response(self, message: str, context: Optional[ConversationTurns] = None) -> str:
+        return await self.flight.do(
+            self._key(message, context),
+            lambda: self.inner.generate_response(message, context)
+        )
+
+    async def stream_response(self, message: str, context: Optional[ConversationTurns] = None) -> AsyncIterator[str]:
+        key = self._key(message, context)
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.done or broadcast.closing:
+            broadcast = StreamBroadcast(self.inner.stream_response(message, context))
+            broadcast.add_done_callback(lambda: self._forget_stream(key, broadcast))
+            self._streams[key] = broadcast
+        else:
+            self.coalesced_streams += 1
+
+        subscription = broadcast.subscribe()
+        try:
+            async for delta in subscription:
+                yield delta
+        finally:
+            await subscription.aclose()
+
+    def _forget_stream(self, key: str, broadcast: StreamBroadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.flight.get_stats(),
+            "coalesced_streams": self.coalesced_streams,
+            "streams_in_flight": len(self._streams),
+        }
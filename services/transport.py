@@ -0,0 +1,293 @@
+"""
+Общий HTTP транспорт для AI сервисов: долгоживущие пулы соединений с метриками
+"""
+
+import asyncio
+import importlib.util
+import logging
+import socket
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import httpcore
+import httpx
+
+if TYPE_CHECKING:
+    import aiohttp
+
+from config.settings import settings
+from utils.metrics import LatencyTracker
+
+
+class PoolMetrics:
+    """Метрики одного пула соединений"""
+
+    def __init__(self):
+        self.requests = 0
+        self.handshakes = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+        self.wait_time = LatencyTracker()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "handshakes": self.handshakes,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "wait_time": self.wait_time.snapshot(),
+        }
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Сетевой бэкенд httpcore с кэшем DNS
+
+    Адреса хоста кэшируются на ttl секунд, соединение открывается уже по IP.
+    TLS при этом проверяется по исходному имени хоста (SNI передает httpcore).
+    """
+
+    def __init__(self, metrics: PoolMetrics, ttl: float, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.metrics = metrics
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        cached = self._cache.get((host, port))
+        if cached and cached[0] > time.monotonic():
+            self.metrics.dns_cache_hits += 1
+            return cached[1]
+
+        self.metrics.dns_cache_misses += 1
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = await self._resolve(host, port)
+        except OSError:
+            addresses = [host]
+
+        self.metrics.handshakes += 1
+        last_error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+
+        # Все адреса недоступны - сбрасываем кэш, чтобы следующая попытка разрешила имя заново
+        self._cache.pop((host, port), None)
+        raise last_error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class TransportManager:
+    """
+    Пулы соединений к API провайдеров
+
+    Каждому провайдеру (хосту API) выделяется один долгоживущий пул с
+    keep-alive: aiohttp.ClientSession для запросов напрямую и
+    httpx.AsyncClient для SDK OpenAI и Anthropic. Пулы создаются при первом
+    обращении и закрываются вместе с менеджером. HTTP/2 для httpx включается
+    настройкой http2 (по умолчанию выключен), если установлен пакет h2.
+    """
+
+    def __init__(self,
+                 max_connections: int = settings.http_max_connections,
+                 max_keepalive: int = settings.http_max_keepalive,
+                 keepalive_expiry: float = settings.http_keepalive_expiry,
+                 connect_timeout: float = settings.http_connect_timeout,
+                 read_timeout: float = settings.http_read_timeout,
+                 dns_ttl: int = settings.http_dns_ttl,
+                 http2: bool = settings.http2_enabled):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.dns_ttl = dns_ttl
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logging.warning("⚠️ Пакет h2 не установлен, HTTP/2 отключен")
+
+        self._sessions: Dict[str, "aiohttp.ClientSession"] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._metrics: Dict[str, PoolMetrics] = {}
+
+    def _pool_metrics(self, name: str) -> PoolMetrics:
+        if name not in self._metrics:
+            self._metrics[name] = PoolMetrics()
+        return self._metrics[name]
+
+    def _trace_config(self, metrics: PoolMetrics) -> "aiohttp.TraceConfig":
+        """Сбор метрик пула aiohttp"""
+        import aiohttp
+
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, trace_ctx, params):
+            metrics.requests += 1
+            trace_ctx.started = time.perf_counter()
+            trace_ctx.waited = False
+
+        async def on_connection_ready(session, trace_ctx, params):
+            # Соединение получено из пула или установлено заново
+            if not getattr(trace_ctx, "waited", True):
+                metrics.wait_time.record(time.perf_counter() - trace_ctx.started)
+                trace_ctx.waited = True
+
+        async def on_connection_create_end(session, trace_ctx, params):
+            metrics.handshakes += 1
+            await on_connection_ready(session, trace_ctx, params)
+
+        async def on_dns_cache_hit(session, trace_ctx, params):
+            metrics.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, trace_ctx, params):
+            metrics.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_reuseconn.append(on_connection_ready)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    def aiohttp_session(self, name: str) -> "aiohttp.ClientSession":
+        """Долгоживущая сессия aiohttp для провайдера (aiohttp импортируется при первом вызове)"""
+        import aiohttp
+
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            metrics = self._pool_metrics(name)
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_expiry,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout),
+                trace_configs=[self._trace_config(metrics)],
+            )
+            self._sessions[name] = session
+        return session
+
+    def httpx_client(self, name: str) -> httpx.AsyncClient:
+        """Долгоживущий клиент httpx для SDK провайдера"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            metrics = self._pool_metrics(name)
+            transport = httpx.AsyncHTTPTransport(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            if not self._install_network_backend(transport, CachingNetworkBackend(metrics, self.dns_ttl)):
+                logging.warning(f"⚠️ httpx {httpx.__version__}: пул {name} без кэша DNS, "
+                                f"сетевой бэкенд httpcore не подменяется")
+
+            async def trace_request(request: httpx.Request):
+                metrics.requests += 1
+                started = time.perf_counter()
+                waited = False
+
+                async def trace(event: str, info: dict):
+                    nonlocal waited
+                    # Соединение готово: начато новое подключение или отправка по открытому
+                    if not waited and event in ("connection.connect_tcp.started",
+                                                "http11.send_request_headers.started",
+                                                "http2.send_request_headers.started"):
+                        metrics.wait_time.record(time.perf_counter() - started)
+                        waited = True
+
+                request.extensions["trace"] = trace
+
+            client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                event_hooks={"request": [trace_request]},
+            )
+            self._clients[name] = client
+        return client
+
+    @staticmethod
+    def _install_network_backend(transport: httpx.AsyncHTTPTransport, backend: httpcore.AsyncNetworkBackend) -> bool:
+        """
+        Подмена сетевого бэкенда в пуле httpcore транспорта
+
+        httpx не дает передать бэкенд в AsyncHTTPTransport, а пул и его
+        бэкенд - внутренние атрибуты. Если после обновления httpx их нет,
+        транспорт остается со стандартным бэкендом.
+        """
+        pool = getattr(transport, "_pool", None)
+        if not isinstance(pool, httpcore.AsyncConnectionPool) or not hasattr(pool, "_network_backend"):
+            return False
+        pool._network_backend = backend
+        return True
+
+    @staticmethod
+    def _aiohttp_connections(session: "aiohttp.ClientSession") -> Tuple[int, int]:
+        connector = session.connector
+        if connector is None or connector.closed:
+            return 0, 0
+        active = len(getattr(connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return active, idle
+
+    @staticmethod
+    def _httpx_connections(client: httpx.AsyncClient) -> Tuple[int, int]:
+        pool = getattr(client._transport, "_pool", None)
+        if pool is None or client.is_closed:
+            return 0, 0
+        connections = [connection for connection in pool.connections if not connection.is_closed()]
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return len(connections) - idle, idle
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики всех пулов"""
+        stats = {}
+        for name, metrics in self._metrics.items():
+            active = idle = 0
+            if name in self._sessions:
+                active, idle = self._aiohttp_connections(self._sessions[name])
+            if name in self._clients:
+                client_active, client_idle = self._httpx_connections(self._clients[name])
+                active += client_active
+                idle += client_idle
+
+            stats[name] = {"active": active, "idle": idle, **metrics.snapshot()}
+        return stats
+
+    async def aclose(self):
+        """Закрытие всех пулов"""
+        for name, session in list(self._sessions.items()):
+            try:
+                await session.close()
+            except Exception as e:
+                logging.error(f"❌ Ошибка закрытия пула {name}: {e}")
+
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logging.error(f"❌ Ошибка закрытия пула {name}: {e}")
+
+        self._sessions.clear()
+        self._clients.clear()
+        logging.info("🔌 HTTP пулы AI сервисов закрыты")
@@ -0,0 +1,65 @@
+"""
+Учет токенов по ответам AI провайдеров, включая чтение из кэша промптов
+"""
+
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens", "cache_write_tokens")
+
+# Учет текущего запроса: провайдер -> счетчики. Задачи хеджирования и
+# объединения запросов получают копию контекста с тем же словарем.
+_current_usage: ContextVar[Optional[Dict[str, Dict[str, int]]]] = ContextVar("ai_usage", default=None)
+
+
+class UsageTracker:
+    """
+    Счетчики токенов по провайдерам
+
+    prompt_tokens - все токены запроса, cached_tokens - из них прочитанные
+    из кэша промптов провайдера, cache_write_tokens - записанные в кэш.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, Dict[str, int]] = {}
+
+    def capture(self) -> Dict[str, Dict[str, int]]:
+        """Начало учета для текущего запроса; словарь заполняется по мере ответов"""
+        usage: Dict[str, Dict[str, int]] = {}
+        _current_usage.set(usage)
+        return usage
+
+    def record(self, provider: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               cached_tokens: int = 0, cache_write_tokens: int = 0):
+        """Учет токенов одного ответа провайдера"""
+        values = {
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "cached_tokens": cached_tokens or 0,
+            "cache_write_tokens": cache_write_tokens or 0,
+        }
+
+        targets = [self.totals.setdefault(provider, dict.fromkeys(USAGE_FIELDS + ("responses",), 0))]
+        usage = _current_usage.get()
+        if usage is not None:
+            targets.append(usage.setdefault(provider, dict.fromkeys(USAGE_FIELDS + ("responses",), 0)))
+
+        for target in targets:
+            target["responses"] += 1
+            for field, value in values.items():
+                target[field] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {}
+        for provider, totals in self.totals.items():
+            prompt = totals["prompt_tokens"]
+            stats[provider] = {
+                **totals,
+                "cache_hit_ratio": round(totals["cached_tokens"] / prompt, 3) if prompt else 0.0,
+            }
+        return stats
+
+
+# Глобальный экземпляр
+usage_tracker = UsageTracker()
@@ -2,75 +2,240 @@
 Сервис для работы с пользователями
 """
 
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from models.user import User
-from typing import Optional
+from config.settings import settings
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
 import logging
+import time
+
+
+class CachedUser:
+    """Снимок строки users, достаточный для обработки сообщений"""
+
+    __slots__ = ("id", "telegram_id", "username", "first_name", "last_name", "current_ai_model",
+                 "context_epoch", "loaded_at")
+
+    def __init__(self, user: User, loaded_at: float):
+        self.id = user.id
+        self.telegram_id = user.telegram_id
+        self.username = user.username
+        self.first_name = user.first_name
+        self.last_name = user.last_name
+        self.current_ai_model = user.current_ai_model
+        self.context_epoch = user.context_epoch or 0
+        self.loaded_at = loaded_at
+
+    def __repr__(self):
+        return f"<CachedUser(telegram_id={self.telegram_id}, model={self.current_ai_model})>"
+
+
+class UserCache:
+    """
+    LRU кэш пользователей по telegram_id
+
+    Изменения пишутся в базу сразу (write-through) и применяются к снимку,
+    поэтому снимок совпадает с базой, пока пользователя меняет только этот
+    процесс. Записи старше ttl перечитываются из базы - это ограничивает
+    расхождение, если модель пользователя изменил другой процесс.
+    """
+
+    def __init__(self, max_size: int = settings.user_cache_size, ttl: float = settings.user_cache_ttl,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+        self._users: "OrderedDict[int, CachedUser]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def get(self, telegram_id: int) -> Optional[CachedUser]:
+        user = self._users.get(telegram_id)
+        if user is None or self.clock() - user.loaded_at >= self.ttl:
+            self.misses += 1
+            return None
+
+        self._users.move_to_end(telegram_id)
+        self.hits += 1
+        return user
+
+    def put(self, user: User) -> CachedUser:
+        """Снимок строки из базы; при max_size 0 не сохраняется"""
+        cached = CachedUser(user, self.clock())
+        if self.max_size <= 0:
+            return cached
+
+        self._users[user.telegram_id] = cached
+        self._users.move_to_end(user.telegram_id)
+        if len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+            self.evictions += 1
+        return cached
+
+    def invalidate(self, telegram_id: int):
+        self._users.pop(telegram_id, None)
+
+    def clear(self):
+        self._users.clear()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "writes": self.writes,
+            "skipped_writes": self.skipped_writes,
+        }
 
 
 class UserService:
     """Сервис для управления пользователями"""
-    
-    def __init__(self, db_session: AsyncSession):
+
+    def __init__(self, db_session: AsyncSession, cache: Optional[UserCache] = None,
+                 read_session: Optional[AsyncSession] = None):
         self.db_session = db_session
-    
-    async def get_or_create_user(self, telegram_id: int, username: Optional[str] = None, 
-                                first_name: Optional[str] = None, last_name: Optional[str] = None) -> User:
-        """Получение или создание пользователя"""
-        
-        # Попытка найти существующего пользователя
-        result = await self.db_session.execute(
+        self.cache = cache if cache is not None else user_cache
+        # Чтение через пул читателей, если передана его сессия
+        self.read_session = read_session or db_session
+
+    async def _load(self, telegram_id: int, session: Optional[AsyncSession] = None) -> Optional[CachedUser]:
+        """Пользователь из кэша или из базы"""
+
+        user = self.cache.get(telegram_id)
+        if user is not None:
+            return user
+
+        result = await (session or self.read_session).execute(
             select(User).where(User.telegram_id == telegram_id)
         )
-        user = result.scalar_one_or_none()
-        
-        if user:
-            # Обновляем информацию о пользователе
-            user.username = username
-            user.first_name = first_name
-            user.last_name = last_name
+        row = result.scalar_one_or_none()
+        return self.cache.put(row) if row else None
+
+    async def _update(self, user: CachedUser, values: Dict[str, Any]):
+        """Запись изменившихся полей в базу и в снимок"""
+
+        try:
+            await self.db_session.execute(
+                update(User).where(User.telegram_id == user.telegram_id).values(**values)
+            )
             await self.db_session.commit()
-            logging.info(f"Обновлен пользователь {telegram_id}")
+        except Exception:
+            # Состояние базы неизвестно - следующее обращение перечитает строку
+            self.cache.invalidate(user.telegram_id)
+            raise
+
+        for field, value in values.items():
+            setattr(user, field, value)
+        self.cache.writes += 1
+
+    async def get_or_create_user(self, telegram_id: int, username: Optional[str] = None,
+                                first_name: Optional[str] = None, last_name: Optional[str] = None) -> CachedUser:
+        """Получение или создание пользователя"""
+
+        # Попытка найти существующего пользователя
+        user = await self._load(telegram_id)
+
+        if user:
+            # Обновляем информацию о пользователе, только если она изменилась
+            profile = {"username": username, "first_name": first_name, "last_name": last_name}
+            changes = {field: value for field, value in profile.items() if getattr(user, field) != value}
+            if changes:
+                await self._update(user, changes)
+                logging.info(f"Обновлен пользователь {telegram_id}")
+            else:
+                self.cache.skipped_writes += 1
             return user
-        
+
         # Создаем нового пользователя
-        user = User(
+        row = User(
             telegram_id=telegram_id,
             username=username,
             first_name=first_name,
             last_name=last_name
         )
-        
-        self.db_session.add(user)
-        await self.db_session.commit()
-        await self.db_session.refresh(user)
-        
+
+        self.db_session.add(row)
+        try:
+            await self.db_session.commit()
+        except IntegrityError:
+            # Пользователя одновременно создала обработка другого его сообщения
+            await self.db_session.rollback()
+            # Снимок сессии читателя мог быть открыт до этой записи - читаем через писателя
+            try:
+                loaded = await self._load(telegram_id, self.db_session)
+            finally:
+                # Единственное соединение писателя не держим до конца обработки сообщения
+                await self.db_session.commit()
+            if loaded is None:
+                raise
+            return await self.get_or_create_user(telegram_id, username, first_name, last_name)
+
         logging.info(f"Создан новый пользователь {telegram_id}")
-        return user
-    
+        return self.cache.put(row)
+
     async def update_user_model(self, telegram_id: int, model_name: str) -> bool:
         """Обновление выбранной AI модели пользователя"""
-        
-        result = await self.db_session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = result.scalar_one_or_none()
-        
+
+        user = await self._load(telegram_id)
+
         if user:
-            user.current_ai_model = model_name
-            await self.db_session.commit()
+            if user.current_ai_model != model_name:
+                await self._update(user, {"current_ai_model": model_name})
             logging.info(f"Пользователь {telegram_id} выбрал модель {model_name}")
             return True
-        
+
         return False
-    
+
+    async def start_new_conversation(self, telegram_id: int) -> Optional[int]:
+        """
+        Новая беседа пользователя (/clear); возвращает ее номер
+
+        Сообщения не удаляются: контекст строится только из сообщений с
+        текущим context_epoch, поэтому очистка - одно обновление строки users
+        независимо от длины истории.
+        """
+
+        user = await self._load(telegram_id)
+        if user is None:
+            return None
+
+        try:
+            # Увеличение в базе, а не в снимке: номер мог изменить другой процесс
+            result = await self.db_session.execute(
+                update(User).where(User.telegram_id == telegram_id)
+                .values(context_epoch=User.context_epoch + 1)
+                .returning(User.context_epoch)
+            )
+            epoch = result.scalar_one()
+            await self.db_session.commit()
+        except Exception:
+            self.cache.invalidate(telegram_id)
+            raise
+
+        user.context_epoch = epoch
+        self.cache.writes += 1
+        logging.info(f"Пользователь {telegram_id} начал беседу {epoch}")
+        return epoch
+
     async def get_user_model(self, telegram_id: int) -> Optional[str]:
         """Получение текущей AI модели пользователя"""
-        
-        result = await self.db_session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = result.scalar_one_or_none()
-        
-        return user.current_ai_model if user else None
\ No newline at end of file
+
+        user = await self._load(telegram_id)
+
+        return user.current_ai_model if user else None
+
+
+# Глобальный кэш пользователей процесса
+user_cache = UserCache()
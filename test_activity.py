@@ -0,0 +1,80 @@
+"""
+Тесты колеса таймеров и учета активных чатов
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.activity import ActivityTracker
+from testutils import FakeClock
+from utils.timer_wheel import TimerWheel
+
+
+def test_timer_wheel_expiry():
+    """Ключи истекают по дедлайну, перенос и отмена работают"""
+    clock = FakeClock(1000.0)
+    wheel = TimerWheel(tick=1.0, slots=8, clock=clock)
+
+    wheel.schedule("a", 2)
+    wheel.schedule("b", 5)
+    wheel.schedule("c", 20)  # дальше одного оборота колеса
+    wheel.schedule("d", 3)
+    wheel.cancel("d")
+
+    clock.now += 2
+    assert wheel.advance() == ["a"]
+
+    wheel.schedule("b", 10)  # перенос
+    clock.now += 5
+    assert wheel.advance() == []
+
+    clock.now += 7
+    assert wheel.advance() == ["b"]
+    assert "c" in wheel
+
+    clock.now += 100
+    assert wheel.advance() == ["c"]
+    assert len(wheel) == 0
+
+
+def test_activity_tracker_session():
+    """Чат активен во время обработки и истекает после таймаута"""
+    tracker = ActivityTracker(activity_timeout=20)
+    clock = FakeClock(1000.0)
+    tracker.wheel = TimerWheel(tick=1.0, clock=clock)
+
+    expired = []
+    tracker.add_expire_callback(expired.append)
+
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=7), effective_user=None)
+
+    tracker.on_update_started(update)
+    clock.now += 60
+    assert tracker.is_active(7)  # обработка идет - истечения нет
+
+    tracker.on_update_done(update)
+    clock.now += 10
+    assert tracker.is_active(7)
+
+    tracker.on_update_started(update)
+    tracker.on_update_done(update)
+    clock.now += 15
+    assert tracker.is_active(7)  # таймаут отсчитывается от последнего обновления
+
+    clock.now += 10
+    assert not tracker.is_active(7)
+    assert expired == [7]
+
+    stats = tracker.get_stats()
+    assert stats["sessions_started"] == 1
+    assert stats["sessions_expired"] == 1
+
+
+if __name__ == "__main__":
+    test_timer_wheel_expiry()
+    test_activity_tracker_session()
+    print("✅ Тесты учета активности прошли успешно!")
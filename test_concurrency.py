@@ -0,0 +1,133 @@
+"""
+Тесты адаптивного лимита и автомата защиты провайдеров
+"""
+
+import asyncio
+import os
+import sys
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.ai_service import AIService
+from services.concurrency import AdaptiveLimiter, CircuitBreaker, GuardedAIService
+from services.errors import CircuitOpenError, ProviderRequestError, RateLimitError
+from testutils import FakeClock
+
+
+class ConcurrencyProbe(AIService):
+    """Сервис-заглушка, замеряющий число одновременных вызовов"""
+
+    def __init__(self, delay: float = 0.02):
+        super().__init__("test-key")
+        self.delay = delay
+        self.error = None
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_response(self, message, context=None):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+            return "Ответ"
+        finally:
+            self.active -= 1
+
+    def get_model_name(self):
+        return "Probe"
+
+    def is_available(self):
+        return True
+
+
+def test_breaker_opens_and_half_opens():
+    """Серия ошибок открывает автомат, пробный запрос закрывает его"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.on_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in == 10
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # одна проба за раз
+
+    breaker.on_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.on_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.get_stats()["opens"] == 2
+
+
+def test_guarded_service_limits_and_adapts():
+    """Лимит ограничивает одновременные вызовы, AIMD реагирует на перегрузку"""
+
+    async def scenario():
+        clock = FakeClock()
+        probe = ConcurrencyProbe()
+        limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=10, latency_target=5,
+                                  acquire_timeout=5, clock=clock)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=clock)
+        service = GuardedAIService(probe, "probe", limiter, breaker)
+
+        await asyncio.gather(*[service.generate_response("Привет") for _ in range(8)])
+        max_active, grown_limit = probe.max_active, limiter.limit
+
+        # Ошибка запроса (не перегрузка) не открывает автомат
+        probe.error = ProviderRequestError("probe", "HTTP 400")
+        for _ in range(3):
+            try:
+                await service.generate_response("Привет")
+            except ProviderRequestError:
+                pass
+        state_after_bad_requests = breaker.state
+
+        probe.error = RateLimitError("probe", "HTTP 429")
+        for _ in range(2):
+            clock.now += 2  # за пределами cooldown
+            try:
+                await service.generate_response("Привет")
+            except RateLimitError:
+                pass
+
+        calls_before = probe.calls
+        try:
+            await service.generate_response("Привет")
+            rejected = False
+        except CircuitOpenError:
+            rejected = True
+
+        return (max_active, grown_limit, state_after_bad_requests, limiter.limit, breaker.state,
+                rejected, probe.calls - calls_before, service.get_stats())
+
+    (max_active, grown_limit, state_after_bad_requests, shrunk_limit, state,
+     rejected, extra_calls, stats) = asyncio.run(scenario())
+
+    assert max_active <= int(grown_limit) < 8
+    assert grown_limit > 2
+    assert state_after_bad_requests == CircuitBreaker.CLOSED
+    assert shrunk_limit < grown_limit / 2
+    assert state == CircuitBreaker.OPEN
+    assert rejected and extra_calls == 0
+    assert stats["concurrency"]["in_flight"] == 0
+    assert stats["breaker"]["state"] == "open"
+
+
+if __name__ == "__main__":
+    test_breaker_opens_and_half_opens()
+    test_guarded_service_limits_and_adapts()
+    print("✅ Тесты лимита и автомата защиты прошли успешно!")
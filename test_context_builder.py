@@ -0,0 +1,244 @@
+"""
+Тесты сборки контекста в пределах бюджета токенов и запросов к провайдерам
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from sqlalchemy import event
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import User
+from models.message import Message
+from models.conversation_summary import ConversationSummary
+from services.chatgpt_service import ChatGPTService
+from services.claude_service import ClaudeService
+from services.context_builder import (ContextBuilder, ContextTurn, ConversationCache, ConversationEntry,
+                                      TokenCounter)
+from services.usage import usage_tracker
+from testutils import create_session_factory
+
+
+class RecordingSummarizer:
+    """Заглушка модели: запоминает запросы и возвращает короткое содержание"""
+
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, model_name, request):
+        self.requests.append(request)
+        return f"содержание {len(self.requests)}"
+
+
+async def _add_messages(session_factory, user_id: int, start: int, count: int, builder=None):
+    """Сообщения в базу и, как после ответа обработчика, в кэш бесед"""
+    messages = [
+        Message(user_id=user_id, user_message=f"вопрос {i}", ai_response=f"ответ {i} " + "х" * 400,
+                ai_model_used="chatgpt", chat_id=1, telegram_message_id=i)
+        for i in range(start, start + count)
+    ]
+    async with session_factory() as session:
+        session.add_all(messages)
+        await session.commit()
+    if builder is not None:
+        for message in messages:
+            builder.remember(message)
+
+
+def test_budget_and_rolling_summary():
+    """Бюджет заполняется от новых сообщений, старые сворачиваются в фоне"""
+
+    async def scenario(path):
+        engine, session_factory = await create_session_factory(path)
+        async with session_factory() as session:
+            user = User(telegram_id=1)
+            session.add(user)
+            await session.commit()
+            user_id = user.id
+        await _add_messages(session_factory, user_id, 1, 30)
+
+        summarizer = RecordingSummarizer()
+        builder = ContextBuilder(session_factory, counter=TokenCounter(), token_budget=1200,
+                                 model_budgets={"deepseek": 3000}, fetch_limit=50,
+                                 summary_batch=10, summary_keep=0.5, summarize=summarizer)
+
+        async def build(model_name="chatgpt"):
+            async with session_factory() as session:
+                result = await builder.build(session, user_id, model_name, "новый вопрос")
+            await asyncio.gather(*builder._tasks.values())
+            return result
+
+        # Обе сборки до фонового сворачивания
+        async with session_factory() as session:
+            first, first_tokens = await builder.build(session, user_id, "chatgpt", "новый вопрос")
+            wide, _ = await builder.build(session, user_id, "deepseek", "новый вопрос")
+        await asyncio.gather(*builder._tasks.values())
+        async with session_factory() as session:
+            covered = (await session.get(ConversationSummary, user_id)).last_message_id
+
+        await _add_messages(session_factory, user_id, 31, 10, builder)
+        second, second_tokens = await build()
+
+        # После сворачивания освободилось место: следующие запросы дописывают историю в конец
+        stable, _ = await build()
+        await _add_messages(session_factory, user_id, 41, 1, builder)
+        extended, _ = await build()
+
+        await engine.dispose()
+        return first, first_tokens, wide, covered, second, second_tokens, stable, extended, summarizer, builder
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(scenario(os.path.join(tmp, "context.db")))
+    first, first_tokens, wide, covered, second, second_tokens, stable, extended, summarizer, builder = result
+
+    # Поместились только последние сообщения, в хронологическом порядке, репликами с ролями
+    assert first_tokens <= 1200
+    assert [turn["role"] for turn in first[:2]] == ["user", "assistant"]
+    assert first[-1]["content"].startswith("ответ 30") and first[-2]["content"] == "вопрос 30"
+    assert all(turn["content"] != "вопрос 1" for turn in first)
+    assert len(wide) > len(first)
+
+    # Свернуты не поместившиеся сообщения и часть поместившихся - с запасом бюджета
+    kept = len(first) // 2
+    assert 30 - kept < covered < 30
+    assert "вопрос 1\n" in summarizer.requests[0]
+
+    # Следующий запрос: содержание плюс сообщения новее свернутых
+    assert second[0]["role"] == "system"
+    assert second[0]["content"].startswith("Краткое содержание предыдущей беседы:")
+    assert second_tokens <= 1200
+
+    # Обновление дописывает к прежнему содержанию только новые сообщения
+    last = summarizer.requests[-1]
+    assert "Текущее краткое содержание" in last and f"вопрос {covered}\n" not in last
+    assert builder.get_stats()["summary_updates"] == len(summarizer.requests)
+
+    # Начало контекста не меняется, пока история помещается в бюджет
+    assert len(extended) == len(stable) + 2 and extended[:len(stable)] == stable
+
+
+def test_active_conversation_without_db():
+    """Беседа в кэше собирается без запросов к базе, /clear сбрасывает кэш"""
+
+    async def scenario(path):
+        engine, session_factory = await create_session_factory(path)
+        async with session_factory() as session:
+            user = User(telegram_id=1)
+            session.add(user)
+            await session.commit()
+            user_id = user.id
+        await _add_messages(session_factory, user_id, 1, 3)
+
+        queries = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def count(conn, cursor, statement, parameters, context, executemany):
+            queries.append(statement)
+
+        builder = ContextBuilder(session_factory, summary_enabled=False)
+
+        async def build():
+            queries.clear()
+            async with session_factory() as session:
+                context, _ = await builder.build(session, user_id, "chatgpt", "новый вопрос")
+            return [turn["content"] for turn in context if turn["role"] == "user"], len(queries)
+
+        loaded = await build()
+        # Ответ обработчика попадает в буфер до записи в базу
+        builder.remember(Message(user_id=user_id, user_message="вопрос 4", ai_response="ответ 4",
+                                 ai_model_used="chatgpt", chat_id=1, telegram_message_id=4))
+        cached = await build()
+        builder.forget(user_id)
+        reloaded = await build()
+
+        await engine.dispose()
+        return loaded, cached, reloaded, builder.get_stats()["cache"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        loaded, cached, reloaded, stats = asyncio.run(scenario(os.path.join(tmp, "cache.db")))
+
+    # Промах: содержание и последние реплики двумя запросами только нужных колонок
+    assert loaded == (["вопрос 1", "вопрос 2", "вопрос 3"], 2)
+    assert cached == (["вопрос 1", "вопрос 2", "вопрос 3", "вопрос 4"], 0)
+    # Незаписанный ответ после сброса не виден: в этом тесте его нет и в очереди записи
+    assert reloaded == (["вопрос 1", "вопрос 2", "вопрос 3"], 2)
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_conversation_cache_limits():
+    """Буфер реплик ограничен, бездействующие беседы вытесняются по числу и объему"""
+
+    def entry(user_id, turns=2):
+        return ConversationEntry("", 0, 0, [ContextTurn(user_id * 100 + i, "в" * 10, "о" * 40) for i in range(turns)])
+
+    cache = ConversationCache(max_users=3, max_chars=500, max_turns=4)
+    for user_id in (1, 2, 3):
+        cache.put(user_id, entry(user_id))
+    assert cache.get(1) is not None
+
+    # Четвертый пользователь вытесняет дольше всех не писавшего (2)
+    cache.put(4, entry(4))
+    assert cache.get(2) is None and len(cache) == 3
+
+    # Кольцевой буфер: старые реплики вытесняются новыми
+    for i in range(3):
+        cache.append(1, ContextTurn(110 + i, "в" * 10, "о" * 40))
+    assert [turn.id for turn in cache.get(1).turns] == [101, 110, 111, 112]
+    assert cache.chars == sum(e.size for e in cache._entries.values()) == 400
+
+    # Лимит объема: длинный ответ вытесняет бездействующих пользователей
+    cache.append(1, ContextTurn(113, "в", "о" * 150))
+    assert cache.chars <= 500 and cache.get(3) is None and cache.get(1) is not None
+
+    # Свернутые в краткое содержание реплики уходят из буфера
+    cache.set_summary(1, "содержание", 5, covered=111)
+    assert [turn.id for turn in cache.get(1).turns] == [112, 113]
+    assert cache.chars == sum(e.size for e in cache._entries.values())
+    assert cache.get_stats()["evictions"] == 2
+
+
+def test_provider_requests_keep_turns():
+    """Реплики передаются провайдерам с ролями, префикс Claude помечается для кэша"""
+    context = [
+        {"role": "system", "content": "Краткое содержание предыдущей беседы: знакомство"},
+        {"role": "user", "content": "Меня зовут Аня"},
+        {"role": "assistant", "content": "Приятно познакомиться"},
+    ]
+
+    messages = ChatGPTService("test-key")._build_messages("Как меня зовут?", context)
+    assert messages == context + [{"role": "user", "content": "Как меня зовут?"}]
+
+    request = ClaudeService("test-key", prompt_caching=True)._build_request("Как меня зовут?", context)
+    assert request["system"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert [message["role"] for message in request["messages"]] == ["user", "assistant", "user"]
+    assert request["messages"][1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert request["messages"][-1]["content"] == "Как меня зовут?"
+    assert context[2]["content"] == "Приятно познакомиться"
+
+    plain = ClaudeService("test-key", prompt_caching=False)._build_request("Привет")
+    assert "system" not in plain and plain["messages"] == [{"role": "user", "content": "Привет"}]
+
+    # Токены, прочитанные из кэша, учитываются в запросе, начавшем учет
+    async def scenario():
+        usage = usage_tracker.capture()
+        ClaudeService._record_usage(SimpleNamespace(
+            input_tokens=20, output_tokens=50, cache_read_input_tokens=1500, cache_creation_input_tokens=0
+        ))
+        return usage
+
+    usage = asyncio.run(scenario())
+    assert usage["claude"]["prompt_tokens"] == 1520 and usage["claude"]["cached_tokens"] == 1500
+    assert usage_tracker.get_stats()["claude"]["cache_hit_ratio"] > 0
+
+
+if __name__ == "__main__":
+    test_budget_and_rolling_summary()
+    test_active_conversation_without_db()
+    test_conversation_cache_limits()
+    test_provider_requests_keep_turns()
+    print("✅ Тесты сборки контекста прошли успешно!")
@@ -0,0 +1,246 @@
+"""
+Тесты очистки контекста (/clear) через номер беседы пользователя
+"""
+
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database.db import upgrade_schema
+from models.message import Message
+from models.conversation_summary import ConversationSummary
+from services.context_builder import ContextBuilder, TokenCounter
+from services.message_writer import MessageWriter
+from services.user_service import UserCache, UserService
+
+LONG_HISTORY = 100_000
+
+
+def _create_database(path: str, histories):
+    """База по миграциям; histories - число сообщений каждого пользователя"""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    engine.dispose()
+
+    connection = sqlite3.connect(path)
+    for user_id, count in enumerate(histories, start=1):
+        connection.execute("INSERT INTO users (id, telegram_id, current_ai_model, is_active) VALUES (?, ?, 'chatgpt', 1)",
+                           (user_id, 100 + user_id))
+        connection.executemany(
+            "INSERT INTO messages (user_id, user_message, ai_response, ai_model_used) VALUES (?, ?, ?, 'chatgpt')",
+            ((user_id, f"вопрос {i}", f"ответ {i}") for i in range(count))
+        )
+    connection.commit()
+    connection.close()
+
+
+def _session_factory(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def test_clear_does_not_depend_on_history_length():
+    """/clear пользователя со 100 тысячами сообщений - одно обновление users, как и с десятью"""
+
+    async def scenario(path):
+        engine, session_factory = _session_factory(path)
+        statements = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.lstrip().split()[0].upper())
+
+        builder = ContextBuilder(session_factory, counter=TokenCounter(), fetch_limit=20,
+                                 summary_enabled=False, writer=MessageWriter(session_factory))
+        cache = UserCache()
+
+        async def build(telegram_id, epoch):
+            async with session_factory() as session:
+                user = await UserService(session, cache=cache).get_or_create_user(telegram_id)
+                context, _ = await builder.build(session, user.id, "chatgpt", "новый вопрос", epoch)
+            return [turn["content"] for turn in context if turn["role"] == "user"]
+
+        before = await build(101, 0)
+
+        async def clear(telegram_id):
+            async with session_factory() as session:
+                service = UserService(session, cache=cache)
+                user = await service.get_or_create_user(telegram_id)
+                del statements[:]
+                started = time.perf_counter()
+                epoch = await service.start_new_conversation(telegram_id)
+                elapsed = time.perf_counter() - started
+                builder.forget(user.id)
+            return epoch, elapsed, list(statements)
+
+        timings = {101: [], 102: []}
+        for _ in range(5):
+            for telegram_id in timings:
+                epoch, elapsed, issued = await clear(telegram_id)
+                timings[telegram_id].append(elapsed)
+                assert issued == ["UPDATE"], issued
+
+        after = await build(101, epoch)
+
+        # Ответ в новой беседе попадает в контекст, прежние сообщения - нет
+        async with session_factory() as session:
+            session.add(Message(user_id=1, user_message="после очистки", ai_response="ответ",
+                                ai_model_used="chatgpt", context_epoch=epoch))
+            await session.commit()
+        builder.forget(1)
+        started = time.perf_counter()
+        fresh = await build(101, epoch)
+        fresh_build = time.perf_counter() - started
+
+        await engine.dispose()
+        return before, epoch, timings, after, fresh, fresh_build
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        _create_database(path, [LONG_HISTORY, 10])
+        before, epoch, timings, after, fresh, fresh_build = asyncio.run(scenario(path))
+
+        connection = sqlite3.connect(path)
+        stored = connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        connection.close()
+
+    long_clear = statistics.median(timings[101])
+    short_clear = statistics.median(timings[102])
+
+    assert len(before) == 20 and before[-1] == f"вопрос {LONG_HISTORY - 1}"
+    assert epoch == 5
+    assert after == []
+    assert fresh == ["после очистки"]
+    # Сообщения остаются в базе для статистики
+    assert stored == LONG_HISTORY + 10 + 1
+    assert long_clear < short_clear * 3 + 0.005, (long_clear, short_clear)
+    assert fresh_build < 0.5, fresh_build
+
+
+def test_previous_conversation_is_ignored_everywhere():
+    """Краткое содержание, очередь записи и кэш прежней беседы не попадают в контекст новой"""
+
+    async def scenario(path):
+        engine, session_factory = _session_factory(path)
+        async with session_factory() as session:
+            session.add(ConversationSummary(user_id=1, summary="старое содержание", last_message_id=5,
+                                            token_count=10, context_epoch=0))
+            await session.commit()
+
+        writer = MessageWriter(session_factory, interval=60)
+        summaries = []
+
+        async def summarize(model_name, request):
+            summaries.append(request)
+            return f"содержание {len(summaries)}"
+
+        builder = ContextBuilder(session_factory, counter=TokenCounter(), fetch_limit=20,
+                                 summary_batch=100, summarize=summarize, writer=writer)
+
+        async def build(epoch):
+            async with session_factory() as session:
+                context, _ = await builder.build(session, 1, "chatgpt", "новый вопрос", epoch)
+            return [turn["content"] for turn in context if turn["role"] != "assistant"]
+
+        old_context = await build(0)
+
+        # Ответ прежней беседы еще в очереди записи, когда пользователь вызвал /clear
+        stale = Message(user_id=1, user_message="вопрос до очистки", ai_response="ответ",
+                        ai_model_used="chatgpt", context_epoch=0, chat_id=1, telegram_message_id=1)
+        await writer.add(stale)
+        async with session_factory() as session:
+            epoch = await UserService(session, cache=UserCache()).start_new_conversation(101)
+        builder.remember(stale)
+
+        new_context = await build(epoch)
+
+        current = Message(user_id=1, user_message="вопрос после очистки", ai_response="ответ",
+                          ai_model_used="chatgpt", context_epoch=epoch, chat_id=1, telegram_message_id=2)
+        await writer.add(current)
+        builder.remember(current)
+        cached_context = await build(epoch)
+        await writer.stop()
+
+        # Запоздавшее обновление прежней беседы не затирает новое содержание
+        await builder.refresh_summary(1, "chatgpt", current.id, epoch)
+        await builder.refresh_summary(1, "chatgpt", current.id, 0)
+        async with session_factory() as session:
+            summary = await session.get(ConversationSummary, 1)
+
+        await engine.dispose()
+        return old_context, new_context, cached_context, summaries, summary
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "epochs.db")
+        _create_database(path, [3])
+        old_context, new_context, cached_context, summaries, summary = asyncio.run(scenario(path))
+
+    assert old_context[0] == "Краткое содержание предыдущей беседы: старое содержание"
+    assert new_context == []
+    assert cached_context == ["вопрос после очистки"]
+    assert len(summaries) == 1
+    assert "старое содержание" not in summaries[0] and "вопрос до очистки" not in summaries[0]
+    assert summary.context_epoch == 1 and summary.summary == "содержание 1"
+
+
+
+def test_stale_summary_does_not_overwrite_new_conversation():
+    """Обновление, начатое до /clear и закончившееся после, не затирает содержание новой беседы"""
+
+    async def scenario(path):
+        engine, session_factory = _session_factory(path)
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def summarize(model_name, request):
+            if "вопрос 0" in request:
+                # Модель отвечает на запрос прежней беседы уже после /clear
+                started.set()
+                await release.wait()
+                return "содержание до очистки"
+            return "содержание после очистки"
+
+        builder = ContextBuilder(session_factory, counter=TokenCounter(), fetch_limit=20,
+                                 summary_batch=100, summarize=summarize, writer=MessageWriter(session_factory))
+        stale = asyncio.create_task(builder.refresh_summary(1, "chatgpt", 3, 0))
+        await started.wait()
+
+        async with session_factory() as session:
+            epoch = await UserService(session, cache=UserCache()).start_new_conversation(101)
+            session.add(Message(user_id=1, user_message="новый вопрос", ai_response="ответ",
+                                ai_model_used="chatgpt", context_epoch=epoch))
+            await session.commit()
+        await builder.refresh_summary(1, "chatgpt", 4, epoch)
+
+        release.set()
+        await stale
+        async with session_factory() as session:
+            summary = await session.get(ConversationSummary, 1)
+        await engine.dispose()
+        return epoch, summary
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stale.db")
+        _create_database(path, [3])
+        epoch, summary = asyncio.run(scenario(path))
+
+    assert summary.context_epoch == epoch == 1
+    assert summary.summary == "содержание после очистки" and summary.last_message_id == 4
+
+
+if __name__ == "__main__":
+    test_clear_does_not_depend_on_history_length()
+    test_previous_conversation_is_ignored_everywhere()
+    test_stale_summary_does_not_overwrite_new_conversation()
+    print("✅ Тесты очистки контекста прошли успешно!")
@@ -0,0 +1,139 @@
+"""
+Тесты диспетчера обновлений: порядок внутри чата и параллельность между чатами
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.dispatcher import UpdateDispatcher
+
+
+def make_update(update_id: int, chat_id: int):
+    """Минимальное обновление с чатом"""
+    chat = SimpleNamespace(id=chat_id)
+    return SimpleNamespace(update_id=update_id, effective_chat=chat, effective_user=None)
+
+
+class SlowApplication:
+    """Приложение-заглушка с медленной обработкой"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.processed = []
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.active_chats = set()
+        self.overlaps = 0
+
+    async def process_update(self, update):
+        chat_id = update.effective_chat.id
+        if chat_id in self.active_chats:
+            self.overlaps += 1
+
+        self.active_chats.add(chat_id)
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            await asyncio.sleep(self.delay)
+            self.processed.append((chat_id, update.update_id))
+        finally:
+            self.concurrent -= 1
+            self.active_chats.discard(chat_id)
+
+
+def test_per_chat_order_and_parallelism():
+    """Обновления одного чата идут по порядку, разные чаты - параллельно"""
+
+    async def scenario():
+        application = SlowApplication()
+        dispatcher = UpdateDispatcher(application, max_workers=4, queue_size=1000)
+        await dispatcher.start()
+
+        update_id = 0
+        for _ in range(10):
+            for chat_id in range(6):
+                update_id += 1
+                await dispatcher.submit(make_update(update_id, chat_id))
+
+        await dispatcher.join(timeout=10)
+        await dispatcher.stop()
+        return application, dispatcher
+
+    application, dispatcher = asyncio.run(scenario())
+
+    assert len(application.processed) == 60
+    assert application.overlaps == 0
+    assert application.max_concurrent == 4
+
+    for chat_id in range(6):
+        ids = [uid for cid, uid in application.processed if cid == chat_id]
+        assert ids == sorted(ids)
+
+    stats = dispatcher.get_stats()
+    assert stats["processed"] == 60
+    assert stats["queue_depth"] == 0
+    assert stats["wait_time"]["count"] == 60
+
+
+def test_slow_chat_does_not_block_others():
+    """Медленный чат не задерживает остальные"""
+
+    async def scenario():
+        application = SlowApplication(delay=0.2)
+        dispatcher = UpdateDispatcher(application, max_workers=2, queue_size=100)
+        await dispatcher.start()
+
+        for i in range(3):
+            await dispatcher.submit(make_update(i, chat_id=1))
+
+        application.delay = 0.001
+        await dispatcher.submit(make_update(100, chat_id=2))
+        await asyncio.sleep(0.1)
+        fast_done = (2, 100) in application.processed
+
+        await dispatcher.stop()
+        return fast_done
+
+    assert asyncio.run(scenario())
+
+
+def test_bounded_queue_backpressure():
+    """При заполненной очереди submit ждет, try_submit отказывает"""
+
+    async def scenario():
+        application = SlowApplication(delay=0.05)
+        dispatcher = UpdateDispatcher(application, max_workers=1, queue_size=2)
+
+        await dispatcher.submit(make_update(1, 1))
+        await dispatcher.submit(make_update(2, 2))
+        rejected = not dispatcher.try_submit(make_update(3, 3))
+
+        blocked = asyncio.create_task(dispatcher.submit(make_update(4, 4)))
+        await asyncio.sleep(0.01)
+        was_blocked = not blocked.done()
+
+        await dispatcher.start()
+        await asyncio.wait_for(blocked, timeout=1)
+        await dispatcher.join(timeout=1)
+        await dispatcher.stop()
+        return rejected, was_blocked, dispatcher.get_stats()
+
+    rejected, was_blocked, stats = asyncio.run(scenario())
+
+    assert rejected
+    assert was_blocked
+    assert stats["processed"] == 3
+    assert stats["rejected"] == 1
+    assert stats["max_queue_depth"] == 2
+
+
+if __name__ == "__main__":
+    test_per_chat_order_and_parallelism()
+    test_slow_chat_does_not_block_others()
+    test_bounded_queue_backpressure()
+    print("✅ Тесты диспетчера прошли успешно!")
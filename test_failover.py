@@ -0,0 +1,208 @@
+"""
+Тесты хеджирования и переключения провайдеров
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import aiohttp
+import httpx
+import openai
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.ai_service import AIService
+from services.chatgpt_service import ChatGPTService
+from services.claude_service import ClaudeService
+from services.deepseek_service import DeepSeekService
+from services.errors import AllProvidersFailedError, ProviderUnavailableError
+from services.failover import FailoverExecutor
+
+
+class FakeService(AIService):
+    """Сервис-заглушка с задержкой и необязательной ошибкой"""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False):
+        super().__init__("test-key")
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_response(self, message, context=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise ProviderUnavailableError(self.name, "HTTP 503")
+        return f"{self.name}: {message}"
+
+    async def stream_response(self, message, context=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise ProviderUnavailableError(self.name, "HTTP 503")
+            for word in [self.name, ":", " ", message]:
+                yield word
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    def get_model_name(self):
+        return self.name
+
+    def is_available(self):
+        return True
+
+
+class FakeFactory:
+    """Фабрика-заглушка с фиксированным набором сервисов"""
+
+    def __init__(self, *services: FakeService):
+        self.services = {service.name: service for service in services}
+
+    def get_service(self, model_name):
+        return self.services.get(model_name)
+
+    def get_available_models(self):
+        return {name: True for name in self.services}
+
+
+def _executor(factory, **kwargs) -> FailoverExecutor:
+    options = dict(hedge_default_delay=0.05, hedge_min_delay=0.01, hedge_min_samples=100, secondaries={})
+    options.update(kwargs)
+    return FailoverExecutor(factory, **options)
+
+
+def test_hedge_to_secondary_cancels_loser():
+    """Медленная основная модель: ответ дает вторичная, основной запрос отменяется"""
+
+    async def scenario():
+        slow, fast = FakeService("slow", delay=1.0), FakeService("fast", delay=0.01)
+        executor = _executor(FakeFactory(slow, fast), secondaries={"slow": "fast"})
+        result = await executor.generate("slow", "Привет")
+
+        stream_slow, stream_fast = FakeService("slow", delay=1.0), FakeService("fast", delay=0.01)
+        stream_executor = _executor(FakeFactory(stream_slow, stream_fast))
+        model, service, stream = await stream_executor.open_stream("slow", "Привет")
+        chunks = [delta async for delta in stream]
+        return result, slow, executor, model, service, chunks, stream_slow, stream_executor
+
+    result, slow, executor, model, service, chunks, stream_slow, stream_executor = asyncio.run(scenario())
+
+    assert result == ("fast", "fast: Привет")
+    assert slow.cancelled == 1
+    assert executor.get_stats()["hedges"] == 1 and executor.get_stats()["hedge_wins"] == 1
+
+    assert model == "fast" and service.name == "fast"
+    assert "".join(chunks) == "fast: Привет"
+    assert stream_slow.cancelled == 1
+    assert stream_executor.get_stats()["first_token"]["fast"]["count"] == 1
+
+
+def test_failover_on_errors():
+    """Ошибка основной модели переключает запрос, ошибка всех - исключение"""
+
+    async def scenario():
+        broken, backup = FakeService("broken", fail=True), FakeService("backup")
+        executor = _executor(FakeFactory(broken, backup), hedging_enabled=False)
+        result = await executor.generate("broken", "Привет")
+
+        model, _, stream = await executor.open_stream("broken", "Привет")
+        chunks = [delta async for delta in stream]
+
+        all_broken = _executor(FakeFactory(FakeService("a", fail=True), FakeService("b", fail=True)))
+        try:
+            await all_broken.generate("a", "Привет")
+            error = None
+        except AllProvidersFailedError as e:
+            error = e
+        return result, executor, model, chunks, error
+
+    result, executor, model, chunks, error = asyncio.run(scenario())
+
+    assert result == ("backup", "backup: Привет")
+    assert model == "backup" and "".join(chunks) == "backup: Привет"
+    assert executor.get_stats()["failovers"] == 2
+    assert executor.get_stats()["errors"] == {"broken": 2}
+    assert error is not None and len(error.errors) == 2
+
+
+def test_background_requests_skip_hedge_trackers():
+    """Фоновый запрос не хеджируется и не попадает в задержку живых ответов"""
+
+    async def scenario():
+        slow, fast = FakeService("slow", delay=0.2), FakeService("fast", delay=0.01)
+        executor = _executor(FakeFactory(slow, fast), secondaries={"slow": "fast"})
+        result = await executor.generate("slow", "Краткое содержание", background=True)
+        return result, fast, executor
+
+    result, fast, executor = asyncio.run(scenario())
+    stats = executor.get_stats()
+
+    assert result == ("slow", "slow: Краткое содержание")
+    assert fast.calls == 0 and stats["hedges"] == 0
+    assert stats["latency"] == {}
+    assert stats["background_latency"]["slow"]["count"] == 1
+
+
+def test_code_errors_are_not_provider_failures():
+    """Ошибка кода не выдается за ошибку провайдера и не переключает запрос на другие модели"""
+
+    async def raise_type_error(**kwargs):
+        raise TypeError("неожиданный аргумент")
+
+    async def raise_connection_error(**kwargs):
+        raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com"))
+
+    async def scenario():
+        chatgpt = ChatGPTService("test-key")
+        chatgpt.name = "chatgpt"
+        chatgpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=raise_type_error)))
+        backup = FakeService("backup")
+        executor = _executor(FakeFactory(chatgpt, backup), hedging_enabled=False)
+        try:
+            await executor.generate("chatgpt", "Привет")
+            code_error = None
+        except Exception as e:
+            code_error = e
+        backup_calls = backup.calls
+
+        claude = ClaudeService("test-key")
+        claude.client = SimpleNamespace(messages=SimpleNamespace(create=raise_type_error))
+        try:
+            await claude.generate_response("Привет")
+            claude_error = None
+        except Exception as e:
+            claude_error = e
+
+        chatgpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=raise_connection_error)))
+        result = await executor.generate("chatgpt", "Привет")
+        return code_error, backup_calls, claude_error, result, executor
+
+    code_error, backup_calls, claude_error, result, executor = asyncio.run(scenario())
+
+    assert type(code_error) is TypeError and backup_calls == 0
+    assert type(claude_error) is TypeError
+    assert result == ("backup", "backup: Привет")
+    assert executor.get_stats()["errors"] == {"chatgpt": 1}
+
+    deepseek = DeepSeekService("test-key")
+    assert deepseek._translate_error(KeyError("choices")) is None
+    assert isinstance(deepseek._translate_error(aiohttp.ClientError()), ProviderUnavailableError)
+
+
+if __name__ == "__main__":
+    test_hedge_to_secondary_cancels_loser()
+    test_failover_on_errors()
+    test_background_requests_skip_hedge_trackers()
+    test_code_errors_are_not_provider_failures()
+    print("✅ Тесты хеджирования и переключения прошли успешно!")
@@ -0,0 +1,107 @@
+"""
+Тесты локальной замены API AI провайдеров
+"""
+
+import asyncio
+import os
+import sys
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest.fake_provider import FakeProviderConfig, FakeProviderServer
+from services.chatgpt_service import ChatGPTService
+from services.claude_service import ClaudeService
+from services.deepseek_service import DeepSeekService
+from services.errors import ProviderUnavailableError, RateLimitError
+from services.usage import usage_tracker
+
+
+def _config(**kwargs) -> FakeProviderConfig:
+    options = dict(latency="fixed", ttft=0.01, token_rate=0, min_tokens=5, max_tokens=10, seed=7)
+    options.update(kwargs)
+    return FakeProviderConfig(**options)
+
+
+def test_services_against_fake_provider():
+    """Все три сервиса работают с локальным сервером: обычные и потоковые ответы"""
+
+    async def scenario():
+        server = FakeProviderServer(_config(), port=0)
+        await server.start()
+        services = [
+            ChatGPTService("test-key", base_url=f"{server.url}/v1"),
+            ClaudeService("test-key", base_url=server.url),
+            DeepSeekService("test-key", base_url=f"{server.url}/deepseek/v1"),
+        ]
+        history = [{"role": "user", "content": "Привет"}, {"role": "assistant", "content": "Здравствуйте"}]
+
+        usage = usage_tracker.capture()
+        results = []
+        for service in services:
+            full = await service.generate_response("Как дела?", history)
+            streamed = "".join([delta async for delta in service.stream_response("Как дела?", history)])
+            results.append((full, streamed))
+
+        await services[2].transport.aclose()
+        await server.stop()
+        return results, usage, server.get_stats()
+
+    results, usage, stats = asyncio.run(scenario())
+
+    for full, streamed in results:
+        assert 5 <= len(full.split()) <= 10
+        assert 5 <= len(streamed.split()) <= 10
+
+    for provider in ("openai", "anthropic", "deepseek"):
+        assert stats["providers"][provider]["requests"] == 2
+        assert stats["providers"][provider]["streamed"] == 1
+
+    # Повтор той же истории - префикс читается из имитации кэша промптов
+    for model in ("chatgpt", "claude", "deepseek"):
+        assert usage[model]["responses"] == 2
+        assert 0 < usage[model]["cached_tokens"] < usage[model]["prompt_tokens"]
+
+
+def test_error_injection_and_seed():
+    """Ошибки 429 и 5xx типизируются, одинаковый seed дает одинаковые ответы"""
+
+    async def scenario():
+        limited = FakeProviderServer(_config(rate_limit_rate=1.0, retry_after=3), port=0)
+        failing = FakeProviderServer(_config(error_rate=1.0), port=0)
+        first, second = FakeProviderServer(_config(), port=0), FakeProviderServer(_config(), port=0)
+        servers = [limited, failing, first, second]
+        for server in servers:
+            await server.start()
+
+        errors = []
+        for server in (limited, failing):
+            service = DeepSeekService("test-key", base_url=f"{server.url}/deepseek/v1")
+            try:
+                await service.generate_response("Привет")
+            except (RateLimitError, ProviderUnavailableError) as e:
+                errors.append(e)
+            await service.transport.aclose()
+
+        answers = []
+        for server in (first, second):
+            service = DeepSeekService("test-key", base_url=f"{server.url}/deepseek/v1")
+            answers.append([await service.generate_response("Привет") for _ in range(3)])
+            await service.transport.aclose()
+
+        for server in servers:
+            await server.stop()
+        return errors, answers
+
+    errors, answers = asyncio.run(scenario())
+
+    assert isinstance(errors[0], RateLimitError) and errors[0].retry_after == 3
+    assert isinstance(errors[1], ProviderUnavailableError)
+    assert answers[0] == answers[1]
+    assert len(set(answers[0])) > 1
+
+
+if __name__ == "__main__":
+    test_services_against_fake_provider()
+    test_error_injection_and_seed()
+    print("✅ Тесты имитации AI провайдеров прошли успешно!")
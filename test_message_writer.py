@@ -0,0 +1,139 @@
+"""
+Тесты отложенной записи сообщений пачками
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+from sqlalchemy import func, select
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import User
+from models.message import Message
+from services.context_builder import ContextBuilder, TokenCounter
+from services.message_writer import MessageWriter
+from testutils import create_session_factory
+
+
+async def _create_database_with_user(path: str):
+    """Временная база с одним пользователем"""
+    engine, session_factory = await create_session_factory(path)
+    async with session_factory() as session:
+        session.add(User(telegram_id=1))
+        await session.commit()
+    return engine, session_factory
+
+
+def _message(i: int, chat_id: int = 1) -> Message:
+    return Message(user_id=1, user_message=f"вопрос {i}", ai_response=f"ответ {i}", ai_model_used="chatgpt",
+                   chat_id=chat_id, telegram_message_id=i)
+
+
+async def _stored(session_factory) -> int:
+    async with session_factory() as session:
+        return (await session.execute(select(func.count(Message.id)))).scalar_one()
+
+
+def test_read_your_writes_and_flush_on_stop():
+    """Незаписанные сообщения сразу видны в контексте, остановка записывает очередь"""
+
+    async def scenario(path):
+        engine, session_factory = await _create_database_with_user(path)
+        writer = MessageWriter(session_factory, batch_size=100, interval=60)
+        builder = ContextBuilder(session_factory, counter=TokenCounter(), fetch_limit=20,
+                                 summary_enabled=False, writer=writer)
+
+        async def build():
+            async with session_factory() as session:
+                context, _ = await builder.build(session, 1, "chatgpt", "новый вопрос")
+            return [turn["content"] for turn in context if turn["role"] == "user"]
+
+        for i in range(1, 4):
+            await writer.add(_message(i))
+        await writer.add(_message(3))
+
+        pending = await build()
+        stored_before = await _stored(session_factory)
+        duplicate_pending = writer.is_pending(1, 3)
+
+        # Записанные сообщения еще retain секунд в очереди чтения - без повторов в контексте
+        await writer.flush()
+        flushed = await build()
+
+        await writer.add(_message(4))
+        await writer.stop()
+        stored_after = await _stored(session_factory)
+        await engine.dispose()
+        return pending, stored_before, duplicate_pending, flushed, stored_after, writer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(scenario(os.path.join(tmp, "writer.db")))
+    pending, stored_before, duplicate_pending, flushed, stored_after, writer = result
+
+    assert pending == ["вопрос 1", "вопрос 2", "вопрос 3"]
+    assert stored_before == 0 and duplicate_pending
+    assert flushed == pending
+    assert stored_after == 4
+    stats = writer.get_stats()
+    assert stats["pending"] == 0 and stats["duplicates"] == 1
+    assert stats["transactions"] == 2 and stats["rows"] == 4
+
+
+def test_concurrent_handlers_share_transactions():
+    """Под нагрузкой транзакций записи на порядок меньше, чем сообщений"""
+
+    async def scenario(path):
+        engine, session_factory = await _create_database_with_user(path)
+        writer = MessageWriter(session_factory, batch_size=50, interval=0.05)
+
+        async def handler(i):
+            await asyncio.sleep(i * 0.001)
+            await writer.add(_message(i))
+
+        await asyncio.gather(*(handler(i) for i in range(1, 301)))
+        await writer.stop()
+        stored = await _stored(session_factory)
+        await engine.dispose()
+        return stored, writer.get_stats()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stored, stats = asyncio.run(scenario(os.path.join(tmp, "load.db")))
+
+    assert stored == 300 and stats["rows"] == 300
+    assert stats["transactions"] <= 30, stats
+
+
+def test_already_stored_message_is_skipped():
+    """Сообщение, сохраненное до перезапуска, не мешает записи остальных в пачке"""
+
+    async def scenario(path):
+        engine, session_factory = await _create_database_with_user(path)
+        async with session_factory() as session:
+            session.add(_message(2))
+            await session.commit()
+
+        writer = MessageWriter(session_factory, batch_size=10, interval=60)
+        for i in range(1, 4):
+            await writer.add(_message(i))
+        await writer.stop()
+
+        stored = await _stored(session_factory)
+        await engine.dispose()
+        return stored, writer.get_stats()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stored, stats = asyncio.run(scenario(os.path.join(tmp, "restart.db")))
+
+    assert stored == 3
+    assert stats["rows"] == 2 and stats["duplicates"] == 1
+
+
+if __name__ == "__main__":
+    test_read_your_writes_and_flush_on_stop()
+    test_concurrent_handlers_share_transactions()
+    test_already_stored_message_is_skipped()
+    print("✅ Тесты отложенной записи сообщений прошли успешно!")
@@ -0,0 +1,203 @@
+"""
+Тесты миграций схемы и планов запросов горячего пути
+"""
+
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Добавляем корневую папку в путь
+sys.path.append(ROOT)
+
+from database.db import Base, BASELINE_REVISION, migration_status, upgrade_schema
+from models.user import User
+from models.message import Message
+from services.context_builder import ContextBuilder
+from services.dedup_service import MessageDeduplicator
+from services.user_service import UserCache, UserService
+
+
+def _migrate(path: str, revision: str = "head"):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        upgrade_schema(connection, revision)
+    engine.dispose()
+
+
+def test_migrations_match_models():
+    """Цепочка миграций создает ту же схему, что описана в моделях"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fresh.db")
+        _migrate(path)
+
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            current, head = migration_status(connection)
+            diff = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+        engine.dispose()
+
+    assert current == head
+    assert diff == [], diff
+
+
+def test_legacy_database_is_adopted():
+    """База, созданная create_all до перехода на миграции, доводится до последней ревизии"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "legacy.db")
+        _migrate(path, BASELINE_REVISION)
+
+        # Часть изменений уже добавлена старым запуском, таблицы ревизий нет
+        connection = sqlite3.connect(path)
+        connection.execute("ALTER TABLE messages ADD COLUMN chat_id INTEGER")
+        connection.execute("CREATE TABLE bot_state (key VARCHAR PRIMARY KEY, value VARCHAR NOT NULL, updated_at DATETIME)")
+        connection.execute("DROP TABLE alembic_version")
+        connection.commit()
+        connection.close()
+
+        _migrate(path)
+
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            current, head = migration_status(connection)
+            inspector = inspect(connection)
+            columns = {column["name"] for column in inspector.get_columns("messages")}
+            indexes = {index["name"] for index in inspector.get_indexes("messages")}
+            has_summaries = inspector.has_table("conversation_summaries")
+        engine.dispose()
+
+    assert current == head
+    assert {"chat_id", "first_token_time", "prompt_tokens", "cached_tokens"} <= columns
+    assert {"uq_messages_chat_message", "ix_messages_user_epoch_id"} <= indexes
+    assert "ix_messages_id" not in indexes
+    assert has_summaries
+
+
+def test_cli_upgrade_adopts_legacy_database():
+    """alembic upgrade head из командной строки (CMD контейнера) доводит базу без ревизии до последней"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "legacy.db")
+        _migrate(path, BASELINE_REVISION)
+
+        # Схема baseline, созданная create_all: таблицы есть, таблицы ревизий нет
+        connection = sqlite3.connect(path)
+        connection.execute("DROP TABLE alembic_version")
+        connection.execute("INSERT INTO users (telegram_id, current_ai_model, is_active) VALUES (101, 'chatgpt', 1)")
+        connection.commit()
+        connection.close()
+
+        env = dict(os.environ, TELEGRAM_BOT_TOKEN="123456:TEST", DATABASE_URL=f"sqlite:///{path}")
+        upgraded = subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, env=env,
+                                  capture_output=True, text=True, timeout=120)
+
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            current, head = migration_status(connection)
+            users = connection.exec_driver_sql("SELECT COUNT(*) FROM users").scalar_one()
+        engine.dispose()
+
+    assert upgraded.returncode == 0, upgraded.stderr[-2000:]
+    assert current == head
+    assert users == 1
+
+
+def test_startup_checks_schema_version():
+    """Запуск с устаревшей схемой завершается ошибкой, если автоматическая миграция выключена"""
+    probe = (
+        "import asyncio\n"
+        "from database.db import init_database\n"
+        "asyncio.run(init_database())\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, TELEGRAM_BOT_TOKEN="123456:TEST",
+                   DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bot.db')}")
+
+        def start(auto_migrate: str):
+            return subprocess.run([sys.executable, "-c", probe], cwd=ROOT,
+                                  env=dict(env, DATABASE_AUTO_MIGRATE=auto_migrate),
+                                  capture_output=True, text=True, timeout=120)
+
+        refused = start("false")
+        migrated = start("true")
+        checked = start("false")
+
+    assert refused.returncode != 0 and "alembic upgrade head" in refused.stderr
+    assert migrated.returncode == 0, migrated.stderr[-2000:]
+    assert checked.returncode == 0, checked.stderr[-2000:]
+
+
+def test_hot_queries_use_indexes():
+    """Запросы обработки сообщения не читают таблицы целиком и не сортируют результат"""
+
+    async def scenario(path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with session_factory() as session:
+            for telegram_id in (101, 102):
+                session.add(User(telegram_id=telegram_id, username=f"user{telegram_id}"))
+            await session.commit()
+            for i in range(50):
+                session.add(Message(user_id=1 + i % 2, user_message=f"вопрос {i}", ai_response=f"ответ {i}",
+                                    ai_model_used="chatgpt", chat_id=101 + i % 2, telegram_message_id=i))
+            await session.commit()
+
+        statements = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        builder = ContextBuilder(session_factory, read_session_factory=session_factory, summary_enabled=False)
+        dedup = MessageDeduplicator(capacity=100)
+        dedup.finish(101, 6)
+
+        async with session_factory() as session:
+            user = await UserService(session, cache=UserCache()).get_or_create_user(101, "user101")
+            context, _ = await builder.build(session, user.id, "chatgpt", "новый вопрос")
+            assert context
+            assert await dedup.is_duplicate(session, 101, 6)
+
+        await engine.dispose()
+        return statements
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plans.db")
+        _migrate(path)
+        statements = asyncio.run(scenario(path))
+
+        connection = sqlite3.connect(path)
+        plans = {
+            statement: [row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            for statement, parameters in statements
+        }
+        connection.close()
+
+    # Пользователь, краткое содержание, последние сообщения, проверка дубликата
+    assert len(plans) == 4, list(plans)
+    for statement, plan in plans.items():
+        for detail in plan:
+            assert not detail.startswith("SCAN"), (statement, plan)
+            assert "TEMP B-TREE" not in detail, (statement, plan)
+
+    context_plan = next(plan for statement, plan in plans.items() if "ORDER BY" in statement)
+    assert any("ix_messages_user_epoch_id" in detail for detail in context_plan), context_plan
+
+
+if __name__ == "__main__":
+    test_migrations_match_models()
+    test_legacy_database_is_adopted()
+    test_cli_upgrade_adopts_legacy_database()
+    test_startup_checks_schema_version()
+    test_hot_queries_use_indexes()
+    print("✅ Тесты миграций и индексов прошли успешно!")
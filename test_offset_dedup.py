@@ -0,0 +1,117 @@
+"""
+Тесты сохранения offset и дедупликации повторной доставки
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from sqlalchemy.exc import IntegrityError
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import User
+from models.message import Message
+from services.dedup_service import MessageDeduplicator
+from services.offset_store import OffsetStore
+from testutils import create_session_factory
+
+
+def test_offset_checkpoint_survives_restart():
+    """Сохраняется offset, до которого все обновления обработаны"""
+
+    async def scenario(path):
+        engine, session_factory = await create_session_factory(path)
+
+        store = OffsetStore(session_factory, batch_size=2, interval=60)
+        assert await store.load() == 0
+
+        updates = [SimpleNamespace(update_id=i) for i in range(10, 15)]
+        for update in updates:
+            store.track(update)
+
+        store.on_update_done(updates[0])
+        store.on_update_done(updates[2])  # 11 еще обрабатывается
+        assert store.confirmed_offset == 11
+
+        store.on_update_done(updates[1])
+        assert store.confirmed_offset == 13
+        await store.stop()
+
+        restarted = OffsetStore(session_factory)
+        loaded = await restarted.load()
+
+        for update in updates[3:]:
+            store.on_update_done(update)
+        assert store.confirmed_offset == 15
+
+        await engine.dispose()
+        return loaded
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assert asyncio.run(scenario(os.path.join(tmp, "offset.db"))) == 13
+
+
+def test_redelivered_message_is_detected():
+    """Сообщение, сохраненное до перезапуска, распознается как дубликат"""
+
+    async def scenario(path):
+        engine, session_factory = await create_session_factory(path)
+
+        async with session_factory() as session:
+            user = User(telegram_id=1001)
+            session.add(user)
+            await session.commit()
+
+            session.add(Message(user_id=user.id, user_message="Привет", ai_response="Здравствуйте",
+                                ai_model_used="chatgpt", chat_id=1001, telegram_message_id=42))
+            await session.commit()
+
+            # Повторная вставка той же пары отклоняется уникальным индексом
+            session.add(Message(user_id=user.id, user_message="Привет", ai_response="Здравствуйте",
+                                ai_model_used="chatgpt", chat_id=1001, telegram_message_id=42))
+            try:
+                await session.commit()
+                unique_violated = False
+            except IntegrityError:
+                await session.rollback()
+                unique_violated = True
+
+        deduplicator = MessageDeduplicator(capacity=1000)
+        async with session_factory() as session:
+            # Пустой фильтр: база не запрашивается
+            before_warm_up = await deduplicator.is_duplicate(session, 1001, 42)
+            db_checks_before = deduplicator.db_checks
+
+        await deduplicator.warm_up(session_factory)
+        async with session_factory() as session:
+            duplicate = await deduplicator.is_duplicate(session, 1001, 42)
+            fresh = await deduplicator.is_duplicate(session, 1001, 43)
+
+        assert deduplicator.begin(1001, 43)
+        in_progress_duplicate = not deduplicator.begin(1001, 43)
+        deduplicator.finish(1001, 43)
+
+        await engine.dispose()
+        return (unique_violated, before_warm_up, db_checks_before, duplicate, fresh,
+                in_progress_duplicate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(scenario(os.path.join(tmp, "dedup.db")))
+
+    unique_violated, before_warm_up, db_checks_before, duplicate, fresh, in_progress_duplicate = result
+    assert unique_violated
+    assert not before_warm_up
+    assert db_checks_before == 0
+    assert duplicate
+    assert not fresh
+    assert in_progress_duplicate
+
+
+if __name__ == "__main__":
+    test_offset_checkpoint_survives_restart()
+    test_redelivered_message_is_detected()
+    print("✅ Тесты offset и дедупликации прошли успешно!")
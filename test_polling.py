@@ -0,0 +1,104 @@
+"""
+Тесты long polling: задержка при ошибках, RetryAfter и продвижение offset
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from telegram.error import NetworkError, RetryAfter
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot import polling as polling_module
+from bot.polling import LongPolling
+
+
+def make_update(update_id: int):
+    """Обновление без сообщения - метрика задержки доставки не нужна"""
+    return SimpleNamespace(update_id=update_id, message=None)
+
+
+class ScriptedBot:
+    """Бот-заглушка: ответы getUpdates по сценарию (пачка обновлений или исключение)"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.offsets = []
+        self.polling = None
+
+    async def delete_webhook(self):
+        return True
+
+    async def get_updates(self, offset, limit, timeout, allowed_updates):
+        self.offsets.append(offset)
+        if not self.script:
+            self.polling.stop()
+            return []
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.submitted = []
+
+    async def submit(self, update):
+        self.submitted.append(update.update_id)
+
+
+def test_backoff_retry_after_and_offsets():
+    """Задержка растет с каждой ошибкой подряд и сбрасывается после успеха, RetryAfter соблюдается"""
+
+    script = [
+        NetworkError("нет соединения"),
+        NetworkError("нет соединения"),
+        NetworkError("нет соединения"),
+        [make_update(1), make_update(2)],
+        NetworkError("нет соединения"),
+        RetryAfter(7),
+        [make_update(3)],
+    ]
+
+    async def scenario():
+        bot = ScriptedBot(script)
+        dispatcher = RecordingDispatcher()
+        polling = LongPolling(SimpleNamespace(bot=bot), dispatcher, timeout=30,
+                              backoff_base=1.0, backoff_max=30.0)
+        bot.polling = polling
+
+        delays = []
+        real_sleep = asyncio.sleep
+
+        async def fake_sleep(delay, *args, **kwargs):
+            delays.append(delay)
+            await real_sleep(0)
+
+        with patch.object(polling_module.asyncio, "sleep", fake_sleep):
+            await asyncio.wait_for(polling.start(), timeout=10)
+        return bot, dispatcher, polling, delays
+
+    bot, dispatcher, polling, delays = asyncio.run(scenario())
+
+    assert len(delays) == 5, delays
+    # Equal jitter: от половины до полной задержки base * 2^(n-1)
+    assert 0.5 <= delays[0] <= 1 and 1 <= delays[1] <= 2 and 2 <= delays[2] <= 4
+    # Успешный запрос сбрасывает счетчик ошибок
+    assert 0.5 <= delays[3] <= 1
+    assert delays[4] >= 7
+
+    # Каждый следующий запрос начинается после последнего переданного диспетчеру обновления
+    assert bot.offsets == [0, 0, 0, 0, 3, 3, 3, 4]
+    assert dispatcher.submitted == [1, 2, 3]
+    stats = polling.get_stats()
+    assert stats["offset"] == 4 and stats["updates"] == 3 and stats["errors"] == 5
+
+
+if __name__ == "__main__":
+    test_backoff_retry_after_and_offsets()
+    print("✅ Тесты long polling прошли успешно!")
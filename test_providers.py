@@ -0,0 +1,96 @@
+"""
+Тесты реестра AI провайдеров и ленивой загрузки SDK
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Добавляем корневую папку в путь
+sys.path.append(ROOT)
+
+from services.ai_service import AIService
+from services.providers import ProviderRegistry, ProviderSpec, provider_registry
+
+
+class EchoService(AIService):
+    """Сервис стороннего провайдера из entry point"""
+
+    def __init__(self, api_key, transport=None, base_url=None):
+        super().__init__(api_key)
+        self.base_url = base_url
+
+    async def generate_response(self, message, context=None):
+        return message
+
+    def get_model_name(self):
+        return "Echo"
+
+    def is_available(self):
+        return True
+
+
+ECHO_PROVIDER = ProviderSpec("echo", "Echo", "test_providers:EchoService", api_key_setting="ECHO_API_KEY",
+                             base_url_setting="ECHO_BASE_URL", emoji="🔁")
+
+
+def test_sdks_are_imported_on_first_use():
+    """Импорт обработчиков не загружает SDK; создание сервиса загружает только свой"""
+    probe = (
+        "import sys\n"
+        "from bot.handlers import chat_handler\n"
+        "loaded = [name for name in ('openai', 'anthropic', 'aiohttp') if name in sys.modules]\n"
+        "assert not loaded, loaded\n"
+        "from services.ai_factory import ai_factory\n"
+        "assert ai_factory.get_service('chatgpt') is not None\n"
+        "assert 'openai' in sys.modules and 'anthropic' not in sys.modules\n"
+    )
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN="123456:TEST", OPENAI_API_KEY="test-key",
+               ANTHROPIC_API_KEY="test-key", RESPONSE_CACHE_ENABLED="false")
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+def test_builtin_providers_order():
+    """Встроенные провайдеры в порядке приоритета модели по умолчанию"""
+    assert provider_registry.keys()[:3] == ["chatgpt", "claude", "deepseek"]
+    assert provider_registry.get("claude").emoji == "🎭"
+    assert "unknown" not in provider_registry
+
+
+def test_entry_point_provider():
+    """Сторонний провайдер подключается через entry point и получает ключ из окружения"""
+    with tempfile.TemporaryDirectory() as tmp:
+        dist_info = os.path.join(tmp, "telegpt_echo-0.1.dist-info")
+        os.makedirs(dist_info)
+        with open(os.path.join(dist_info, "METADATA"), "w") as metadata:
+            metadata.write("Metadata-Version: 2.1\nName: telegpt-echo\nVersion: 0.1\n")
+        with open(os.path.join(dist_info, "entry_points.txt"), "w") as entry_points_file:
+            entry_points_file.write("[telegpt.providers]\necho = test_providers:ECHO_PROVIDER\n")
+
+        sys.path.insert(0, tmp)
+        os.environ["ECHO_API_KEY"] = "echo-key"
+        os.environ["ECHO_BASE_URL"] = "http://127.0.0.1:9000"
+        try:
+            registry = ProviderRegistry()
+            spec = registry.get("echo")
+            service = spec.create(transport=None) if spec else None
+        finally:
+            sys.path.remove(tmp)
+            del os.environ["ECHO_API_KEY"], os.environ["ECHO_BASE_URL"]
+
+    # При запуске файлом спецификация и класс загружаются из модуля test_providers, а не из __main__
+    assert spec is not None and spec.key == "echo" and spec.service == ECHO_PROVIDER.service
+    assert type(service).__module__ == "test_providers" and type(service).__name__ == "EchoService"
+    assert service.api_key == "echo-key" and service.base_url == "http://127.0.0.1:9000"
+
+
+if __name__ == "__main__":
+    test_sdks_are_imported_on_first_use()
+    test_builtin_providers_order()
+    test_entry_point_provider()
+    print("✅ Тесты реестра провайдеров прошли успешно!")
@@ -0,0 +1,94 @@
+"""
+Тесты ограничения частоты запросов
+"""
+
+import asyncio
+import os
+import sys
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.concurrency import GuardedAIService
+from services.errors import RateLimitError
+from services.rate_limiter import RateLimiter
+from test_failover import FakeService
+from testutils import FakeClock
+
+
+def test_token_bucket_refill():
+    """Запросы сверх burst отклоняются, токены возвращаются со временем"""
+    clock = FakeClock(1000.0)
+    limiter = RateLimiter(per_minute=6, burst=2, max_buckets=10, idle_ttl=0, clock=clock)
+
+    assert limiter.check(1) == 0 and limiter.check(1) == 0
+    # 6 в минуту - один токен за 10 секунд
+    assert abs(limiter.check(1) - 10.0) < 1e-9
+    # Другой пользователь не затронут
+    assert limiter.check(2) == 0
+
+    clock.now += 5
+    assert abs(limiter.check(1) - 5.0) < 1e-9
+    clock.now += 5
+    assert limiter.check(1) == 0
+
+    # Пополнение не превышает burst
+    clock.now += 3600
+    assert [limiter.check(1) == 0 for _ in range(3)] == [True, True, False]
+    assert limiter.get_stats()["rejected"] == 3
+
+
+def test_bucket_eviction():
+    """Простаивающие корзины удаляются, число корзин ограничено max_buckets"""
+    clock = FakeClock(1000.0)
+    limiter = RateLimiter(per_minute=60, max_buckets=3, idle_ttl=120, clock=clock)
+
+    for user_id in range(3):
+        limiter.check(user_id)
+    # Пополнившиеся корзины вытесняются раньше используемой
+    clock.now += 2
+    limiter.check(0)
+    limiter.check(3)
+    assert len(limiter) == 3 and 0 in limiter._buckets and 1 not in limiter._buckets
+
+    # Через idle_ttl корзины удаляются при появлении новых ключей
+    clock.now += 121
+    limiter.check(4)
+    limiter.check(5)
+    assert len(limiter) <= 3 and limiter.get_stats()["evictions"] >= 3
+
+    # idle_ttl не может быть меньше времени полного пополнения
+    assert RateLimiter(per_minute=1, burst=10, idle_ttl=1).idle_ttl == 600
+
+
+def test_provider_bucket_rejects_before_call():
+    """Исчерпанная корзина провайдера отклоняет запрос без обращения к нему"""
+
+    async def scenario():
+        service = FakeService("chatgpt")
+        limiter = RateLimiter(per_minute=1, max_buckets=1)
+        guarded = GuardedAIService(service, "chatgpt", rate_limiter=limiter)
+
+        first = await guarded.generate_response("Привет")
+        try:
+            await guarded.generate_response("Привет")
+            error = None
+        except RateLimitError as e:
+            error = e
+        return service, guarded, first, error
+
+    service, guarded, first, error = asyncio.run(scenario())
+
+    assert first == "chatgpt: Привет"
+    assert error is not None and error.retry_after > 0
+    assert service.calls == 1
+    stats = guarded.get_stats()
+    assert stats["rate_limit"]["rejected"] == 1
+    assert stats["breaker"]["consecutive_failures"] == 0
+
+
+if __name__ == "__main__":
+    test_token_bucket_refill()
+    test_bucket_eviction()
+    test_provider_bucket_rejects_before_call()
+    print("✅ Тесты ограничения частоты запросов прошли успешно!")
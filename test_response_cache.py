@@ -0,0 +1,120 @@
+"""
+Тесты кэша ответов AI
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.ai_service import AIService
+from services.errors import ProviderUnavailableError
+from services.response_cache import CachedAIService, ResponseCache, make_cache_key
+
+
+HISTORY = [{"role": "user", "content": "Как дела?"}, {"role": "assistant", "content": "Хорошо"}]
+OTHER_HISTORY = [{"role": "user", "content": "Как дела?"}, {"role": "assistant", "content": "Отлично"}]
+
+
+class CountingService(AIService):
+    """Сервис-заглушка, считающий обращения к провайдеру"""
+
+    def __init__(self, template: str = "Ответ: {message}", fail: bool = False):
+        super().__init__("test-key")
+        self.template = template
+        self.fail = fail
+        self.calls = 0
+
+    async def generate_response(self, message, context=None):
+        self.calls += 1
+        if self.fail:
+            raise ProviderUnavailableError("test", "HTTP 503")
+        return self.template.format(message=message)
+
+    def get_model_name(self):
+        return "Test (test-1)"
+
+    def is_available(self):
+        return True
+
+
+def test_cache_hits_eviction_and_ttl():
+    """Повторный запрос отвечается из кэша, LRU и TTL ограничивают записи"""
+
+    async def scenario():
+        cache = ResponseCache(max_entries=2, ttl=60, model_ttls={"short": 0.05}, db_path=None)
+        inner = CountingService()
+        service = CachedAIService(inner, cache, "test")
+
+        first = await service.generate_response("Привет", context=HISTORY)
+        started = time.perf_counter()
+        second = await service.generate_response("  привет ", context=HISTORY)
+        hit_ms = (time.perf_counter() - started) * 1000
+        other_context = await service.generate_response("Привет", context=OTHER_HISTORY)
+
+        # Третья запись вытесняет самую старую
+        await service.generate_response("Пока")
+        stream = [delta async for delta in service.stream_response("Пока")]
+
+        short = CachedAIService(CountingService(), cache, "short")
+        await short.generate_response("Привет")
+        await asyncio.sleep(0.1)
+        await short.generate_response("Привет")
+
+        failing = CachedAIService(CountingService(fail=True), cache, "test")
+        for _ in range(2):
+            try:
+                await failing.generate_response("Ошибка")
+            except ProviderUnavailableError:
+                pass
+
+        return first, second, other_context, hit_ms, stream, inner, short.inner, failing.inner, cache.get_stats()
+
+    first, second, other_context, hit_ms, stream, inner, short_inner, failing_inner, stats = asyncio.run(scenario())
+
+    assert first == second == "Ответ: Привет"
+    assert other_context == "Ответ: Привет"
+    assert hit_ms < 10
+    assert stream == ["Ответ: Пока"]
+    assert inner.calls == 3
+    assert short_inner.calls == 2
+    assert failing_inner.calls == 2  # ошибка не кэшируется
+    assert stats["evictions"] >= 1
+    assert stats["expirations"] == 1
+    assert stats["entries"] <= 2
+    assert make_cache_key("m", "Hi  there", None) == make_cache_key("m", "hi there", [])
+
+
+def test_disk_tier_survives_restart():
+    """Второй уровень в SQLite отвечает после перезапуска"""
+
+    async def scenario(path):
+        cache = ResponseCache(max_entries=10, ttl=60, model_ttls={}, db_path=path)
+        service = CachedAIService(CountingService(), cache, "test")
+        await service.generate_response("Что такое TeleGPT?")
+        await cache.close()
+
+        restarted = ResponseCache(max_entries=10, ttl=60, model_ttls={}, db_path=path)
+        inner = CountingService()
+        service = CachedAIService(inner, restarted, "test")
+        response = await service.generate_response("что такое telegpt?")
+        stats = restarted.get_stats()
+        await restarted.close()
+        return response, inner.calls, stats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        response, calls, stats = asyncio.run(scenario(os.path.join(tmp, "cache.db")))
+
+    assert response == "Ответ: Что такое TeleGPT?"
+    assert calls == 0
+    assert stats["disk_hits"] == 1
+
+
+if __name__ == "__main__":
+    test_cache_hits_eviction_and_ttl()
+    test_disk_tier_survives_restart()
+    print("✅ Тесты кэша ответов прошли успешно!")
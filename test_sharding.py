@@ -0,0 +1,98 @@
+"""
+Тесты шардирования: перезапуск воркеров без потери обновлений и выбор шарда
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import time
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.bench_sharding import make_update
+from telegram import Update
+
+from bot.sharding import ShardedDispatcher
+
+
+def test_restart_keeps_in_flight_updates():
+    """Упавший и плавно перезапущенный воркеры дообрабатывают все обновления"""
+
+    async def scenario():
+        dispatcher = ShardedDispatcher(
+            2,
+            worker_path="benchmarks.bench_sharding:CpuBoundWorker",
+            queue_size=1000,
+            workers_per_shard=2,
+            check_interval=0.1
+        )
+        await dispatcher.start()
+
+        acked = []
+        dispatcher.add_post_process_hook(lambda update: acked.append(update.update_id))
+
+        for update_id in range(400):
+            await dispatcher.submit(make_update(update_id, update_id % 8))
+
+        await asyncio.sleep(0.3)
+        os.kill(dispatcher._shards[0].process.pid, signal.SIGKILL)
+        dispatcher.restart_worker(1)
+
+        await dispatcher.join(timeout=60)
+
+        # Плавно перезапущенный воркер завершается после своей очереди
+        for _ in range(50):
+            stats = dispatcher.get_stats()
+            if all(shard["restarts"] == 1 for shard in stats["shards"]):
+                break
+            await asyncio.sleep(0.1)
+
+        await dispatcher.stop()
+        return acked, stats
+
+    acked, stats = asyncio.run(scenario())
+
+    assert sorted(acked) == list(range(400))
+    assert stats["processed"] == 400
+    assert all(shard["restarts"] == 1 for shard in stats["shards"])
+    assert all(shard["in_flight"] == 0 for shard in stats["shards"])
+
+
+
+def make_chat_update(update_id: int, chat_id: int, user_id: int) -> Update:
+    """Сообщение пользователя user_id в групповом чате chat_id"""
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "group"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": "тест"
+        }
+    }, None)
+
+
+def test_user_keyed_caches_route_by_user():
+    """При кэшах пользователей все чаты пользователя попадают в один процесс"""
+
+    by_user = ShardedDispatcher(8)
+    by_chat = ShardedDispatcher(8, route_by_user=False)
+    chats = range(-1000, -1100, -1)
+
+    assert by_user.route_by_user
+    for user_id in range(1, 50):
+        shards = {by_user.shard_for(make_chat_update(1, chat_id, user_id)) for chat_id in chats}
+        assert len(shards) == 1, (user_id, shards)
+
+    # Без кэшей сообщения одного чата идут в один шард независимо от автора
+    assert len({by_chat.shard_for(make_chat_update(1, -1000, user_id)) for user_id in range(1, 50)}) == 1
+    assert len({by_chat.shard_for(make_chat_update(1, chat_id, 1)) for chat_id in chats}) > 1
+
+
+if __name__ == "__main__":
+    test_restart_keeps_in_flight_updates()
+    test_user_keyed_caches_route_by_user()
+    print("✅ Тесты шардирования прошли успешно!")
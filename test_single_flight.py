@@ -0,0 +1,135 @@
+"""
+Стресс-тест объединения одинаковых одновременных запросов
+"""
+
+import asyncio
+import os
+import sys
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.ai_service import AIService
+from services.single_flight import SingleFlightAIService
+
+
+HISTORY = [{"role": "user", "content": "Как дела?"}, {"role": "assistant", "content": "Хорошо"}]
+OTHER_HISTORY = [{"role": "user", "content": "Как дела?"}, {"role": "assistant", "content": "Отлично"}]
+
+
+class SlowService(AIService):
+    """Сервис-заглушка с задержкой ответа и счетчиком обращений"""
+
+    def __init__(self, delay: float = 0.05, error: Exception = None):
+        super().__init__("test-key")
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_response(self, message, context=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return f"Ответ: {message}"
+
+    async def stream_response(self, message, context=None):
+        self.calls += 1
+        for word in ["Один", " два", " три"]:
+            await asyncio.sleep(self.delay / 3)
+            yield word
+
+    def get_model_name(self):
+        return "Slow (test-1)"
+
+    def is_available(self):
+        return True
+
+
+def test_concurrent_identical_calls_share_one_request():
+    """N одинаковых одновременных вызовов - один запрос к провайдеру"""
+
+    async def scenario():
+        inner = SlowService()
+        service = SingleFlightAIService(inner)
+
+        results = await asyncio.gather(*[
+            service.generate_response("Привет", context=HISTORY) for _ in range(200)
+        ])
+        different = await asyncio.gather(
+            service.generate_response("Привет", context=OTHER_HISTORY),
+            service.generate_response("Пока", context=HISTORY),
+        )
+
+        streams = await asyncio.gather(*[
+            _collect(service.stream_response("Поток")) for _ in range(50)
+        ])
+        return inner, service, results, different, streams
+
+    inner, service, results, different, streams = asyncio.run(scenario())
+
+    assert results == ["Ответ: Привет"] * 200
+    assert different == ["Ответ: Привет", "Ответ: Пока"]
+    assert streams == [["Один", " два", " три"]] * 50
+    # 1 общий вызов + 2 с другими ключами + 1 общий поток
+    assert inner.calls == 4
+
+    stats = service.get_stats()
+    assert stats["coalesced"] == 199
+    assert stats["coalesced_streams"] == 49
+    assert stats["in_flight"] == 0 and stats["streams_in_flight"] == 0
+
+
+def test_errors_and_cancellation_propagate():
+    """Ошибку получают все ожидающие, отмена одного не мешает остальным"""
+
+    async def scenario():
+        failing = SingleFlightAIService(SlowService(error=RuntimeError("429")))
+        errors = await asyncio.gather(*[failing.generate_response("Привет") for _ in range(20)],
+                                      return_exceptions=True)
+
+        inner = SlowService()
+        service = SingleFlightAIService(inner)
+        tasks = [asyncio.create_task(service.generate_response("Привет")) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        tasks[0].cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Если отменены все ожидающие, отменяется и сам запрос
+        abandoned = SlowService()
+        abandoned_service = SingleFlightAIService(abandoned)
+        tasks = [asyncio.create_task(abandoned_service.generate_response("Привет")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        return failing, errors, inner, results, abandoned, abandoned_service
+
+    failing, errors, inner, results, abandoned, abandoned_service = asyncio.run(scenario())
+
+    assert failing.inner.calls == 1
+    assert all(isinstance(error, RuntimeError) and str(error) == "429" for error in errors)
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ["Ответ: Привет"] * 4
+    assert inner.calls == 1 and inner.cancelled == 0
+
+    assert abandoned.cancelled == 1
+    assert abandoned_service.get_stats()["in_flight"] == 0
+
+
+async def _collect(stream):
+    return [delta async for delta in stream]
+
+
+if __name__ == "__main__":
+    test_concurrent_identical_calls_share_one_request()
+    test_errors_and_cancellation_propagate()
+    print("✅ Тесты объединения запросов прошли успешно!")
@@ -0,0 +1,66 @@
+"""
+Тесты профиля SQLite: PRAGMA при подключении и пул только для чтения
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database.db import SQLITE_PROFILES, build_engine, sqlite_pragmas
+
+
+def test_tuned_profile_and_read_only_pool():
+    """Писатель включает WAL и PRAGMA профиля, читатель не может писать"""
+
+    async def scenario(path):
+        url = f"sqlite+aiosqlite:///{path}"
+        writer = build_engine(url, SQLITE_PROFILES["tuned"], pool_size=1, max_overflow=0)
+        reader = build_engine(url, SQLITE_PROFILES["tuned"], read_only=True, pool_size=2, max_overflow=0)
+
+        async with writer.begin() as conn:
+            await conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+            await conn.execute(text("INSERT INTO items (name) VALUES ('first')"))
+            pragmas = {
+                name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store")
+            }
+
+        async with reader.connect() as conn:
+            rows = (await conn.execute(text("SELECT name FROM items"))).scalars().all()
+            try:
+                await conn.execute(text("INSERT INTO items (name) VALUES ('second')"))
+                read_only_error = None
+            except OperationalError as e:
+                read_only_error = str(e)
+
+        await reader.dispose()
+        await writer.dispose()
+        return pragmas, rows, read_only_error
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pragmas, rows, read_only_error = asyncio.run(scenario(os.path.join(tmp, "profile.db")))
+
+    # synchronous NORMAL = 1, temp_store MEMORY = 2
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "temp_store": 2}
+    assert rows == ["first"]
+    assert read_only_error and "readonly" in read_only_error.replace(" ", "").lower()
+
+
+def test_profile_overrides():
+    """Переопределения из настроек дополняют профиль, неизвестный профиль - без PRAGMA"""
+    assert sqlite_pragmas("tuned", {"mmap_size": "0"})["mmap_size"] == "0"
+    assert sqlite_pragmas("tuned", {})["journal_mode"] == "WAL"
+    assert sqlite_pragmas("unknown", {}) == {}
+
+
+if __name__ == "__main__":
+    test_tuned_profile_and_read_only_pool()
+    test_profile_overrides()
+    print("✅ Тесты профиля SQLite прошли успешно!")
@@ -0,0 +1,155 @@
+"""
+Тесты потоковой отправки ответов
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from telegram.error import RetryAfter
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.streaming import StreamingReply
+from services.deepseek_service import DeepSeekService
+
+
+class RecordingMessage:
+    """Сообщение-заглушка, записывающее отправку и правки"""
+
+    def __init__(self, log: list, chat_type: str = "private"):
+        self.log = log
+        self.chat = SimpleNamespace(type=chat_type)
+        self.text = None
+
+    async def reply_text(self, text, **kwargs):
+        message = type(self)(self.log, self.chat.type)
+        message.text = text
+        self.log.append(("send", text, kwargs.get("parse_mode")))
+        return message
+
+    async def edit_text(self, text, parse_mode=None, **kwargs):
+        self.text = text
+        self.log.append(("edit", text, parse_mode))
+        return self
+
+
+def test_edits_are_throttled_and_split():
+    """Фрагменты сливаются в редкие правки, длинный ответ делится на сообщения"""
+
+    async def scenario():
+        log = []
+        reply = StreamingReply(RecordingMessage(log), "🧠 Test", edit_interval=0.5)
+        for _ in range(50):
+            await reply.append("слово ")
+        await reply.finish()
+
+        long_log = []
+        long_reply = StreamingReply(RecordingMessage(long_log), "🧠 Test", edit_interval=0, max_length=100)
+        for _ in range(30):
+            await long_reply.append("строка\n")
+        await long_reply.finish()
+        return log, reply, long_log, long_reply
+
+    log, reply, long_log, long_reply = asyncio.run(scenario())
+
+    # Первое сообщение на первом фрагменте, затем только финальная HTML правка
+    assert [entry[0] for entry in log] == ["send", "edit"]
+    assert log[0][1] == "🧠 Test\n\nслово "
+    assert log[1][2] == "HTML" and log[1][1].startswith("<b>🧠 Test</b>")
+    assert reply.skipped_edits == 49
+
+    sent = [entry for entry in long_log if entry[0] == "send"]
+    assert len(sent) == long_reply.get_stats()["messages"] > 1
+    # Лимит Telegram считается по тексту после разбора разметки
+    assert all(len(entry[1].replace("<b>", "").replace("</b>", "")) <= 100 for entry in long_log)
+
+
+class FloodedMessage(RecordingMessage):
+    """Сообщение, первая правка которого упирается в RetryAfter"""
+
+    async def edit_text(self, text, parse_mode=None, **kwargs):
+        if not any(entry[0] == "retry" for entry in self.log):
+            self.log.append(("retry", text, parse_mode))
+            raise RetryAfter(0.2)
+        return await super().edit_text(text, parse_mode, **kwargs)
+
+
+def test_finish_does_not_wait_for_edit_slot():
+    """Финальная правка не ждет интервала, повтор после RetryAfter идет в фоне"""
+
+    async def scenario():
+        log = []
+        reply = StreamingReply(RecordingMessage(log), "🧠 Test", edit_interval=5)
+        await reply.append("начало ")
+        await reply.append("ответа")
+        started = time.monotonic()
+        await reply.finish()
+        finish_time = time.monotonic() - started
+
+        flooded_log = []
+        flooded = StreamingReply(FloodedMessage(flooded_log), "🧠 Test", edit_interval=5)
+        await flooded.append("начало ")
+        started = time.monotonic()
+        await flooded.finish("полный ответ")
+        flooded_time = time.monotonic() - started
+        logged_before_retry = list(flooded_log)
+        await asyncio.gather(*StreamingReply._background)
+        return log, finish_time, flooded_log, logged_before_retry, flooded_time
+
+    log, finish_time, flooded_log, logged_before_retry, flooded_time = asyncio.run(scenario())
+
+    assert [entry[0] for entry in log] == ["send", "edit"]
+    assert log[1][1] == "<b>🧠 Test</b>\n\nначало ответа"
+    assert finish_time < 1, finish_time
+
+    # Воркер освобождается сразу, правка доходит после паузы
+    assert flooded_time < 0.1, flooded_time
+    assert [entry[0] for entry in logged_before_retry] == ["send", "retry"]
+    assert flooded_log[-1] == ("edit", "<b>🧠 Test</b>\n\nполный ответ", "HTML")
+
+
+def test_deepseek_sse_stream():
+    """Потоковый ответ DeepSeek собирается из событий SSE"""
+
+    async def sse_handler(request):
+        body = await request.json()
+        assert body["stream"] is True
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for delta in ["При", "вет", "!"]:
+            event = {"choices": [{"delta": {"content": delta}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write(b": keep-alive\n\ndata: [DONE]\n\n")
+        return response
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", sse_handler)
+        server = TestServer(app, host="127.0.0.1")
+        await server.start_server()
+        try:
+            service = DeepSeekService("test-key")
+            service.api_url = str(server.make_url("/v1/chat/completions"))
+            try:
+                return [delta async for delta in service.stream_response("Привет")]
+            finally:
+                await service.transport.aclose()
+        finally:
+            await server.close()
+
+    assert asyncio.run(scenario()) == ["При", "вет", "!"]
+
+
+if __name__ == "__main__":
+    test_edits_are_throttled_and_split()
+    test_finish_does_not_wait_for_edit_slot()
+    test_deepseek_sse_stream()
+    print("✅ Тесты потоковой отправки прошли успешно!")
@@ -0,0 +1,83 @@
+"""
+Тесты общего HTTP транспорта: переиспользование соединений, метрики пулов и кэш DNS
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import httpx
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.deepseek_service import DeepSeekService
+from services.transport import CachingNetworkBackend, PoolMetrics, TransportManager
+
+
+async def _completion(request):
+    await request.json()
+    return web.json_response({"choices": [{"message": {"content": "Ответ"}}]})
+
+
+def test_pools_reuse_connections():
+    """Повторные запросы идут по одному keep-alive соединению"""
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", _completion)
+        server = TestServer(app, host="127.0.0.1")
+        await server.start_server()
+
+        transport = TransportManager(max_connections=4, http2=False)
+        try:
+            service = DeepSeekService("test-key", transport=transport)
+            service.api_url = f"http://localhost:{server.port}/v1/chat/completions"
+            answers = [await service.generate_response("Привет") for _ in range(5)]
+
+            client = transport.httpx_client("openai")
+            for _ in range(3):
+                response = await client.post(service.api_url, json={})
+                assert response.status_code == 200
+
+            return answers, transport.get_stats()
+        finally:
+            await transport.aclose()
+            await server.close()
+
+    answers, stats = asyncio.run(scenario())
+
+    assert answers == ["Ответ"] * 5
+
+    deepseek = stats["deepseek"]
+    assert deepseek["requests"] == 5
+    assert deepseek["handshakes"] == 1
+    assert deepseek["idle"] == 1 and deepseek["active"] == 0
+    assert deepseek["wait_time"]["count"] == 5
+
+    openai = stats["openai"]
+    assert openai["requests"] == 3
+    assert openai["handshakes"] == 1
+    assert openai["dns_cache_misses"] == 1
+    assert openai["idle"] == 1
+    assert openai["wait_time"]["count"] == 3
+
+
+
+def test_network_backend_fallback():
+    """Без внутреннего пула httpcore транспорт остается со стандартным бэкендом"""
+    backend = CachingNetworkBackend(PoolMetrics(), ttl=60)
+    transport = httpx.AsyncHTTPTransport()
+
+    assert TransportManager._install_network_backend(transport, backend)
+    assert transport._pool._network_backend is backend
+    assert not TransportManager._install_network_backend(SimpleNamespace(), backend)
+
+
+if __name__ == "__main__":
+    test_pools_reuse_connections()
+    test_network_backend_fallback()
+    print("✅ Тесты HTTP транспорта прошли успешно!")
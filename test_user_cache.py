@@ -0,0 +1,108 @@
+"""
+Тесты кэша пользователей: запись в базу только при изменении данных
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import User
+from services.user_service import UserCache, UserService
+from testutils import FakeClock, create_session_factory, record_statements
+
+
+def test_cached_user_skips_database():
+    """Повторные сообщения не обращаются к базе, изменения записываются один раз"""
+
+    async def scenario(path):
+        engine, session_factory = await create_session_factory(path)
+        statements = record_statements(engine)
+        clock = FakeClock()
+        cache = UserCache(max_size=100, ttl=300, clock=clock)
+
+        async def call(method, *args, **kwargs):
+            async with session_factory() as session:
+                return await getattr(UserService(session, cache), method)(*args, **kwargs)
+
+        created = await call("get_or_create_user", 42, "anya", "Аня")
+        assert created.id and created.current_ai_model == "chatgpt"
+        statements.clear()
+
+        # Данные не изменились - ни одного запроса
+        for _ in range(5):
+            same = await call("get_or_create_user", 42, "anya", "Аня")
+        assert await call("get_user_model", 42) == "chatgpt"
+        assert await call("update_user_model", 42, "chatgpt") is True
+        unchanged = list(statements)
+
+        # Изменилось имя пользователя и модель - по одному UPDATE
+        renamed = await call("get_or_create_user", 42, "anya_k", "Аня")
+        assert await call("update_user_model", 42, "claude") is True
+        writes = list(statements)
+        statements.clear()
+
+        # После ttl снимок перечитывается из базы
+        clock.now = 301
+        reloaded = await call("get_or_create_user", 42, "anya_k", "Аня")
+        reload_statements = list(statements)
+
+        async with session_factory() as session:
+            row = await session.get(User, created.id)
+
+        await engine.dispose()
+        return created, same, unchanged, renamed, writes, reloaded, reload_statements, row, cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = asyncio.run(scenario(os.path.join(tmp, "users.db")))
+    created, same, unchanged, renamed, writes, reloaded, reload_statements, row, cache = result
+
+    assert same is created and unchanged == []
+    assert writes == ["UPDATE", "UPDATE"]
+    # Снимок в кэше один и тот же и совпадает с базой
+    assert renamed is created and renamed.username == "anya_k" and renamed.current_ai_model == "claude"
+    assert reload_statements == ["SELECT"]
+    assert reloaded.current_ai_model == "claude" and reloaded.id == created.id
+    assert row.username == "anya_k" and row.current_ai_model == "claude"
+    assert cache.get_stats()["writes"] == 2
+
+
+def test_lru_eviction_and_concurrent_creation():
+    """Размер кэша ограничен; одновременное создание пользователя не падает"""
+
+    async def scenario(path):
+        engine, session_factory = await create_session_factory(path)
+        cache = UserCache(max_size=2, ttl=300)
+
+        async def get_or_create(telegram_id, user_cache=cache):
+            async with session_factory() as session:
+                user = await UserService(session, user_cache).get_or_create_user(telegram_id, f"user{telegram_id}")
+                # Сессия писателя не держит соединение после возврата пользователя
+                return user, session.in_transaction()
+
+        (first, first_open), (second, second_open) = await asyncio.gather(get_or_create(1), get_or_create(1))
+        # Как в разных процессах: проигравший гонку перечитывает пользователя из базы
+        racers = await asyncio.gather(get_or_create(4, UserCache()), get_or_create(4, UserCache()))
+        await get_or_create(2)
+        await get_or_create(3)
+        await engine.dispose()
+        left_open = first_open or second_open or any(in_transaction for _, in_transaction in racers)
+        return first, second, left_open, cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second, left_open, cache = asyncio.run(scenario(os.path.join(tmp, "users.db")))
+
+    assert first.id == second.id
+    assert not left_open
+    assert len(cache) == 2 and cache.get(1) is None and cache.get(3) is not None
+    assert cache.get_stats()["evictions"] == 1
+
+
+if __name__ == "__main__":
+    test_cached_user_skips_database()
+    test_lru_eviction_and_concurrent_creation()
+    print("✅ Тесты кэша пользователей прошли успешно!")
@@ -0,0 +1,127 @@
+"""
+Тест webhook режима: отправка записанных обновлений на localhost
+"""
+
+import asyncio
+import os
+import sys
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+from telegram.ext import Application
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.webhook import WebhookServer, SECRET_TOKEN_HEADER
+
+
+SECRET = "test-secret"
+
+# Записанное обновление от Telegram (текстовое сообщение в личном чате)
+RECORDED_UPDATE = {
+    "update_id": 900001,
+    "message": {
+        "message_id": 42,
+        "date": 1735689600,
+        "chat": {"id": 1001, "type": "private", "first_name": "Test"},
+        "from": {"id": 1001, "is_bot": False, "first_name": "Test", "username": "tester"},
+        "text": "Привет!"
+    }
+}
+
+
+class RecordingDispatcher:
+    """Диспетчер-заглушка, сохраняющий принятые обновления"""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.updates = []
+
+    def try_submit(self, update) -> bool:
+        if len(self.updates) >= self.capacity:
+            return False
+        self.updates.append(update)
+        return True
+
+
+async def _post_updates(headers: dict, payloads: list, capacity: int = 100):
+    """Запуск webhook сервера и отправка обновлений, возвращает статусы и принятые обновления"""
+    application = Application.builder().token("123456:TEST-TOKEN").build()
+    dispatcher = RecordingDispatcher(capacity)
+    webhook = WebhookServer(application, dispatcher, path="/telegram/webhook", secret_token=SECRET)
+
+    server = TestServer(webhook.create_app(), host="127.0.0.1")
+    await server.start_server()
+
+    statuses = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            for payload in payloads:
+                async with session.post(server.make_url("/telegram/webhook"),
+                                        headers=headers, **payload) as response:
+                    statuses.append(response.status)
+    finally:
+        await server.close()
+
+    return statuses, dispatcher.updates, webhook
+
+
+def test_webhook_accepts_recorded_update():
+    """Корректное обновление подтверждается и попадает в очередь"""
+    statuses, updates, webhook = asyncio.run(_post_updates(
+        {SECRET_TOKEN_HEADER: SECRET},
+        [{"json": RECORDED_UPDATE}]
+    ))
+
+    assert statuses == [200]
+    assert len(updates) == 1
+
+    update = updates[0]
+    assert update.update_id == 900001
+    assert update.message.text == "Привет!"
+    assert update.effective_chat.id == 1001
+    assert webhook.get_stats()["updates"] == 1
+
+
+def test_webhook_rejects_wrong_secret():
+    """Обновление с неверным секретом отклоняется"""
+    statuses, updates, webhook = asyncio.run(_post_updates(
+        {SECRET_TOKEN_HEADER: "wrong"},
+        [{"json": RECORDED_UPDATE}]
+    ))
+
+    assert statuses == [403]
+    assert not updates
+    assert webhook.get_stats()["rejected"] == 1
+
+
+def test_webhook_rejects_malformed_body():
+    """Некорректное тело запроса отклоняется"""
+    statuses, updates, webhook = asyncio.run(_post_updates(
+        {SECRET_TOKEN_HEADER: SECRET},
+        [{"data": b"not json"}, {"json": {"message": {}}}]
+    ))
+
+    assert statuses == [400, 400]
+    assert not updates
+
+
+def test_webhook_backpressure():
+    """При заполненной очереди Telegram получает 503 для повторной доставки"""
+    statuses, updates, webhook = asyncio.run(_post_updates(
+        {SECRET_TOKEN_HEADER: SECRET},
+        [{"json": RECORDED_UPDATE}, {"json": RECORDED_UPDATE}],
+        capacity=1
+    ))
+
+    assert statuses == [200, 503]
+    assert len(updates) == 1
+
+
+if __name__ == "__main__":
+    test_webhook_accepts_recorded_update()
+    test_webhook_rejects_wrong_secret()
+    test_webhook_rejects_malformed_body()
+    test_webhook_backpressure()
+    print("✅ Тесты webhook прошли успешно!")
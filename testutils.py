@@ -0,0 +1,39 @@
+"""
+Общие заглушки для тестов: управляемые часы и временная база
+"""
+
+from typing import List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from database.db import Base
+
+
+class FakeClock:
+    """Управляемые часы"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def create_session_factory(path: str) -> Tuple[AsyncEngine, async_sessionmaker]:
+    """Временная база со всеми таблицами"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def record_statements(engine: AsyncEngine) -> List[str]:
+    """Список, в который записывается первое слово каждого SQL запроса движка"""
+    statements: List[str] = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0])
+
+    return statements
@@ -0,0 +1,69 @@
+"""
+Фильтр Блума с ротацией поколений для ограниченной по памяти дедупликации
+"""
+
+import hashlib
+import math
+from typing import Tuple
+
+
+class BloomFilter:
+    """Классический фильтр Блума на bytearray"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @staticmethod
+    def _hash_pair(key: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, key: str):
+        h1, h2 = self._hash_pair(key)
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % self.size
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = self._hash_pair(key)
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % self.size
+            if not self._bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+
+class RotatingBloomFilter:
+    """
+    Два поколения фильтров Блума
+
+    Когда текущее поколение заполняется, оно становится предыдущим, а старое
+    отбрасывается. Память ограничена двумя фильтрами, а ключ помнится как
+    минимум capacity последующих добавлений.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self.rotations = 0
+
+    def add(self, key: str):
+        if self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self.rotations += 1
+        self._current.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._current or key in self._previous
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._current._bits) + len(self._previous._bits)
@@ -0,0 +1,47 @@
+"""
+Простые метрики задержек для мониторинга
+"""
+
+from collections import deque
+from typing import Deque, Dict
+
+
+class LatencyTracker:
+    """Скользящее окно замеров задержки (значения в секундах)"""
+
+    def __init__(self, window: int = 1000):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        """Добавить замер"""
+        self._samples.append(value)
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """Перцентиль по окну последних замеров (q от 0 до 100)"""
+        if not self._samples:
+            return 0.0
+
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, float]:
+        """Сводка в миллисекундах"""
+        return {
+            "count": self.count,
+            "last_ms": round(self.last * 1000, 2),
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
@@ -0,0 +1,83 @@
+"""
+Хешированное колесо таймеров для дешевого истечения ключей
+"""
+
+import math
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+class TimerWheel:
+    """
+    Хешированное колесо таймеров
+
+    Ключ попадает в слот по тику своего дедлайна. Планирование, перенос и
+    отмена - O(1), при продвижении просматриваются только слоты прошедших
+    тиков, поэтому истечение стоит O(1) амортизированно на ключ.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self._slots: List[Dict[Hashable, float]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._current_tick = int(clock() / tick)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def schedule(self, key: Hashable, delay: float, now: Optional[float] = None):
+        """Запланировать (или перенести) истечение ключа через delay секунд"""
+        if now is None:
+            now = self.clock()
+
+        self.cancel(key)
+
+        deadline = now + delay
+        # Ключ не может попасть в уже пройденный тик
+        deadline_tick = max(math.ceil(deadline / self.tick), self._current_tick + 1)
+        index = deadline_tick % len(self._slots)
+
+        self._slots[index][key] = deadline
+        self._slot_of[key] = index
+
+    def cancel(self, key: Hashable) -> bool:
+        """Отменить истечение ключа"""
+        index = self._slot_of.pop(key, None)
+        if index is None:
+            return False
+
+        del self._slots[index][key]
+        return True
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Продвинуть колесо до текущего времени и вернуть истекшие ключи"""
+        if now is None:
+            now = self.clock()
+
+        target_tick = int(now / self.tick)
+        if target_tick <= self._current_tick:
+            return []
+
+        # За один оборот просматривается каждый слот не более одного раза
+        ticks = min(target_tick - self._current_tick, len(self._slots))
+        expired = []
+
+        for offset in range(1, ticks + 1):
+            slot = self._slots[(self._current_tick + offset) % len(self._slots)]
+            if not slot:
+                continue
+
+            # В слоте могут быть ключи следующих оборотов - они остаются на месте
+            due = [key for key, deadline in slot.items() if deadline <= now]
+            for key in due:
+                del slot[key]
+                del self._slot_of[key]
+            expired.extend(due)
+
+        self._current_tick = target_tick
+        return expired